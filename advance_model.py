@@ -6,16 +6,57 @@
 #- args displayer, TextGameDisplayer, GUIDisplayer or None
 #- args players_namelist, name to display
 #- return replay, a dict
+#-   think_times: per player list of (round, move, wall time, cpu time) of every
+#-   call, move -1 for StartRound, cpu time None when the call timed out
+#-   think_time_summary: per player p50/p95/p99/max of the SelectMove times,
+#-   over the game ("all") and per round number ("rounds")
 
 from model import *
 
 from displayer import *
 from func_timeout import func_timeout, FunctionTimedOut
+import math
 import time
 
+def _TimedCall(method,args):
+    # Runs in the func_timeout thread, so thread_time only counts the agent's own cpu time
+    cpu_begin = time.thread_time()
+    result = method(*args)
+    return result, time.thread_time() - cpu_begin
+
+
+def ThinkTimePercentiles(times):
+    # Nearest rank percentiles of a list of seconds, None if empty
+    times = sorted(t for t in times if t is not None)
+    if len(times) == 0:
+        return None
+    def Rank(p):
+        return times[min(len(times)-1, max(0, int(math.ceil(p/100.0*len(times)))-1))]
+    return {"p50":Rank(50),"p95":Rank(95),"p99":Rank(99),"max":times[-1],"count":len(times)}
+
+
+def ThinkTimeSummary(think_times):
+    # SelectMove percentiles of every player, over the game and per round
+    summary = {}
+    for i,records in think_times.items():
+        moves = [r for r in records if r[1] >= 0]
+        rounds = {}
+        for record in moves:
+            rounds.setdefault(record[0],[]).append(record)
+        summary[i] = {"all":{"wall":ThinkTimePercentiles([r[2] for r in moves]),
+                             "cpu":ThinkTimePercentiles([r[3] for r in moves])},
+                      "rounds":{round_count:{"wall":ThinkTimePercentiles([r[2] for r in records]),
+                                             "cpu":ThinkTimePercentiles([r[3] for r in records])}
+                                for round_count,records in sorted(rounds.items())}}
+    return summary
+
+
 class AdvancePlayer(Player):
     def __init__(self, _id):
         super().__init__(_id)
+        # Time limits of SelectMove and StartRound, set by the AdvanceGameRunner running the game
+        self.time_limit = None
+        self.startRound_time_limit = None
 
     def StartRound(self,game_state):
         return None
@@ -48,6 +89,9 @@ class AdvanceGameRunner:
         for plyr in player_list:
             assert(plyr.id == i)    
             i += 1
+            # Let the players plan their time
+            plyr.time_limit = time_limit
+            plyr.startRound_time_limit = startRound_time_limit
 
         self.game_state = GameState(len(player_list))
         self.players = player_list
@@ -58,6 +102,7 @@ class AdvanceGameRunner:
         self.warning_limit = warning_limit
         self.warnings = [0]*len(player_list)
         self.warning_positions = []
+        self.think_times = {i:[] for i in range(len(player_list))}
 
         self.displayer = displayer
         
@@ -69,7 +114,9 @@ class AdvanceGameRunner:
                         "player_num":len(player_order),
                         "players_namelist":self.players_namelist,
                         "warning_positions":self.warning_positions,
-                        "warning_limit":self.warning_limit}
+                        "warning_limit":self.warning_limit,
+                        "think_times":self.think_times,
+                        "think_time_summary":ThinkTimeSummary(self.think_times)}
         
         if isTimeOut:
             player_traces.update({id:[0, plr_state.player_trace] for id,plr_state in enumerate(self.game_state.players)})
@@ -86,6 +133,18 @@ class AdvanceGameRunner:
 
         return player_traces
 
+    def _CallPlayer(self,i,time_limit,method,args,round_count,move_count):
+        # Call the player with a time limit and record its wall and cpu time.
+        # The wall time is measured around func_timeout: that is what the limit applies to.
+        begin = time.perf_counter()
+        try:
+            result, cpu_time = func_timeout(time_limit,_TimedCall,args=(method,args))
+        except FunctionTimedOut:
+            self.think_times[i].append((round_count,move_count,time.perf_counter()-begin,None))
+            raise
+        self.think_times[i].append((round_count,move_count,time.perf_counter()-begin,cpu_time))
+        return result
+
     def Run(self):
         player_order = []
         for i in range(self.game_state.first_player, len(self.players)):
@@ -104,7 +163,7 @@ class AdvanceGameRunner:
         for i in player_order:
             gs_copy = copy.deepcopy(self.game_state)
             try:
-                func_timeout(self.startRound_time_limit,self.players[i].StartRound,args=(gs_copy,))
+                self._CallPlayer(i,self.startRound_time_limit,self.players[i].StartRound,(gs_copy,),round_count,-1)
             except FunctionTimedOut:
                 self.warnings[i] += 1
                 if self.displayer is not None:
@@ -133,7 +192,7 @@ class AdvanceGameRunner:
                 moves_copy = copy.deepcopy(moves)
                 
                 try:
-                    selected = func_timeout(self.time_limit,self.players[i].SelectMove,args=(moves_copy, gs_copy))
+                    selected = self._CallPlayer(i,self.time_limit,self.players[i].SelectMove,(moves_copy, gs_copy),round_count,move_count)
                     
                 except FunctionTimedOut:
                     self.warnings[i] += 1
@@ -194,7 +253,7 @@ class AdvanceGameRunner:
                 for i in player_order:
                     gs_copy = copy.deepcopy(self.game_state)
                     try:
-                        func_timeout(self.startRound_time_limit,self.players[i].StartRound,args=(gs_copy,))
+                        self._CallPlayer(i,self.startRound_time_limit,self.players[i].StartRound,(gs_copy,),round_count,-1)
                     except FunctionTimedOut:
                         self.warnings[i] += 1
                         if self.displayer is not None:
@@ -0,0 +1,300 @@
+#- Microbenchmarks of the game engine (model.py) with a local history.
+#- Every benchmark runs on the same fixed corpus of positions, generated from
+#- fixed seeds, so that timings are comparable between commits. Each run is
+#- appended to a json-lines history file and compared with a baseline entry:
+#- a benchmark that got slower than the threshold is flagged as a regression.
+
+from model import *
+from utils import *
+import copy
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+CORPUS_SEEDS = [90054, 1, 7, 42, 1337, 2020, 31415, 27182]
+HISTORY_FILE = os.path.join("output", "benchmark_history.jsonl")
+
+
+def NaiveMove(moves, rng=None):
+    """naive_player's policy: most tiles to a pattern line, then fewest to the floor.
+
+    With an rng the ties are broken at random (like the MCTS rollouts),
+    otherwise the first best move is returned (like naive_player).
+    """
+    best_moves = []
+    best_key = None
+    for move in moves:
+        key = (move[2].num_to_pattern_line, -move[2].num_to_floor_line)
+        if best_key is None or key > best_key:
+            best_key = key
+            best_moves = [move]
+        elif key == best_key:
+            best_moves.append(move)
+    return rng.choice(best_moves) if rng is not None else best_moves[0]
+
+
+def BuildPosition(seed, num_rounds=0, num_moves=0):
+    """Deterministic position: play `num_rounds` full rounds and `num_moves` more moves.
+
+    Moves are chosen by the naive policy with a seeded tie breaker.
+
+    Returns:
+        (game_state, player_to_move)
+    """
+    random.seed(seed)
+    rng = random.Random(seed)
+    gs = GameState(2)
+    for plr in gs.players:
+        plr.player_trace.StartRound()
+    player_id = gs.first_player
+    for _ in range(num_rounds):
+        while gs.TilesRemaining():
+            gs.ExecuteMove(player_id, NaiveMove(gs.players[player_id].GetAvailableMoves(gs), rng))
+            player_id = 1 - player_id
+        gs.ExecuteEndOfRound()
+        if any(plr.GetCompletedRows() > 0 for plr in gs.players):
+            break
+        gs.SetupNewRound()
+        player_id = gs.first_player
+    for _ in range(num_moves):
+        if not gs.TilesRemaining():
+            break
+        gs.ExecuteMove(player_id, NaiveMove(gs.players[player_id].GetAvailableMoves(gs), rng))
+        player_id = 1 - player_id
+    return gs, player_id
+
+
+def BuildCorpus():
+    """The fixed benchmark corpus, keyed by phase."""
+    corpus = {"round_start": [], "mid_round": [], "round_end": []}
+    for seed in CORPUS_SEEDS:
+        for num_rounds in (0, 1, 2, 3):
+            corpus["round_start"].append(BuildPosition(seed, num_rounds, 0))
+            corpus["mid_round"].append(BuildPosition(seed, num_rounds, 6))
+            # Enough moves to empty every factory and the centre
+            corpus["round_end"].append(BuildPosition(seed, num_rounds, 100))
+    return corpus
+
+
+def NaiveRoundPlayout(game_state, player_id, rng):
+    """Play the rest of the round with the naive policy, as the MCTS rollouts do."""
+    while game_state.TilesRemaining():
+        moves = game_state.players[player_id].GetAvailableMoves(game_state)
+        game_state.ExecuteMove(player_id, NaiveMove(moves, rng))
+        player_id = 1 - player_id
+    return game_state
+
+
+def RandomGame(seed):
+    """Play a full game with random moves (seeded) and return the final state."""
+    random.seed(seed)
+    gs = GameState(2)
+    for plr in gs.players:
+        plr.player_trace.StartRound()
+    while True:
+        player_id = gs.first_player
+        while gs.TilesRemaining():
+            gs.ExecuteMove(player_id, random.choice(gs.players[player_id].GetAvailableMoves(gs)))
+            player_id = 1 - player_id
+        gs.ExecuteEndOfRound()
+        if any(plr.GetCompletedRows() > 0 for plr in gs.players):
+            break
+        gs.SetupNewRound()
+    for plr in gs.players:
+        plr.EndOfGameScore()
+    return gs
+
+
+def _TimeBatches(setup, run, repeat):
+    """Best time per operation over `repeat` batches.
+
+    setup() returns the list of arguments of one batch (built outside the
+    timed region), run(arg) is the timed operation. As in timeit, the garbage
+    collector is off while timing.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for arg in args:
+                run(arg)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = min(best, elapsed / len(args))
+    return best
+
+
+def RunBenchmarks(repeat=5, scale=1):
+    """Run every benchmark and return {name: seconds per operation}."""
+    corpus = BuildCorpus()
+    positions = corpus["round_start"] + corpus["mid_round"]
+    results = {}
+
+    results["GetAvailableMoves"] = _TimeBatches(
+        lambda: positions * (20 * scale),
+        lambda pos: pos[0].players[pos[1]].GetAvailableMoves(pos[0]),
+        repeat)
+
+    moves = [(pos, pos[0].players[pos[1]].GetAvailableMoves(pos[0])) for pos in positions]
+    results["ExecuteMove"] = _TimeBatches(
+        lambda: [(copy.deepcopy(pos[0]), pos[1], pos_moves[i % len(pos_moves)])
+                 for i in range(5 * scale) for pos, pos_moves in moves],
+        lambda arg: arg[0].ExecuteMove(arg[1], arg[2]),
+        repeat)
+
+    results["deepcopy(GameState)"] = _TimeBatches(
+        lambda: positions * (2 * scale),
+        lambda pos: copy.deepcopy(pos[0]),
+        repeat)
+
+    results["ScoreRound"] = _TimeBatches(
+        lambda: [copy.deepcopy(plr) for _ in range(5 * scale)
+                 for pos in corpus["round_end"] for plr in pos[0].players],
+        lambda plr: plr.ScoreRound(),
+        repeat)
+
+    results["ExecuteEndOfRound"] = _TimeBatches(
+        lambda: [copy.deepcopy(pos[0]) for _ in range(5 * scale) for pos in corpus["round_end"]],
+        lambda gs: gs.ExecuteEndOfRound(),
+        repeat)
+
+    results["naive round playout"] = _TimeBatches(
+        lambda: [(copy.deepcopy(pos[0]), pos[1], random.Random(i))
+                 for _ in range(scale) for i, pos in enumerate(corpus["round_start"])],
+        lambda arg: NaiveRoundPlayout(*arg),
+        repeat)
+
+    results["random game"] = _TimeBatches(
+        lambda: CORPUS_SEEDS[:4] * scale,
+        RandomGame,
+        repeat)
+    return results
+
+
+def _GitRevision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def LoadHistory(history_file):
+    history = []
+    if os.path.exists(history_file):
+        with open(history_file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    history.append(json.loads(line))
+    return history
+
+
+def AppendHistory(history_file, entry):
+    history_dir = os.path.dirname(history_file)
+    if history_dir and not os.path.exists(history_dir):
+        os.makedirs(history_dir)
+    with open(history_file, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def FindBaseline(history, label=None):
+    """Baseline entry: the latest one with `label`, else the latest marked baseline, else the first."""
+    if label is not None:
+        for entry in reversed(history):
+            if entry.get("label") == label:
+                return entry
+        return None
+    for entry in reversed(history):
+        if entry.get("baseline"):
+            return entry
+    return history[0] if history else None
+
+
+def CompareResults(results, baseline, threshold):
+    """Return [(name, current, baseline, relative change, is_regression)]."""
+    comparison = []
+    for name, current in results.items():
+        previous = baseline["results"].get(name) if baseline else None
+        if previous is None:
+            comparison.append((name, current, None, None, False))
+            continue
+        change = (current - previous) / previous
+        comparison.append((name, current, previous, change, change > threshold))
+    return comparison
+
+
+def PrintComparison(comparison, baseline):
+    if baseline:
+        print("Baseline: {} ({})".format(baseline.get("label") or baseline.get("revision"), baseline["time"]))
+    print("| Benchmark                  | Time/op (us) | Baseline (us) | Change   |")
+    print("|----------------------------|--------------|---------------|----------|")
+    for name, current, previous, change, regression in comparison:
+        if previous is None:
+            print("| {:<26} | {:>12.2f} | {:>13} | {:>8} |".format(name, current * 1e6, "-", "-"))
+        else:
+            print("| {:<26} | {:>12.2f} | {:>13.2f} | {:>+7.1f}% |{}".format(
+                name, current * 1e6, previous * 1e6, change * 100, "  REGRESSION" if regression else ""))
+
+
+def loadParameter():
+
+    """
+    Processes the command used to run the benchmarks from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python benchmark.py <options>
+    EXAMPLES:   (1) python benchmark.py --label before-change --setBaseline
+                    - records a run and uses it as the baseline of the next runs
+                (2) python benchmark.py --threshold 0.05
+                    - flags every benchmark more than 5% slower than the baseline
+    """
+    parser = OptionParser(usageStr)
+
+    parser.add_option('--history', help='history file (default: {})'.format(HISTORY_FILE), default=HISTORY_FILE)
+    parser.add_option('--label', help='label stored with this run', default=None)
+    parser.add_option('--baseline', help='label of the run to compare with (default: latest run marked as baseline, else the first run)', default=None)
+    parser.add_option('--setBaseline', action='store_true', help='mark this run as the baseline', default=False)
+    parser.add_option('--threshold', type='float', help='relative slow down reported as a regression (default: 0.1)', default=0.1)
+    parser.add_option('--repeat', type='int', help='number of timed batches, the best one is kept (default: 5)', default=5)
+    parser.add_option('--scale', type='int', help='multiply the size of every batch (default: 1)', default=1)
+    parser.add_option('--noSave', action='store_true', help='do not append this run to the history', default=False)
+
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+    return options
+
+
+if __name__ == '__main__':
+    options = loadParameter()
+    history = LoadHistory(options.history)
+    baseline = FindBaseline(history, options.baseline)
+    if options.baseline is not None and baseline is None:
+        print("No run labelled {} in {}".format(options.baseline, options.history), file=sys.stderr)
+
+    results = RunBenchmarks(options.repeat, options.scale)
+    comparison = CompareResults(results, baseline, options.threshold)
+    PrintComparison(comparison, baseline)
+
+    if not options.noSave:
+        AppendHistory(options.history, {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                        "label": options.label,
+                                        "revision": _GitRevision(),
+                                        "python": platform.python_version(),
+                                        "baseline": options.setBaseline,
+                                        "results": results})
+
+    regressions = [row[0] for row in comparison if row[4]]
+    if regressions:
+        print("Regressions above {:.0f}%: {}".format(options.threshold * 100, ", ".join(regressions)))
+        sys.exit(1)
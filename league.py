@@ -0,0 +1,269 @@
+#- Round-robin league between every agent under players/.
+#- Each pairing is played as colour-swapped game pairs with shared seeds,
+#- the games are spread over a pool of worker processes and the Elo ratings
+#- are updated incrementally as the results come back. Finished games are
+#- cached on disk keyed by (agent, agent version, seed), where the version is
+#- a hash of the agent's source and data files, so re-running the league
+#- after adding or changing an agent only plays the games that are missing.
+
+from tournament import PlayGame, GameScores, SeedSequence, RecyclingPool
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+import traceback
+
+PLAYERS_DIR = "players"
+# Agents that wait for keyboard input can't take part in a league
+INTERACTIVE_AGENTS = ["iplayer"]
+# Packages inside an agent directory that hold shared code, not agents
+HELPER_PACKAGES = ["my_algorithm"]
+# Files of the helper packages that change how an agent plays: code and data (evaluator weights, opening book)
+VERSIONED_EXTENSIONS = (".py", ".json")
+
+
+def DiscoverAgents(players_dir=PLAYERS_DIR):
+    """Return the agent files (in runner.py -r/-b notation) of every myPlayer under players_dir."""
+    agents = []
+    for dir_path, dir_names, file_names in os.walk(players_dir):
+        dir_names[:] = sorted(d for d in dir_names if d not in HELPER_PACKAGES and not d.startswith(('.', '_')))
+        package = os.path.relpath(dir_path, players_dir).replace(os.sep, '.')
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".py") or file_name.startswith("_"):
+                continue
+            module = file_name[:-3]
+            if module in INTERACTIVE_AGENTS:
+                continue
+            with open(os.path.join(dir_path, file_name)) as f:
+                if "class myPlayer" not in f.read():
+                    continue
+            agents.append(module if package == '.' else package + '.' + module)
+    return agents
+
+
+def AgentVersion(agent_file, players_dir=PLAYERS_DIR):
+    """Hash of the agent file and of the code and data files of the helper packages sitting next to it."""
+    parts = agent_file.split('.')
+    agent_dir = os.path.join(players_dir, *parts[:-1])
+    sources = [os.path.join(agent_dir, parts[-1] + ".py")]
+    if len(parts) > 1:
+        for helper in HELPER_PACKAGES:
+            for dir_path, dir_names, file_names in os.walk(os.path.join(agent_dir, helper)):
+                dir_names.sort()
+                sources.extend(os.path.join(dir_path, f) for f in sorted(file_names)
+                               if f.endswith(VERSIONED_EXTENSIONS))
+    digest = hashlib.sha1()
+    for source in sources:
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class ResultCache:
+    """Append-only json-lines file of finished league games."""
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.results = {}
+        if os.path.exists(file_name):
+            with open(file_name) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        # A crash while writing may leave a partial last line
+                        continue
+                    self.results[self.Key(result)] = result
+
+    @staticmethod
+    def Key(game):
+        return (game["red"], game["red_version"], game["blue"], game["blue_version"], game["seed"])
+
+    def Get(self, game):
+        return self.results.get(self.Key(game))
+
+    def Add(self, result):
+        self.results[self.Key(result)] = result
+        cache_dir = os.path.dirname(self.file_name)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(self.file_name, 'a') as f:
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class EloTable:
+    """Incremental Elo ratings plus W/D/L and score totals of every agent."""
+    def __init__(self, agents, k_factor=16.0):
+        self.k_factor = k_factor
+        self.ratings = {agent: 0.0 for agent in agents}
+        self.records = {agent: [0, 0, 0, 0.0] for agent in agents}
+
+    def AddGame(self, red, blue, red_score, blue_score):
+        if red_score > blue_score:
+            result = 1.0
+        elif red_score < blue_score:
+            result = 0.0
+        else:
+            result = 0.5
+        expected = 1.0 / (1.0 + 10.0 ** ((self.ratings[blue] - self.ratings[red]) / 400.0))
+        self.ratings[red] += self.k_factor * (result - expected)
+        self.ratings[blue] -= self.k_factor * (result - expected)
+        for agent, score, outcome in ((red, red_score, result), (blue, blue_score, 1.0 - result)):
+            record = self.records[agent]
+            record[{1.0: 0, 0.5: 1, 0.0: 2}[outcome]] += 1
+            record[3] += score
+
+
+def FitBayesElo(games, agents, prior_draws=2.0, iterations=200):
+    """Maximum a posteriori Bradley-Terry ratings in the spirit of BayesElo.
+
+    Draws count as half a win for each side, and `prior_draws` virtual draws
+    are added between every two agents that met, so that unbeaten or winless
+    agents still get a finite rating. Solved with Hunter's MM iterations.
+
+    Args:
+        games: iterable of (red, blue, red_score, blue_score)
+        agents: all agent names
+
+    Returns:
+        dict agent -> Elo, centred on 0
+    """
+    wins = {agent: 0.0 for agent in agents}
+    meetings = {}
+    for red, blue, red_score, blue_score in games:
+        pair = tuple(sorted((red, blue)))
+        meetings[pair] = meetings.get(pair, 0.0) + 1.0
+        if red_score > blue_score:
+            wins[red] += 1.0
+        elif red_score < blue_score:
+            wins[blue] += 1.0
+        else:
+            wins[red] += 0.5
+            wins[blue] += 0.5
+    for pair in meetings:
+        meetings[pair] += prior_draws
+        wins[pair[0]] += prior_draws / 2
+        wins[pair[1]] += prior_draws / 2
+
+    gamma = {agent: 1.0 for agent in agents}
+    for _ in range(iterations):
+        for agent in agents:
+            denominator = 0.0
+            for (a, b), n in meetings.items():
+                if agent == a:
+                    denominator += n / (gamma[a] + gamma[b])
+                elif agent == b:
+                    denominator += n / (gamma[a] + gamma[b])
+            if denominator > 0:
+                gamma[agent] = wins[agent] / denominator
+        # Keep the geometric mean at 1 (Elo centred on 0)
+        log_mean = sum(math.log(g) for g in gamma.values()) / len(gamma)
+        gamma = {agent: g / math.exp(log_mean) for agent, g in gamma.items()}
+    return {agent: 400.0 * math.log10(g) for agent, g in gamma.items()}
+
+
+def ScheduleLeague(agents, versions, seed, pairs_per_match):
+    """All (red, blue, seed) games of the round robin, colours swapped within each seed pair."""
+    games = []
+    seeds = SeedSequence(seed, pairs_per_match)
+    for agent_a, agent_b in itertools.combinations(agents, 2):
+        for game_seed in seeds:
+            for red, blue in ((agent_a, agent_b), (agent_b, agent_a)):
+                games.append({"red": red, "red_version": versions[red],
+                              "blue": blue, "blue_version": versions[blue],
+                              "seed": game_seed})
+    return games
+
+
+def PlayLeagueGame(task):
+    """Worker entry point: play one scheduled game and return it with its scores."""
+    game, time_limit, warning_limit = task
+    result = dict(game)
+    start = time.time()
+    try:
+        replay = PlayGame([game["red"], game["blue"]], [game["red"], game["blue"]],
+                          game["seed"], time_limit, warning_limit)
+        red_score, blue_score = GameScores(replay)
+        result["red_score"], result["blue_score"] = float(red_score), float(blue_score)
+    except Exception:
+        result["error"] = traceback.format_exc().strip().splitlines()[-1]
+    result["duration"] = time.time() - start
+    return result
+
+
+def RunLeague(agents=None, seed=90054, pairs_per_match=2, workers=None,
+              cache_file="output/league_cache.jsonl", time_limit=1.0, warning_limit=3,
+              recycle_games=0, max_worker_mb=0, verbose=True):
+    """Play the round robin between `agents` (default: every agent under players/).
+
+    Workers are recycled after `recycle_games` games or once their resident
+    memory exceeds `max_worker_mb` megabytes (0 disables either limit).
+
+    Returns the EloTable and the BayesElo ratings of every agent.
+    """
+    agents = agents or DiscoverAgents()
+    versions = {agent: AgentVersion(agent) for agent in agents}
+    cache = ResultCache(cache_file)
+    table = EloTable(agents)
+    finished = []
+
+    pending = []
+    for game in ScheduleLeague(agents, versions, seed, pairs_per_match):
+        cached = cache.Get(game)
+        if cached is None:
+            pending.append(game)
+            continue
+        table.AddGame(game["red"], game["blue"], cached["red_score"], cached["blue_score"])
+        finished.append((game["red"], game["blue"], cached["red_score"], cached["blue_score"]))
+    if verbose:
+        print("League of {} agents: {} games cached, {} to play".format(len(agents), len(finished), len(pending)))
+
+    tasks = [(game, time_limit, warning_limit) for game in pending]
+    pool = RecyclingPool(workers, max_tasks=recycle_games, max_rss=max_worker_mb * 2 ** 20)
+    start = time.time()
+    if tasks:
+        for count, result in enumerate(pool.imap_unordered(PlayLeagueGame, tasks), 1):
+            if result is None:
+                if verbose:
+                    print("A game was lost twice to a crashed worker")
+                continue
+            if "error" in result:
+                if verbose:
+                    print("Game {} vs {} (seed {}) failed: {}".format(
+                        result["red"], result["blue"], result["seed"], result["error"]))
+                continue
+            cache.Add(result)
+            table.AddGame(result["red"], result["blue"], result["red_score"], result["blue_score"])
+            finished.append((result["red"], result["blue"], result["red_score"], result["blue_score"]))
+            if verbose:
+                print("({}/{}) {} {:g} - {:g} {}  Elo {:+.0f} / {:+.0f}".format(
+                    count, len(tasks), result["red"], result["red_score"], result["blue_score"],
+                    result["blue"], table.ratings[result["red"]], table.ratings[result["blue"]]))
+
+    bayes_elo = FitBayesElo(finished, agents)
+    if verbose:
+        PrintStandings(table, bayes_elo)
+        if tasks:
+            elapsed = time.time() - start
+            print("Played {} games in {:.1f}s ({:.2f} games/min)".format(
+                len(tasks), elapsed, 60.0 * len(tasks) / elapsed))
+            print(pool.Summary())
+    return table, bayes_elo
+
+
+def PrintStandings(table, bayes_elo):
+    print("| Rank | Agent                          | BayesElo | Elo    | Win | Tie | Lost | AvgScore |")
+    print("|------|--------------------------------|----------|--------|-----|-----|------|----------|")
+    ranking = sorted(bayes_elo, key=lambda agent: -bayes_elo[agent])
+    for rank, agent in enumerate(ranking, 1):
+        win, tie, lost, score = table.records[agent]
+        games = win + tie + lost
+        print("| {:<4} | {:<30} | {:>+8.1f} | {:>+6.1f} | {:>3} | {:>3} | {:>4} | {:>8.2f} |".format(
+            rank, agent, bayes_elo[agent], table.ratings[agent], win, tie, lost,
+            score / games if games else 0.0))
@@ -0,0 +1,124 @@
+#- Perft: count the leaf nodes of the move tree within the current round.
+#- Used as a correctness oracle (a move generator change must not change the
+#- counts) and as a throughput benchmark for PlayerState.GetAvailableMoves.
+#-
+#- A leaf is a position at the requested depth, or the end of the round if it
+#- comes first: moves never cross into the next round, whose tiles are random.
+#- At depth 1 the moves are counted without being played (bulk counting).
+
+from model import *
+from utils import *
+from benchmark import BuildPosition
+import copy
+import pickle
+import sys
+import time
+
+
+def LoadPosition(file_name):
+    """Load a position pickled by SavePosition, or a bare GameState (first player to move)."""
+    with open(file_name, 'rb') as f:
+        position = pickle.load(f, encoding="bytes")
+    if isinstance(position, GameState):
+        return position, position.first_player
+    return position
+
+
+def SavePosition(file_name, game_state, player_id):
+    with open(file_name, 'wb') as f:
+        pickle.dump((game_state, player_id), f)
+
+
+def Perft(game_state, player_id, depth):
+    """Number of leaf nodes `depth` moves below game_state, `player_id` to move."""
+    if depth == 0 or not game_state.TilesRemaining():
+        return 1
+    moves = game_state.players[player_id].GetAvailableMoves(game_state)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs_copy = copy.deepcopy(game_state)
+        gs_copy.ExecuteMove(player_id, move)
+        nodes += Perft(gs_copy, 1 - player_id, depth - 1)
+    return nodes
+
+
+def Divide(game_state, player_id, depth):
+    """Perft split per root move: list of (move, leaf nodes), empty at the end of the round."""
+    counts = []
+    if not game_state.TilesRemaining():
+        return counts
+    for move in game_state.players[player_id].GetAvailableMoves(game_state):
+        gs_copy = copy.deepcopy(game_state)
+        gs_copy.ExecuteMove(player_id, move)
+        counts.append((move, Perft(gs_copy, 1 - player_id, depth - 1)))
+    return counts
+
+
+def MoveToShortString(move):
+    mid, fid, tg = move
+    source = "C " if mid == Move.TAKE_FROM_CENTRE else "F{}".format(fid + 1)
+    dest = "floor" if tg.pattern_line_dest == -1 else "L{}".format(tg.pattern_line_dest + 1)
+    return "{} {}x{} -> {} ({} line, {} floor)".format(
+        source, tg.number, TileToShortString(tg.tile_type), dest, tg.num_to_pattern_line, tg.num_to_floor_line)
+
+
+def loadParameter():
+
+    """
+    Processes the command used to run perft from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python perft.py <options>
+    EXAMPLES:   (1) python perft.py -d 3
+                    - counts the leaves 3 moves deep from the first round start of the default seed
+                (2) python perft.py --position pos.pkl -d 4 --divide
+                    - counts the leaves 4 moves deep from a saved position, per root move
+                (3) python perft.py --seed 7 --rounds 2 --moves 6 --save pos.pkl
+                    - saves the position after 2 rounds and 6 moves of naive play with seed 7
+    """
+    parser = OptionParser(usageStr)
+
+    parser.add_option('-d', '--depth', type='int', help='search depth in moves (default: 2)', default=2)
+    parser.add_option('--position', help='pickled (GameState, player to move) or GameState file', default=None)
+    parser.add_option('--seed', type='int', help='seed of the generated position (default: 90054)', default=90054)
+    parser.add_option('--rounds', type='int', help='naive rounds played before the generated position (default: 0)', default=0)
+    parser.add_option('--moves', type='int', help='naive moves played in the round of the generated position (default: 0)', default=0)
+    parser.add_option('--save', help='save the position into this file and exit', default=None)
+    parser.add_option('--divide', action='store_true', help='print the count of every root move', default=False)
+    parser.add_option('--iterative', action='store_true', help='report every depth from 1 to --depth', default=False)
+
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+    return options
+
+
+if __name__ == '__main__':
+    options = loadParameter()
+    if options.position is not None:
+        game_state, player_id = LoadPosition(options.position)
+    else:
+        game_state, player_id = BuildPosition(options.seed, options.rounds, options.moves)
+
+    if options.save is not None:
+        SavePosition(options.save, game_state, player_id)
+        print("Position saved to {}".format(options.save))
+        sys.exit(0)
+
+    print(BoardToString(game_state))
+    print("Player {} to move".format(player_id))
+    depths = range(1, options.depth + 1) if options.iterative else [options.depth]
+    for depth in depths:
+        start = time.perf_counter()
+        if options.divide:
+            counts = Divide(game_state, player_id, depth)
+            for move, nodes in counts:
+                print("{:<36} {}".format(MoveToShortString(move), nodes))
+            nodes = sum(count for _, count in counts) if counts else 1
+        else:
+            nodes = Perft(game_state, player_id, depth)
+        elapsed = time.perf_counter() - start
+        print("perft({}) = {}  time {:.3f}s  {:.0f} nodes/s".format(
+            depth, nodes, elapsed, nodes / elapsed if elapsed > 0 else float('inf')))
@@ -1,4 +1,5 @@
 from advance_model import *
+from .my_algorithm import search_stats
 from .my_algorithm import MCTS
 from .my_algorithm import Qfunctions
 from .my_algorithm.MAB.EpsGreedy import *
@@ -7,6 +8,8 @@ from .my_algorithm.MAB.EpsGreedy import *
 class myPlayer(AdvancePlayer):
     def __init__(self, _id):
         super().__init__(_id)
+        # Search statistics, only recorded when $AZUL_SEARCH_STATS names a file
+        self.stats = search_stats.FromEnvironment()
         # Initialize the Multi-armed bandit algorithm
         self.mab = EpsGreedy(0.1)
 
@@ -15,5 +18,5 @@ class myPlayer(AdvancePlayer):
         if len(moves) == 1:
             return moves[0]
         # Reduce the number of moves, to get more iteration
-        mcts = MCTS.MonteCarloTreeSearch(self.id, game_state, moves, 0.9, self.mab, 1)
+        mcts = MCTS.MonteCarloTreeSearch(self.id, game_state, moves, 0.9, self.mab, 1, stats=self.stats)
         return mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
@@ -0,0 +1,9 @@
+from .my_algorithm.mcts_player import MCTSPlayer
+from .my_algorithm.linear_eval import LinearEvaluator
+from .my_algorithm.MAB.UCB import *
+
+
+class myPlayer(MCTSPlayer):
+    def __init__(self, _id):
+        # Same as myPlayer, the rewards after the rollouts are estimated by the fitted linear evaluator
+        super().__init__(_id, UCB(0.5), evaluator=LinearEvaluator.Load())
@@ -1,13 +1,49 @@
 from advance_model import *
+import gc
+import time
+from .my_algorithm import search_stats
 from .my_algorithm. Minimax import *
+from .my_algorithm.parallel_search import CreateSearchPool
+from .my_algorithm.round_solver import RoundSolver, RemainingMoves
+from .my_algorithm.time_manager import DEFAULT_HARD_LIMIT, CollectorPaused
+from .my_algorithm.transposition import TranspositionTable
 
 
 class myPlayer(AdvancePlayer):
+    SOLVE_THRESHOLD = 5
+    # Seconds kept under the runner's time limit of a move: building and freeing the tree and the
+    # runner's own overhead are not covered by the deadline of the search
+    TIME_MARGIN = 0.15
+
     def __init__(self, _id):
         super().__init__(_id)
+        # Search statistics, only recorded when $AZUL_SEARCH_STATS names a file
+        self.stats = search_stats.FromEnvironment()
+        # Kept from move to move: the positions of a round are searched again by the next moves
+        self.tt = TranspositionTable()
+        # Root children searched on the other cores, None on a single core
+        self.pool = CreateSearchPool()
+        # The end of the round is solved exactly once at most SOLVE_THRESHOLD moves are left
+        self.solver = RoundSolver(self.stats)
+
+    def StartRound(self, game_state):
+        # Collect now, with the time of StartRound: the collector is off during the moves
+        gc.collect()
 
     def SelectMove(self, moves, game_state):
-        # No need to think if only one move is provided
-        print('------------')
-        selector = Minimax(self.id, game_state, moves)
+        # The search trees have no reference cycles, their memory is freed without the collector
+        with CollectorPaused():
+            return self._SelectMove(moves, game_state)
+
+    def _SelectMove(self, moves, game_state):
+        begin = time.time()
+        hard_limit = self.time_limit if self.time_limit is not None else DEFAULT_HARD_LIMIT
+        budget = max(0.0, hard_limit - self.TIME_MARGIN)
+        # Near the end of the round, solve the rest of it exactly; search if it takes more than half the time
+        if RemainingMoves(game_state) <= self.SOLVE_THRESHOLD:
+            solution = self.solver.Solve(game_state, self.id, budget / 2)
+            if solution is not None:
+                return solution[0]
+        selector = Minimax(self.id, game_state, moves, stats=self.stats, tt=self.tt, pool=self.pool,
+                           time_limit=budget - (time.time() - begin))
         return selector.FindNextMove()
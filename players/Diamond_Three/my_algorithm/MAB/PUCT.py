@@ -0,0 +1,82 @@
+import math
+import weakref
+from .MAB import *
+from ..game_tree import MovePrior
+
+
+class PUCT(MAB):
+    """
+    Predictor + UCT multi-armed bandit
+
+    Every child gets a prior probability from a fast policy: a softmax of the
+    MovePrior of its move (the naive player's ordering by tiles to the pattern
+    line and to the floor line). A child is chosen by
+    Q + exploration_constant * prior * sqrt(parent visits) / (1 + child visits),
+    so the iterations go to the moves with a good prior first, instead of
+    trying every unvisited child before exploiting. An unvisited child is
+    valued at the average Q of its visited siblings.
+
+    Attributes
+        exploration_constant : explore-exploit trade-off controller, in points of Q
+        temperature : temperature of the softmax, a higher one flattens the priors
+    """
+
+    def __init__(self, exploration_constant, temperature=1.0):
+        """Initialize PUCT
+
+        Args:
+            exploration_constant: explore-exploit trade-off controller, in points of Q
+            temperature: temperature of the softmax of the priors
+        """
+        self.exploration_constant = exploration_constant
+        self.temperature = temperature
+        # node -> priors of its children, recomputed when children are added (progressive widening)
+        self._priors = weakref.WeakKeyDictionary()
+
+    def FindBestChildNode(self, node, q_func):
+        """Find the best node through comparing the highest PUCT score
+
+        Args:
+            node: expand_node
+            q_func: how to calculate the q value, the child node would be its parameter.
+
+        Returns:
+            The node with the max PUCT score
+        """
+        priors = self._Priors(node)
+        visited_q = [q_func(child) for child in node.children if child.state.visited_count > 0]
+        # First play urgency: an unvisited child is as good as its siblings on average
+        unvisited_q = sum(visited_q) / len(visited_q) if visited_q else 0
+        exploration = self.exploration_constant * math.sqrt(max(1, node.state.visited_count))
+        max_score = float('-inf')
+        best_child = None
+        for child, prior in zip(node.children, priors):
+            visited_count = child.state.visited_count
+            q_value = q_func(child) if visited_count > 0 else unvisited_q
+            score = q_value + exploration * prior / (1 + visited_count)
+            if score > max_score:
+                max_score = score
+                best_child = child
+        return best_child
+
+    def __getstate__(self):
+        # The cache holds weak references, which can't be pickled (e.g. to a pondering process)
+        state = self.__dict__.copy()
+        del state["_priors"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._priors = weakref.WeakKeyDictionary()
+
+    def _Priors(self, node):
+        priors = self._priors.get(node)
+        if priors is None or len(priors) != len(node.children):
+            player_state = node.state.game_state.players[node.state.player_id]
+            logits = [MovePrior(child.state.pre_move, player_state) / self.temperature for child in node.children]
+            max_logit = max(logits)
+            weights = [math.exp(logit - max_logit) for logit in logits]
+            total = sum(weights)
+            priors = [weight / total for weight in weights]
+            self._priors[node] = priors
+        return priors
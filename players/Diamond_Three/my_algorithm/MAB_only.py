@@ -13,9 +13,10 @@ class MAB_only:
         time_limit: the time limit of each step, should be lower than the setting in the game
         mab: the Multi-armed bandits algorithm used in the Selection process.
         root: the root node of the tree
+        stats: SearchStats collecting a record of every search, None to disable the instrumentation
     """
 
-    def __init__(self, player_id, game_state, time_limit, mab, discount_factor):
+    def __init__(self, player_id, game_state, time_limit, mab, discount_factor, stats=None):
         """Init the Monte Carlo Tree Search algorithm
 
         Args:
@@ -24,8 +25,10 @@ class MAB_only:
             time_limit: the time limit of each step, should be lower than the setting in the game
             mab: the Multi-armed bandits algorithm used in the Selection process.
             discount_factor: Use for discount the value in the future
+            stats: SearchStats collecting a record of every search, None to disable the instrumentation
         """
         self.player_id = player_id
+        self.stats = stats
         self.time_limit = time_limit
         self.mab = mab
         self.discount_factor = discount_factor
@@ -44,22 +47,38 @@ class MAB_only:
         Returns:
              The best move with the highest scores
         """
+        record = None
+        if self.stats is not None:
+            record = self.stats.NewRecord("MAB_only", self.player_id, len(self.root.children))
         test_count = 0
         begin_time = time.time()
         while time.time() - begin_time < self.time_limit:
             test_count += 1
+            if record is not None:
+                record.Lap()
             # Select the leaf node with the higher UCB1 value
             # No expansion, only consider one layer
             child = self._Selection(self.root, first_q_func)
+            if record is not None:
+                record.Lap("selection")
             # Simulation
             rewards, move_count = self._Simulation(child)
+            if record is not None:
+                record.Lap("simulation")
             # Actually, much like just using bandit, but we get the reward by simulation
             self._Update(child, rewards, move_count, self.discount_factor)
+            if record is not None:
+                record.Lap("backup")
+                record.AddRollout(move_count)
         # Find the best move with the highest win score
         print(test_count)
         # Choose the move that can bring the max Q value
 
         best_child = self._ChooseBestChildWithTieBreaker(self.root.children, first_q_func, second_q_func)
+        if record is not None:
+            record.iterations = test_count
+            record.Finish(self.root)
+            self.stats.Add(record)
         return best_child.state.pre_move
 
     def _Selection(self, root, q_func):
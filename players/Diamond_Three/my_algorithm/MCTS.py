@@ -1,7 +1,10 @@
+import math
 import time
-import copy
 import random
-from .game_tree import Node, State, CalculateFutureReward
+from . import Qfunctions
+from .game_tree import Node, State, CalculateFutureReward, EstimateRoundScore, MoveSignature, CopyGameState, \
+    CopyPlayerState
+from .rollout_policy import GreedyRolloutMove, WallFree
 
 
 class MonteCarloTreeSearch:
@@ -14,9 +17,29 @@ class MonteCarloTreeSearch:
         time_limit: the time limit of each step, should be lower than the setting in the game
         mab: the Multi-armed bandits algorithm used in the Selection process.
         root: the root node of the tree
+        stats: SearchStats collecting a record of every search, None to disable the instrumentation
+        max_iteration_time: duration of the slowest iteration of the last search
+        early_stop: whether to stop the search once the best root move is decided
+        reward_range: assumed spread of the rewards, used for the confidence bounds of the early stop
+        time_saved: seconds left unused by the last search thanks to the early stop
+        progressive_widening: whether the children are unlocked gradually, best MovePrior first
+        widening_constant, widening_exponent: a node visited n times has
+            max(1, widening_constant * (n + 1) ** widening_exponent) children unlocked
+        rave: whether AMAF statistics are kept and blended into the Q value of the Selection (RaveQfunc)
+        rave_equivalence: visits at which the Q value and the AMAF value weigh the same
+        rollout_depth: most moves of a simulation before EstimateRoundScore scores it, None to play to
+            the end of the round
+        evaluator: LinearEvaluator estimating the future rewards at the end of the simulations, None for
+            the hand-tuned CalculateFutureReward
     """
 
-    def __init__(self, player_id, game_state, moves, time_limit, mab, discount_factor):
+    # Iterations between two checks of the early stop rule
+    STOP_CHECK_INTERVAL = 32
+
+    def __init__(self, player_id, game_state, moves, time_limit, mab, discount_factor, stats=None,
+                 early_stop=False, reward_range=10.0, root=None, progressive_widening=False,
+                 widening_constant=1.0, widening_exponent=0.5, rave=False, rave_equivalence=5,
+                 rollout_depth=None, evaluator=None):
         """Init the Monte Carlo Tree Search algorithm
 
         Args:
@@ -26,16 +49,46 @@ class MonteCarloTreeSearch:
             time_limit: the time limit of each step, should be lower than the setting in the game
             mab: the Multi-armed bandits algorithm used in the Selection process.
             discount_factor: Use for discount the value in the future
+            stats: SearchStats collecting a record of every search, None to disable the instrumentation
+            early_stop: whether to stop the search once the best root move is decided
+            reward_range: assumed spread of the rewards, used for the confidence bounds of the early stop
+            root: a tree already searched for this game state (e.g. by pondering), None to start from scratch
+            progressive_widening: instead of simplifying the moves, keep them all and unlock the children
+                gradually, best MovePrior first, as the visit count of their parent grows
+            widening_constant: number of children unlocked, see the attributes
+            widening_exponent: growth of the number of children unlocked, see the attributes
+            rave: keep AMAF statistics of the moves played after every node, also in the simulations,
+                and blend them into the Q value used by the Selection
+            rave_equivalence: visits at which the Q value and the AMAF value weigh the same
+            rollout_depth: stop the simulations after this many moves and score them with
+                EstimateRoundScore, None to play them to the end of the round
+            evaluator: LinearEvaluator replacing CalculateFutureReward at the end of the simulations
         """
         self.moves = moves
+        self.stats = stats
+        self.max_iteration_time = 0
+        self.early_stop = early_stop
+        self.reward_range = reward_range
+        self.time_saved = 0
         self.player_id = player_id
         self.time_limit = time_limit
         self.mab = mab
         self.discount_factor = discount_factor
+        self.progressive_widening = progressive_widening
+        self.widening_constant = widening_constant
+        self.widening_exponent = widening_exponent
+        self.rave = rave
+        self.rave_equivalence = rave_equivalence
+        self.rollout_depth = rollout_depth
+        self.evaluator = evaluator
         # Initial tree
-        self.root = Node(State(player_id, game_state, None), None)
+        self.root = root if root is not None else Node(State(player_id, game_state, None), None)
         # Here we expand the root directly to prevent empty selection
-        self.root.ExpandChildren(moves)
+        if not self.root.IsExpanded():
+            self.root.ExpandChildren(moves, lazy=progressive_widening)
+        if progressive_widening:
+            # A search without time must still have a move to return: the one with the best prior
+            self.root.UnlockChildren(1)
 
     def FindNextMove(self, first_q_func, second_q_func):
         """Find the best move using UTC
@@ -49,40 +102,133 @@ class MonteCarloTreeSearch:
         Returns:
              The best move with the highest scores
         """
+        record = None
+        if self.stats is not None:
+            record = self.stats.NewRecord("MCTS", self.player_id, len(self.root.children))
+        # The AMAF values only guide the Selection, the move is chosen on the real Q values
+        selection_q_func = Qfunctions.RaveQfunc(first_q_func, self.rave_equivalence) if self.rave else first_q_func
         begin_time = time.time()
-        while time.time() - begin_time < self.time_limit:
+        now = begin_time
+        iterations = 0
+        while now - begin_time < self.time_limit:
+            if record is not None:
+                record.Lap()
             # Select the leaf node with the higher UCB1 value
-            expand_node = self.Selection(self.root, first_q_func)
+            expand_node = self.Selection(self.root, selection_q_func)
+            if record is not None:
+                record.Lap("selection")
             # Expand the node, only expand if it is visited more than one times before.
             # This encourage breath search one more time instead of expanding nodes.
             # If the node is the end of the game, use the expand_node to simulate.
             child = expand_node
             # A higher visited_count would lead to more simulation. Not enough computing power provided!
             if expand_node.state.visited_count > 1 and expand_node.state.game_state.TilesRemaining() is True:
-                children = self.Expansion(expand_node)
+                children = self.Expansion(expand_node, self.progressive_widening)
                 # It may not have children. Also, for the first time, it would not expand its children.
                 if len(children) > 0:
                     child = self.Choose(children)
+            if record is not None:
+                record.Lap("expansion")
             # Simulation
-            rewards, move_count = self.Simulation(child)
+            played = [] if self.rave else None
+            rewards, move_count = self.Simulation(child, played, self.rollout_depth, self.evaluator)
+            if record is not None:
+                record.Lap("simulation")
             # Back propagation, backup both our reward and our opponent's reward (Self training)
-            self.Backup(child, rewards, move_count, self.discount_factor)
+            self.Backup(child, rewards, move_count, self.discount_factor, played)
+            if record is not None:
+                record.Lap("backup")
+                record.iterations += 1
+                record.AddRollout(move_count)
+            # The clock is only checked here, so the slowest iteration bounds the overrun
+            last, now = now, time.time()
+            if now - last > self.max_iteration_time:
+                self.max_iteration_time = now - last
+            iterations += 1
+            # The clock may not have moved yet on a small tree, there is no iteration rate to project then
+            if self.early_stop and iterations % self.STOP_CHECK_INTERVAL == 0 and now > begin_time:
+                elapsed = now - begin_time
+                remaining_iterations = (self.time_limit - elapsed) * iterations / elapsed
+                if self._BestMoveDecided(first_q_func, remaining_iterations):
+                    self.time_saved = max(0, self.time_limit - elapsed)
+                    break
         # Find the best move with the highest win score
         # Choose the move that can bring the max Q value
         best_child = self._ChooseBestChildWithTieBreaker(self.root.children, first_q_func, second_q_func)
+        if record is not None:
+            record.extra["time_saved"] = self.time_saved
+            record.Finish(self.root)
+            self.stats.Add(record)
         return best_child.state.pre_move
 
+    def _BestMoveDecided(self, q_func, remaining_iterations):
+        """Whether more search can no longer change the move chosen at the root
+
+        The move is decided when the child with the best Q value is also the
+        most visited one, and either no other child can catch up its visits in
+        the remaining iterations, or the lower confidence bound of its Q value is
+        above the upper bound of every other child (Hoeffding bounds with
+        reward_range as the spread of the rewards).
+
+        Args:
+            q_func: The Q function used to select the move
+            remaining_iterations: estimated number of iterations left before the time limit
+
+        Returns:
+            True if the search can stop
+        """
+        children = self.root.children
+        if len(children) < 2 and not self.root.pending_moves:
+            return True
+        best = max(children, key=q_func)
+        best_q = q_func(best)
+        for child in children:
+            if child is not best and child.state.visited_count >= best.state.visited_count:
+                return False
+        # A pending move (progressive widening) has no visits yet
+        second_visits = max((child.state.visited_count for child in children if child is not best), default=0)
+        if best.state.visited_count - second_visits > remaining_iterations:
+            return True
+        if self.root.pending_moves:
+            # Nothing is known of the value of the pending moves
+            return False
+        log_total = math.log(self.root.state.visited_count)
+        best_lower = best_q - self.reward_range * math.sqrt(log_total / (2 * best.state.visited_count))
+        for child in children:
+            if child is best:
+                continue
+            if child.state.visited_count == 0:
+                return False
+            upper = q_func(child) + self.reward_range * math.sqrt(log_total / (2 * child.state.visited_count))
+            if upper >= best_lower:
+                return False
+        return True
+
     def Selection(self, root, q_func):
         """ Select the leaf node with the highest UCB to expand"""
         node = root
-        while len(node.children) > 0:
+        while True:
+            if self.progressive_widening:
+                self._Widen(node)
+            if len(node.children) == 0:
+                return node
             node = self.mab.FindBestChildNode(node, q_func)
-        return node
+
+    def _Widen(self, node):
+        """Progressive widening: unlock the children that the visit count of the node allows"""
+        if node.pending_moves:
+            visits = node.state.visited_count
+            node.UnlockChildren(max(1, int(self.widening_constant * (visits + 1) ** self.widening_exponent)))
 
     @staticmethod
-    def Expansion(node):
-        """ Expand the node, add children into its leaves """
-        node.ExpandChildren()
+    def Expansion(node, lazy=False):
+        """ Expand the node, add children into its leaves
+
+        With lazy (progressive widening), only the child with the best prior is added.
+        """
+        node.ExpandChildren(lazy=lazy)
+        if lazy:
+            node.UnlockChildren(1)
         return node.children
 
     @staticmethod
@@ -92,45 +238,87 @@ class MonteCarloTreeSearch:
         return random.choice(children)
 
     @staticmethod
-    def Simulation(child):
-        """ Use some simple and costless strategy to simulate """
-        # Deep copy first to avoid change the game_state in the node
-        gs_copy = copy.deepcopy(child.state.game_state)
+    def Simulation(child, played=None, max_depth=None, evaluator=None):
+        """ Use some simple and costless strategy to simulate
+
+        Args:
+            child: the node to simulate from
+            played: if a list, (player id, MoveSignature) of every simulated move is appended to it
+            max_depth: after this many moves the rest of the round is estimated by EstimateRoundScore,
+                None to play to the end of the round
+            evaluator: LinearEvaluator estimating the future rewards, None for CalculateFutureReward
+        """
+        # Copy first to avoid change the game_state in the node
+        gs_copy = CopyGameState(child.state.game_state)
         current_player_id = child.state.player_id
         move_count = 0
+        # The walls do not change before the end of the round
+        wall_free = [WallFree(plr_state) for plr_state in gs_copy.players]
         while gs_copy.TilesRemaining():
-            # Update move
-            plr_state = gs_copy.players[current_player_id]
-            moves = plr_state.GetAvailableMoves(gs_copy)
+            if move_count == max_depth:
+                # Truncated rollout, a static estimate of the end of the round
+                return [EstimateRoundScore(gs_copy, 0, evaluator), EstimateRoundScore(gs_copy, 1, evaluator)], \
+                    move_count
             # TODO: provide different strategy for simulation the future
             # Strategy 1 -- random select:
-            # selected = random.choice(moves)
-            # Strategy 2 -- naive select:
-            selected = MonteCarloTreeSearch._NaiveMoveSelected(moves)
+            # selected = random.choice(plr_state.GetAvailableMoves(gs_copy))
+            # Strategy 2 -- naive select, same as _NaiveMoveSelected without building every move:
+            selected = GreedyRolloutMove(gs_copy, current_player_id, wall_free[current_player_id])
             gs_copy.ExecuteMove(current_player_id, selected)
+            if played is not None:
+                played.append((current_player_id, MoveSignature(selected)))
             # Change to the opponent
             current_player_id = 1 - current_player_id
             move_count += 1
+        # ScoreRound changes the walls, which the copy still shares with the node
+        gs_copy.players = [CopyPlayerState(plr_state, scoring=True) for plr_state in gs_copy.players]
         # TODO: reward can be change to improve
-        reward0 = gs_copy.players[0].ScoreRound()[0] + CalculateFutureReward(gs_copy, 0)
-        reward1 = gs_copy.players[1].ScoreRound()[0] + CalculateFutureReward(gs_copy, 1)
-        return [reward0, reward1], move_count
+        future_reward = evaluator.FutureReward if evaluator is not None else CalculateFutureReward
+        round_scores = [plr_state.ScoreRound()[0] for plr_state in gs_copy.players]
+        return [round_scores[0] + future_reward(gs_copy, 0), round_scores[1] + future_reward(gs_copy, 1)], move_count
 
     @staticmethod
-    def Backup(node, rewards, move_count, discount_factor):
-        """ Back propagation """
+    def Backup(node, rewards, move_count, discount_factor, played=None):
+        """ Back propagation
+
+        With `played` (RAVE), the moves of the simulation and of the path below
+        every node update the AMAF statistics of the node.
+        """
         # Get the rewards after discount
         real_rewards = [reward * (discount_factor ** move_count) for reward in rewards]
         # Back propagation
         p_node = node
+        child = None
         while p_node is not None:
             # Increase the visited count
             p_node.state.visited_count += 1
             # Instead change the win score directly, add it into it.
             p_node.state.win_scores_sum[0] += real_rewards[0]
             p_node.state.win_scores_sum[1] += real_rewards[1]
+            if played is not None:
+                if child is not None:
+                    played.append((p_node.state.player_id, MoveSignature(child.state.pre_move)))
+                MonteCarloTreeSearch._UpdateAmaf(p_node, played, real_rewards)
+            child = p_node
             p_node = p_node.parent
 
+    @staticmethod
+    def _UpdateAmaf(node, played, rewards):
+        """Add the moves played by the node's player after the node, the first time each, to its AMAF statistics"""
+        player_id = node.state.player_id
+        if node.amaf is None:
+            node.amaf = {}
+        seen = set()
+        for move_player_id, signature in played:
+            if move_player_id == player_id and signature not in seen:
+                seen.add(signature)
+                amaf = node.amaf.get(signature)
+                if amaf is None:
+                    node.amaf[signature] = [1, rewards[player_id]]
+                else:
+                    amaf[0] += 1
+                    amaf[1] += rewards[player_id]
+
     @staticmethod
     def _NaiveMoveSelected(moves):
         """ Use for simulation to provide more reasonable choice"""
@@ -1,98 +1,320 @@
-import copy
-from .game_tree import Node, State
+from .game_tree import Node, State, MoveSignature
 from .MCTS import MonteCarloTreeSearch
+from .state_hash import CanonicalMove
+from .transposition import TranspositionTable, Entry, EXACT, LOWER, UPPER
+import math
 import time
 
-count = 1
 
-
-def _SetDepth(moves_size):
-    if moves_size > 17:
-        return 0
-    elif moves_size > 7:
-        return 1
-    else:
-        return 100
+class _SearchTimeout(Exception):
+    """Raised inside the search once the deadline has passed"""
 
 
 class Minimax:
-    def __init__(self, player_id, game_state, moves):
+    """Alpha-beta search within the current round, by iterative deepening
+
+    The search is run again with a depth one deeper each time, until the
+    deadline or until a search reaches the end of the round everywhere. The
+    move of the last completed depth is played. The best child found for every
+    node is kept and tried first by the next depth, so each depth starts with
+    the principal variation of the previous one.
+
+    Positions reached through different move orders are looked up in a
+    transposition table. The other children are ordered by the best move of the
+    table, then the killer moves of the ply (moves that caused a cutoff in a
+    sibling position) and the history score of the move (how often and how deep
+    it caused a cutoff).
+
+    The value of a node is the score difference of player 0 over player 1 at
+    the end of the search line: player 0 maximizes it, player 1 minimizes it.
+    Every node, window and table entry uses this one frame, so the bounds can
+    be passed from any node to any other.
+
+    With a SearchPool, the first root child is searched here and the other
+    ones by the worker processes, bounded by the best root value so far.
+    Among root children of equal value, the first in the search order is
+    played, in parallel as in a serial search.
+
+    Attributes:
+        root: the root node of the tree
+        time_limit: seconds of search, counted from the creation of the object
+        max_depth: the deepest depth searched
+        depth: the last completed depth
+        best_children: node -> its best child in the latest search, used for move ordering
+        tt: the TranspositionTable, None if disabled
+        move_ordering: whether the killer and history heuristics are used
+        pool: the SearchPool searching the root children, None if the search runs on this core only
+        killers: ply -> the last two moves that caused a cutoff at that ply
+        history: move key -> history score
+        count: number of nodes visited
+        depth_counts: number of nodes visited by each completed depth
+        timed_out: whether the deadline stopped the search
+    """
+
+    # Number of killer moves kept for every ply
+    NUM_KILLERS = 2
+
+    def __init__(self, player_id, game_state, moves, stats=None, time_limit=0.85, max_depth=100,
+                 tt=None, tt_size=100000, move_ordering=True, pool=None):
+        """Init the search
+
+        Args:
+            player_id: the ID of the player
+            game_state: global information about the game, provided by the game manager
+            moves: the move action list
+            stats: SearchStats collecting a record of every search, None to disable the instrumentation
+            time_limit: seconds of search, counted from the creation of the object
+            max_depth: the deepest depth searched
+            tt: a TranspositionTable to use, e.g. kept by the player from move to move
+            tt_size: capacity of the table created when tt is None, 0 to disable the table
+            move_ordering: whether to use the killer and history heuristics
+            pool: a SearchPool to search the root children in parallel, None to search on this core only
+        """
+        self.begin = time.time()
+        self.stats = stats
+        self.record = None
         self.root = Node(State(player_id, game_state, None), None)
-        print("Before Simplify: ", len(moves))
         self.root.ExpandChildren(moves)
-        print("After Simplify: ", len(self.root.children))
-        self.depth = _SetDepth(len(self.root.children))
-        print("Depth: ", self.depth)
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.deadline = None
+        self.depth = -1
+        self.best_children = {}
+        if tt is None and tt_size > 0:
+            tt = TranspositionTable(tt_size)
+        self.tt = tt
+        self.move_ordering = move_ordering
+        self.killers = {}
+        self.history = {}
+        self.pool = pool
+        # Best value at the root so far, and the same value shared by the parent when searching in a worker
+        # (in the frame of the whole search, see the class documentation)
+        self.root_bound = None
+        self.shared_bound = None
         self.count = 0
+        self.depth_counts = []
+        self.timed_out = False
+        self.cut_by_depth = False
+
+    @staticmethod
+    def _Evaluation(rewards):
+        """Value of the rewards of a search line: the score difference of player 0 over player 1"""
+        return rewards[0] - rewards[1]
+
+    def _OrderedChildren(self, node, ply, tt_move=None, factory_order=None):
+        best_child = self.best_children.get(node)
+        if tt_move is None and not self.move_ordering:
+            if best_child is None:
+                return node.children
+            return [best_child] + [child for child in node.children if child is not best_child]
+        killers = self.killers.get(ply, ())
+
+        def Priority(child):
+            if child is best_child:
+                return 3, 0
+            move = child.state.pre_move
+            if tt_move is not None and CanonicalMove(move, factory_order) == tt_move:
+                return 2, 0
+            if not self.move_ordering:
+                return 0, 0
+            key = MoveSignature(move)
+            return (1 if key in killers else 0), self.history.get(key, 0)
 
-    def minimax(self, node, depth, alpha, beta, player_id):
+        # sorted is stable: ties keep the order of GetAvailableMoves
+        return sorted(node.children, key=Priority, reverse=True)
+
+    def _RecordCutoff(self, child, depth, ply):
+        if not self.move_ordering:
+            return
+        key = MoveSignature(child.state.pre_move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+        killers = self.killers.setdefault(ply, [])
+        if key not in killers:
+            killers.insert(0, key)
+            del killers[self.NUM_KILLERS:]
+
+    def minimax(self, node, depth, alpha, beta, player_id, ply=1):
         self.count += 1
-        father_player_id = 1 - player_id
-        if depth == 0 or node.state.game_state.TilesRemaining() is False:
+        if time.time() > self.deadline:
+            raise _SearchTimeout()
+        game_state = node.state.game_state
+        tt_key = factory_order = tt_move = None
+        if self.tt is not None:
+            tt_key, factory_order = self.tt.Key(game_state, player_id)
+            entry = self.tt.Probe(tt_key)
+            if entry is not None:
+                tt_move = entry.move
+                if entry.complete or entry.depth >= depth:
+                    if entry.flag == EXACT or (entry.flag == LOWER and entry.value >= beta) or (
+                            entry.flag == UPPER and entry.value <= alpha):
+                        if not entry.complete:
+                            self.cut_by_depth = True
+                        return self._Evaluation(entry.rewards), entry.rewards
+        if depth == 0 or game_state.TilesRemaining() is False:
+            complete = not game_state.TilesRemaining()
+            if not complete:
+                # A deeper search would see more of the round
+                self.cut_by_depth = True
             # Reuse the simulation in MonteCarloTreeSearch
             rewards, move_count = MonteCarloTreeSearch.Simulation(node)
-            father_player_reward = rewards[father_player_id]
-            if father_player_id == 1:
-                father_player_reward *= -1
-            return father_player_reward, rewards
+            if self.record is not None:
+                self.record.AddRollout(move_count)
+            if tt_key is not None:
+                self.tt.Store(tt_key, Entry(depth, EXACT, None, rewards, None, complete))
+            return self._Evaluation(rewards), rewards
+        if len(node.children) == 0:
+            node.ExpandChildren()
+        # Whether this subtree is cut by the depth is recorded apart from the rest of the search
+        cut_by_depth, self.cut_by_depth = self.cut_by_depth, False
+        alpha_orig, beta_orig = alpha, beta
+        best_child = None
+        flag = EXACT
         if player_id == 0:
             max_eval = float('-inf')
             max_rewards = None
-            if len(node.children) == 0:
-                node.ExpandChildren()
-            for child in node.children:
-                evaluation, rewards = self.minimax(child, depth - 1, alpha, beta, 1)
-                if evaluation > max_eval or (
-                        evaluation == max_eval and rewards[0] - rewards[1] > max_rewards[0] - max_rewards[1]):
+            for child in self._OrderedChildren(node, ply, tt_move, factory_order):
+                evaluation, rewards = self.minimax(child, depth - 1, alpha, beta, 1, ply + 1)
+                if evaluation > max_eval:
                     max_eval = evaluation
                     max_rewards = rewards
+                    best_child = child
                 alpha = max(alpha, evaluation)
+                if ply == 1 and self.shared_bound is not None:
+                    alpha, beta = self.SharedWindow(alpha, beta, player_id)
                 if beta <= alpha:
+                    flag = LOWER
+                    self._RecordCutoff(child, depth, ply)
                     break
-            return -max_rewards[1], max_rewards
+            if flag == EXACT and max_eval <= alpha_orig:
+                flag = UPPER
+            value, best_rewards = max_eval, max_rewards
         else:
             min_eval = float('inf')
             min_rewards = None
-            if len(node.children) == 0:
-                node.ExpandChildren()
-            for child in node.children:
-                evaluation, rewards = self.minimax(child, depth - 1, alpha, beta, 0)
-                if evaluation < min_eval or (
-                        evaluation == min_eval and rewards[0] - rewards[1] < min_rewards[0] - min_rewards[1]):
+            for child in self._OrderedChildren(node, ply, tt_move, factory_order):
+                evaluation, rewards = self.minimax(child, depth - 1, alpha, beta, 0, ply + 1)
+                if evaluation < min_eval:
                     min_eval = evaluation
                     min_rewards = rewards
+                    best_child = child
                 beta = min(beta, evaluation)
+                if ply == 1 and self.shared_bound is not None:
+                    alpha, beta = self.SharedWindow(alpha, beta, player_id)
                 if beta <= alpha:
+                    flag = UPPER
+                    self._RecordCutoff(child, depth, ply)
                     break
-            return min_rewards[0], min_rewards
+            if flag == EXACT and min_eval >= beta_orig:
+                flag = LOWER
+            value, best_rewards = min_eval, min_rewards
+        self.best_children[node] = best_child
+        complete = not self.cut_by_depth
+        self.cut_by_depth = cut_by_depth or self.cut_by_depth
+        if tt_key is not None:
+            self.tt.Store(tt_key, Entry(depth, flag, value, best_rewards,
+                                        CanonicalMove(best_child.state.pre_move, factory_order), complete))
+        return value, best_rewards
+
+    @staticmethod
+    def BoundWindow(alpha, beta, bound, player_id):
+        """Narrow the window of a root child (`player_id` to move) with the best root value so far
+
+        The window stays open at the bound itself: a child as good as the best
+        one gets its exact value, so the ties can be broken by the search order.
+        """
+        if player_id == 1:
+            return max(alpha, math.nextafter(bound, float('-inf'))), beta
+        return alpha, min(beta, math.nextafter(bound, float('inf')))
 
-    def _ChooseBestChild(self):
+    def SharedWindow(self, alpha, beta, player_id):
+        """BoundWindow with the best root value shared by the parent, in a worker"""
+        if self.shared_bound is None:
+            return alpha, beta
+        return self.BoundWindow(alpha, beta, self.shared_bound.value, player_id)
+
+    def _ChooseBestChild(self, depth):
+        """Search every root child, the first one with a full window and the others bounded by the best so far
+
+        In parallel mode the first child is searched here and the others by the
+        pool (young brothers wait), with the best value so far as shared bound.
+        The results come in any order: a tie goes to the child first in the
+        search order, as in a serial search.
+        """
+        root_player = self.root.state.player_id
         best_child = None
+        best_index = None
         best_rewards = None
-        if self.root.state.player_id == 0:
-            max_eval = float('-inf')
-            for child in self.root.children:
-                evaluation, rewards = self.minimax(child, self.depth, float('-inf'), float('inf'), 1)
-                if evaluation > max_eval or (
-                        evaluation == max_eval and rewards[0] - rewards[1] > best_rewards[0] - best_rewards[1]):
-                    max_eval = evaluation
-                    best_child = child
-                    best_rewards = rewards
-        else:
-            min_eval = float('inf')
-            for child in self.root.children:
-                evaluation, rewards = self.minimax(child, self.depth, float('-inf'), float('inf'), 0)
-                if evaluation < min_eval or (
-                        evaluation == min_eval and rewards[0] - rewards[1] < best_rewards[0] - best_rewards[1]):
-                    min_eval = evaluation
-                    best_child = child
-                    best_rewards = rewards
-        print("best_rewards: ", best_rewards[0], best_rewards[1])
-        return best_child
+        best_eval = float('-inf') if root_player == 0 else float('inf')
+        children = self._OrderedChildren(self.root, 0)
+        for index, child, evaluation, rewards in self._SearchRootChildren(children, depth):
+            if evaluation == best_eval:
+                better = index < best_index
+            elif root_player == 0:
+                better = evaluation > best_eval
+            else:
+                better = evaluation < best_eval
+            if better:
+                best_eval = evaluation
+                best_child = child
+                best_index = index
+                best_rewards = rewards
+                self.best_children[self.root] = child
+                if self.pool is not None:
+                    self.pool.SetBound(best_eval)
+            self.root_bound = best_eval
+        return best_child, best_rewards
+
+    def _SearchRootChildren(self, children, depth):
+        """Yield (index, child, evaluation, rewards) of every root child, in the order the searches finish"""
+        child_player = 1 - self.root.state.player_id
+        for index, child in enumerate(children):
+            if index == 1 and self.pool is not None:
+                for child, evaluation, rewards, count, cut_by_depth in self.pool.SearchChildren(
+                        children[1:], depth, self.deadline):
+                    self.count += count
+                    if evaluation is None:
+                        raise _SearchTimeout()
+                    # Whether a deeper search would see more of the round in the worker's subtree
+                    self.cut_by_depth = self.cut_by_depth or cut_by_depth
+                    yield children.index(child), child, evaluation, rewards
+                return
+            alpha, beta = float('-inf'), float('inf')
+            if index > 0:
+                alpha, beta = self.BoundWindow(alpha, beta, self.root_bound, child_player)
+            evaluation, rewards = self.minimax(child, depth, alpha, beta, child_player)
+            yield index, child, evaluation, rewards
 
     def FindNextMove(self):
-        begin = time.time()
-        best_child = self._ChooseBestChild()
-        print("Time cost: ", time.time() - begin)
-        print("Iteration: ", self.count)
+        if self.stats is not None:
+            self.record = self.stats.NewRecord("Minimax", self.root.state.player_id, len(self.root.children))
+        self.deadline = self.begin + self.time_limit
+        if self.tt is not None:
+            tt_probes, tt_hits = self.tt.probes, self.tt.hits
+        best_child = None
+        for depth in range(self.max_depth + 1):
+            self.cut_by_depth = False
+            count = self.count
+            try:
+                child, _ = self._ChooseBestChild(depth)
+            except _SearchTimeout:
+                self.timed_out = True
+                break
+            best_child, self.depth = child, depth
+            self.depth_counts.append(self.count - count)
+            if not self.cut_by_depth:
+                # Every line reached the end of the round, deeper searches would be the same
+                break
+        if best_child is None:
+            # Not even depth 0 was completed: best child seen so far
+            best_child = self.best_children.get(self.root, self.root.children[0])
+        if self.record is not None:
+            self.record.extra["depth"] = self.depth
+            self.record.extra["depth_counts"] = self.depth_counts
+            if self.tt is not None:
+                self.record.extra["tt_hits"] = self.tt.hits - tt_hits
+                self.record.extra["tt_probes"] = self.tt.probes - tt_probes
+            self.record.Lap("search")
+            self.record.iterations = self.count
+            self.record.Finish(self.root)
+            self.stats.Add(self.record)
         return best_child.state.pre_move
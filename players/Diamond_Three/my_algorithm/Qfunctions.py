@@ -1,3 +1,7 @@
+import math
+from .game_tree import MoveSignature
+
+
 def AverageQfunc(node):
     """average Q function
     Use the average reward in the node to defined whether it is good or not
@@ -35,3 +39,28 @@ def AggressiveQfunc(node):
     father_id = 1 - node.state.player_id
     child_id = node.state.player_id
     return (node.state.win_scores_sum[father_id] - node.state.win_scores_sum[child_id]) / node.state.visited_count
+
+
+def RaveQfunc(q_func, equivalence=5):
+    """RAVE Q function
+    Blend the Q value of a child with the AMAF value of its move: the average reward of the father over
+    every simulation where the father's player played the same move (see MoveSignature) at any later time.
+    The AMAF value is available much sooner, and its weight fades as the child gets its own visits.
+
+    Args:
+        q_func: the Q function to blend with, it must value the father's reward like AverageQfunc
+        equivalence: number of visits at which both values have about the same weight
+
+    Returns:
+        the blended Q function
+    """
+    def Qfunc(node):
+        parent = node.parent
+        if parent is None or not parent.amaf:
+            return q_func(node)
+        amaf = parent.amaf.get(MoveSignature(node.state.pre_move))
+        if amaf is None:
+            return q_func(node)
+        beta = math.sqrt(equivalence / (3 * node.state.visited_count + equivalence))
+        return (1 - beta) * q_func(node) + beta * amaf[1] / amaf[0]
+    return Qfunc
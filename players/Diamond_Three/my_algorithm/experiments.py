@@ -0,0 +1,363 @@
+import contextlib
+import copy
+import io
+import random
+import sys
+import time
+from advance_model import AdvanceGameRunner
+from utils import SameTG
+from . import MCTS
+from . import Qfunctions
+from .MAB.UCB import UCB
+from .game_tree import Node, State, CalculateFutureReward
+from .mcts_player import MCTSPlayer
+from .Minimax import Minimax
+from .opening_book import RoundStartPosition
+from .parallel_search import AvailableCores, CreateSearchPool
+from .round_solver import RoundSolver, RemainingMoves
+from .time_manager import TimeManager
+
+
+def FixedPositions(num_positions, base_seed=2020):
+    """A fixed set of positions, the same in every run
+
+    Each one is a round-start position (see RoundStartPosition) followed by
+    a few naive moves, so that the set covers the beginning, the middle and the
+    end of a round.
+
+    Returns:
+        list of (seed, game_state, player_id)
+    """
+    rng = random.Random(base_seed)
+    positions = []
+    for _ in range(num_positions):
+        seed = rng.randint(0, 1e10)
+        game_state, player_id = RoundStartPosition(seed, rng.randint(0, 2))
+        for _ in range(rng.randint(0, 10)):
+            if not game_state.TilesRemaining():
+                break
+            moves = game_state.players[player_id].GetAvailableMoves(game_state)
+            game_state.ExecuteMove(player_id, MCTS.MonteCarloTreeSearch._NaiveMoveSelected(moves))
+            player_id = 1 - player_id
+        if game_state.TilesRemaining():
+            positions.append((seed, game_state, player_id))
+    return positions
+
+
+def RunMinimax(positions, max_depth, time_limit, **minimax_args):
+    """Run Minimax on every position
+
+    The rollouts are seeded from the position, so that two settings compared on
+    the same positions start from the same random sequence.
+
+    Returns:
+        list of the finished Minimax searches, one per position
+    """
+    searches = []
+    for seed, game_state, player_id in positions:
+        random.seed(seed)
+        moves = game_state.players[player_id].GetAvailableMoves(game_state)
+        minimax = Minimax(player_id, game_state, moves, time_limit=time_limit, max_depth=max_depth,
+                          **minimax_args)
+        minimax.FindNextMove()
+        searches.append(minimax)
+    return searches
+
+
+def CompareMinimaxOrdering(options):
+    """Node counts per depth without and with the transposition table and the killer/history heuristics"""
+    positions = FixedPositions(options.positions, options.seed)
+    settings = [("plain", {"tt_size": 0, "move_ordering": False}),
+                ("tt", {"move_ordering": False}),
+                ("tt+killers+history", {})]
+    results = {}
+    for name, minimax_args in settings:
+        start = time.time()
+        results[name] = [minimax.depth_counts for minimax in
+                         RunMinimax(positions, options.depth, options.timeLimit, **minimax_args)]
+        print("{}: {:.1f}s".format(name, time.time() - start))
+    print("{} positions, nodes per depth (only the positions every setting completed)".format(len(positions)))
+    print("depth  positions" + "".join("{:>20}".format(name) for name, _ in settings))
+    for depth in range(options.depth + 1):
+        done = [i for i in range(len(positions)) if all(len(results[name][i]) > depth for name, _ in settings)]
+        if not done:
+            break
+        totals = [sum(results[name][i][depth] for i in done) for name, _ in settings]
+        line = "{:>5}  {:>9}".format(depth, len(done))
+        for total in totals:
+            line += "{:>12} ({:>5.1%})".format(total, total / totals[0])
+        print(line)
+
+
+def MinimaxSpeedup(options):
+    """Time of a fixed-depth Minimax search per number of worker processes, and the speedup over one core"""
+    positions = FixedPositions(options.positions, options.seed)
+    if options.workers:
+        workers_list = [int(workers) for workers in options.workers.split(",")]
+    else:
+        workers_list = [1]
+        while workers_list[-1] * 2 <= max(2, AvailableCores()):
+            workers_list.append(workers_list[-1] * 2)
+    print("{} positions, depth {}, {} cores available".format(len(positions), options.depth, AvailableCores()))
+    print("workers      time    speedup       nodes")
+    base_time = None
+    for workers in workers_list:
+        pool = CreateSearchPool(workers) if workers > 1 else None
+        if workers > 1 and pool is None:
+            print("{:>7}  no worker processes here".format(workers))
+            continue
+        start = time.time()
+        searches = RunMinimax(positions, options.depth, options.timeLimit, pool=pool)
+        elapsed = time.time() - start
+        if pool is not None:
+            pool.Close()
+        incomplete = sum(1 for minimax in searches if minimax.timed_out)
+        if base_time is None:
+            base_time = elapsed
+        print("{:>7}  {:>7.2f}s  {:>8.2f}  {:>10}{}".format(
+            workers, elapsed, base_time / elapsed, sum(minimax.count for minimax in searches),
+            "  ({} searches hit the time limit)".format(incomplete) if incomplete else ""))
+
+
+def RoundSolverTimes(options):
+    """Time of the exact round solver, per number of moves left in the round"""
+    rng = random.Random(options.seed)
+    times = {}
+    for _ in range(options.positions):
+        seed = rng.randint(0, 1e10)
+        game_state, player_id = RoundStartPosition(seed, rng.randint(0, 2))
+        random.seed(seed)
+        # Naive moves until the end of the round, solving every position on the way
+        while game_state.TilesRemaining():
+            remaining_moves = RemainingMoves(game_state)
+            if remaining_moves <= options.maxMoves:
+                # A new solver every time: the times are those of a cold table
+                solver = RoundSolver()
+                solver.Solve(game_state, player_id, options.timeLimit)
+                _, solve_time, solved = solver.solve_times[-1]
+                times.setdefault(remaining_moves, []).append((solve_time, solved, solver.nodes))
+            moves = game_state.players[player_id].GetAvailableMoves(game_state)
+            game_state.ExecuteMove(player_id, MCTS.MonteCarloTreeSearch._NaiveMoveSelected(moves))
+            player_id = 1 - player_id
+    print("moves left  positions   solved    median       p95       max   median nodes")
+    for remaining_moves in sorted(times):
+        results = times[remaining_moves]
+        solve_times = sorted(solve_time for solve_time, _, _ in results)
+        nodes = sorted(count for _, _, count in results)
+        print("{:>10}  {:>9}  {:>7}  {:>7.3f}s  {:>7.3f}s  {:>7.3f}s  {:>13}".format(
+            remaining_moves, len(results), sum(1 for _, solved, _ in results if solved),
+            solve_times[len(solve_times) // 2], solve_times[min(len(solve_times) - 1, int(0.95 * len(solve_times)))],
+            solve_times[-1], nodes[len(nodes) // 2]))
+
+
+def _SameMove(move, other):
+    return move[0] == other[0] and move[1] == other[1] and SameTG(move[2], other[2])
+
+
+def IterationsToConverge(mcts, reference_move, max_iterations, chunk_time=0.02):
+    """Search in short chunks, return the iterations after which the chosen move stays reference_move
+
+    Returns:
+        the number of iterations, None if the move is not the reference one at max_iterations
+    """
+    converged = None
+    mcts.time_limit = chunk_time
+    while mcts.root.state.visited_count < max_iterations:
+        move = mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+        if not _SameMove(move, reference_move):
+            converged = None
+        elif converged is None:
+            converged = mcts.root.state.visited_count
+    return converged
+
+
+def RaveIterations(options):
+    """Iterations MCTS needs to settle on the move of a long search, without and with RAVE"""
+    positions = FixedPositions(options.positions, options.seed)
+    settings = [("plain", {}), ("rave", {"rave": True})]
+    results = {name: [] for name, _ in settings}
+    for seed, game_state, player_id in positions:
+        moves = game_state.players[player_id].GetAvailableMoves(game_state)
+        random.seed(seed)
+        reference = MCTS.MonteCarloTreeSearch(player_id, game_state, moves, options.timeLimit, UCB(0.5), 1)
+        reference_move = reference.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+        line = "seed {} ({} moves, reference {} iterations):".format(
+            seed, len(moves), reference.root.state.visited_count)
+        for name, mcts_args in settings:
+            random.seed(seed)
+            mcts = MCTS.MonteCarloTreeSearch(player_id, game_state, moves, 0, UCB(0.5), 1, **mcts_args)
+            iterations = IterationsToConverge(mcts, reference_move, options.iterations)
+            results[name].append(iterations)
+            line += " {} {}".format(name, iterations if iterations is not None else "-")
+        print(line)
+    print("{} positions, iterations until the move of the long search is chosen for good".format(len(positions)))
+    print("setting   converged    median      mean")
+    for name, _ in settings:
+        # A search that never settles counts as the whole budget
+        iterations = sorted(it if it is not None else options.iterations for it in results[name])
+        print("{:<8}  {:>9}  {:>8}  {:>8.0f}".format(
+            name, sum(1 for it in results[name] if it is not None), iterations[len(iterations) // 2],
+            sum(iterations) / len(iterations)))
+
+
+def NaiveListSimulation(node):
+    """The rollout as it was before GreedyRolloutMove: _NaiveMoveSelected on the full move list"""
+    gs_copy = copy.deepcopy(node.state.game_state)
+    current_player_id = node.state.player_id
+    move_count = 0
+    while gs_copy.TilesRemaining():
+        moves = gs_copy.players[current_player_id].GetAvailableMoves(gs_copy)
+        gs_copy.ExecuteMove(current_player_id, MCTS.MonteCarloTreeSearch._NaiveMoveSelected(moves))
+        current_player_id = 1 - current_player_id
+        move_count += 1
+    reward0 = gs_copy.players[0].ScoreRound()[0] + CalculateFutureReward(gs_copy, 0)
+    reward1 = gs_copy.players[1].ScoreRound()[0] + CalculateFutureReward(gs_copy, 1)
+    return [reward0, reward1], move_count
+
+
+def RolloutSpeed(options):
+    """Playouts per second of the rollout policy, with the full move list and with GreedyRolloutMove"""
+    positions = FixedPositions(options.positions, options.seed)
+    nodes = [Node(State(player_id, game_state, None), None) for _, game_state, player_id in positions]
+    settings = [("move list", NaiveListSimulation), ("greedy", MCTS.MonteCarloTreeSearch.Simulation)]
+    results = {}
+    for name, simulation in settings:
+        random.seed(options.seed)
+        outcomes = []
+        start = time.time()
+        for _ in range(options.iterations // len(nodes)):
+            for node in nodes:
+                outcomes.append(simulation(node))
+        results[name] = (len(outcomes) / (time.time() - start), outcomes)
+    # Same random sequence and the same policy: the playouts must be the same
+    same = sum(1 for a, b in zip(results["move list"][1], results["greedy"][1]) if a == b)
+    print("{} positions, {} playouts, {} identical".format(len(nodes), len(results["greedy"][1]), same))
+    for name, _ in settings:
+        print("{:<10} {:>8.0f} playouts/s  x{:.2f}".format(
+            name, results[name][0], results[name][0] / results["move list"][0]))
+
+
+def _RolloutDepths(options):
+    """The rollout depths of -r, None for the rollouts played to the end of the round"""
+    return [None if depth == "full" else int(depth) for depth in options.rolloutDepths.split(",")]
+
+
+def PlayMatch(players, seed):
+    """Play one game between two MCTSPlayer, return the score difference of player 0"""
+    game_runner = AdvanceGameRunner(players, seed=seed, time_limit=10, startRound_time_limit=10, displayer=None,
+                                    players_namelist=["Red", "Blue"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        replay = game_runner.Run()
+    return replay[0][0] - replay[1][0]
+
+
+def RolloutDepth(options):
+    """Rollout depth against estimate error, iterations per second and strength at a fixed time per move
+
+    For every depth: the error of EstimateRoundScore against the rest of the
+    same rollout played out, the iterations per second of a search of -t
+    seconds, and colour-swapped games against the rollouts played to the end of
+    the round, both players with -t seconds per move.
+    """
+    positions = FixedPositions(options.positions, options.seed)
+    nodes = [Node(State(player_id, game_state, None), None) for _, game_state, player_id in positions]
+    game_seeds = random.Random(options.seed).sample(range(10 ** 9), options.games)
+    print("{} positions, {:.2f}s per move, {} game pairs against full rollouts".format(
+        len(nodes), options.timeLimit, len(game_seeds)))
+    print("depth  rollout moves  estimate error  iterations/s   won drawn lost  mean difference")
+    for depth in _RolloutDepths(options):
+        errors = []
+        rollout_moves = []
+        for node in nodes:
+            for rollout_seed in range(20):
+                # Same random sequence: the truncated rollout is the start of the full one
+                random.seed(rollout_seed)
+                estimate, move_count = MCTS.MonteCarloTreeSearch.Simulation(node, None, depth)
+                random.seed(rollout_seed)
+                outcome, _ = MCTS.MonteCarloTreeSearch.Simulation(node, None)
+                errors.extend(abs(a - b) for a, b in zip(estimate, outcome))
+                rollout_moves.append(move_count)
+        iterations = 0
+        for (seed, game_state, player_id), node in zip(positions, nodes):
+            random.seed(seed)
+            moves = game_state.players[player_id].GetAvailableMoves(game_state)
+            mcts = MCTS.MonteCarloTreeSearch(player_id, game_state, moves, options.timeLimit, UCB(0.5), 1,
+                                             rollout_depth=depth)
+            mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+            iterations += mcts.root.state.visited_count
+        line = "{:>5}  {:>13.1f}  {:>14.2f}  {:>12.0f}".format(
+            depth if depth is not None else "full", sum(rollout_moves) / len(rollout_moves),
+            sum(errors) / len(errors), iterations / (options.timeLimit * len(nodes)))
+        if depth is not None and game_seeds:
+            differences = []
+            for seed in game_seeds:
+                for truncated_id in (0, 1):
+                    players = [MCTSPlayer(player_id, UCB(0.5), time_manager=TimeManager(nominal_time=options.timeLimit),
+                                          round_search_time=options.timeLimit,
+                                          rollout_depth=depth if player_id == truncated_id else None)
+                               for player_id in (0, 1)]
+                    difference = PlayMatch(players, seed)
+                    differences.append(difference if truncated_id == 0 else -difference)
+            line += "   {:>3} {:>5} {:>4}  {:>15.1f}".format(
+                sum(1 for d in differences if d > 0), sum(1 for d in differences if d == 0),
+                sum(1 for d in differences if d < 0), sum(differences) / len(differences))
+        print(line)
+
+
+EXPERIMENTS = {
+    "minimax-ordering": CompareMinimaxOrdering,
+    "minimax-speedup": MinimaxSpeedup,
+    "round-solver": RoundSolverTimes,
+    "rave-iterations": RaveIterations,
+    "rollout-speed": RolloutSpeed,
+    "rollout-depth": RolloutDepth,
+}
+
+
+def loadParameter():
+    """
+    Processes the command used to run an experiment from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python -m players.Diamond_Three.my_algorithm.experiments <options>
+    EXAMPLES:   (1) python -m players.Diamond_Three.my_algorithm.experiments -e minimax-ordering -n 10 -d 3
+                    - node counts per depth of Minimax on 10 positions, with and without the transposition table
+                      and the move ordering heuristics
+                (2) python -m players.Diamond_Three.my_algorithm.experiments -e minimax-speedup -d 2 -j 1,2,4,8
+                    - time of a depth 2 Minimax search with 1, 2, 4 and 8 processes
+                (3) python -m players.Diamond_Three.my_algorithm.experiments -e round-solver -n 20 -m 8 -t 5
+                    - time of the exact round solver with 8 moves or less left in the round
+                (4) python -m players.Diamond_Three.my_algorithm.experiments -e rave-iterations -t 10 -i 3000
+                    - iterations MCTS needs, without and with RAVE, to settle on the move of a 10s search
+                (5) python -m players.Diamond_Three.my_algorithm.experiments -e rollout-speed -i 5000
+                    - playouts per second of the rollout policy, with and without the full move list
+                (6) python -m players.Diamond_Three.my_algorithm.experiments -e rollout-depth -t 0.2 -r 0,2,4,8,full -g 5
+                    - estimate error, iterations per second and games against full rollouts of truncated rollouts
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-e', '--experiment', type='choice', choices=sorted(EXPERIMENTS),
+                      help='experiment to run: ' + ', '.join(sorted(EXPERIMENTS)))
+    parser.add_option('-n', '--positions', type='int', help='number of positions (default: 10)', default=10)
+    parser.add_option('-d', '--depth', type='int', help='deepest search depth (default: 3)', default=3)
+    parser.add_option('-t', '--timeLimit', type='float', help='time limit of every search in seconds (default: 30)',
+                      default=30.0)
+    parser.add_option('-j', '--workers', help='comma separated numbers of processes (default: 1, 2, 4, ... cores)',
+                      default=None)
+    parser.add_option('-m', '--maxMoves', type='int', help='most moves left in the round to solve (default: 8)',
+                      default=8)
+    parser.add_option('-i', '--iterations', type='int', help='most iterations of a search (default: 3000)',
+                      default=3000)
+    parser.add_option('-r', '--rolloutDepths', help='comma separated rollout depths, full for no limit '
+                      '(default: 0,2,4,8,full)', default="0,2,4,8,full")
+    parser.add_option('-g', '--games', type='int', help='game pairs per setting (default: 5)', default=5)
+    parser.add_option('--seed', type='int', help='seed of the positions (default: 2020)', default=2020)
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+    assert options.experiment is not None, "Choose an experiment with -e"
+    return options
+
+
+if __name__ == '__main__':
+    options = loadParameter()
+    EXPERIMENTS[options.experiment](options)
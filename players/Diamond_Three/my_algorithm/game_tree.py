@@ -1,4 +1,6 @@
 import copy
+import weakref
+from utils import SameTG
 
 
 class Node:
@@ -8,7 +10,13 @@ class Node:
         state: Use to record the information about the game
         children: All the children that can generate by executing available move action, children state belong to
             opponent. We do self play. Children would only be generate through expansion process in MCTS.
-        parent: The parent node of the current node.
+        parent: The parent node of the current node, None for the root. Only a weak reference is kept:
+            without the cycle child <-> parent, a tree is freed as soon as its root is dropped instead of
+            by the garbage collector, whose pauses on big trees could overrun the time limit of a move.
+        pending_moves: moves not turned into children yet, best prior last. None unless the node
+            was expanded lazily (progressive widening).
+        amaf: MoveSignature -> [count, reward sum] of the moves played by the player of the node
+            anywhere after it (RAVE), None until the first update
 
     """
 
@@ -24,27 +32,84 @@ class Node:
         # Property for a tree node
         self.children = []
         self.parent = parent
+        self.pending_moves = None
+        self.amaf = None
 
-    def ExpandChildren(self, moves=None):
+    @property
+    def parent(self):
+        return self._parent() if self._parent is not None else None
+
+    @parent.setter
+    def parent(self, parent):
+        self._parent = weakref.ref(parent) if parent is not None else None
+
+    def __getstate__(self):
+        # Weak references can't be pickled (e.g. a pondered subtree sent back by the worker)
+        state = self.__dict__.copy()
+        state["_parent"] = self.parent
+        return state
+
+    def __setstate__(self, state):
+        parent = state.pop("_parent")
+        self.__dict__.update(state)
+        self.parent = parent
+
+    def ExpandChildren(self, moves=None, lazy=False):
         """Expand all the possible children of the node
 
         Generate all the possible children of the node, the next node belong to the opponent,
         We do self play to train ourselves
+
+        Args:
+            moves: the available moves, computed from the game state if None
+            lazy: keep every move, ordered by MovePrior, in pending_moves instead of generating the
+                children: they are added one by one by UnlockChildren
         """
-        opponent_id = 1 - self.state.player_id
         # Get all move based on the current game state
         if moves is None:
             moves = self.state.game_state.players[self.state.player_id].GetAvailableMoves(self.state.game_state)
+        if lazy:
+            # No simplification here, the moves with a poor prior are only unlocked late
+            player_state = self.state.game_state.players[self.state.player_id]
+            self.pending_moves = sorted(moves, key=lambda move: MovePrior(move, player_state))
+            return
         # Reduce the num of moves, do more iteration on the meaningful moves
         # print("Move:", len(moves))
         moves = _simplyMoves(moves)
         # print("Move:", len(moves))
         for move in moves:
-            # Get the next game_state: deep copy the current game_state and then execute the move.
-            next_gs = copy.deepcopy(self.state.game_state)
-            next_gs.ExecuteMove(self.state.player_id, move)
-            # Add the new node to its children
-            self.children.append(Node(State(opponent_id, next_gs, move), self))
+            self._AddChild(move)
+
+    def _AddChild(self, move):
+        # Get the next game_state: deep copy the current game_state and then execute the move.
+        next_gs = copy.deepcopy(self.state.game_state)
+        next_gs.ExecuteMove(self.state.player_id, move)
+        # Add the new node to its children
+        child = Node(State(1 - self.state.player_id, next_gs, move), self)
+        self.children.append(child)
+        return child
+
+    def UnlockChildren(self, count):
+        """Add pending moves as children, best prior first, until the node has `count` children"""
+        while self.pending_moves and len(self.children) < count:
+            self._AddChild(self.pending_moves.pop())
+
+    def IsExpanded(self):
+        return len(self.children) > 0 or self.pending_moves is not None
+
+    def FindChild(self, move):
+        """Return the child reached by `move`, None if it is not in the tree (e.g. simplified away)
+
+        A pending move is unlocked to become the child.
+        """
+        for child in self.children:
+            mid, fid, tgrab = child.state.pre_move
+            if mid == move[0] and fid == move[1] and SameTG(tgrab, move[2]):
+                return child
+        for i, (mid, fid, tgrab) in enumerate(self.pending_moves or []):
+            if mid == move[0] and fid == move[1] and SameTG(tgrab, move[2]):
+                return self._AddChild(self.pending_moves.pop(i))
+        return None
 
 
 class State:
@@ -76,6 +141,74 @@ class State:
         self.win_scores_sum = [0, 0]
 
 
+def _CopyDisplay(display):
+    display_copy = copy.copy(display)
+    display_copy.tiles = dict(display.tiles)
+    return display_copy
+
+
+def CopyPlayerState(player_state, scoring=False):
+    """Copy of a PlayerState for ExecuteMove, or for ScoreRound when `scoring`
+
+    Only what these methods change is copied, the rest is shared with the
+    original, which is much faster than a deepcopy.
+    """
+    plr_copy = copy.copy(player_state)
+    plr_copy.lines_number = list(player_state.lines_number)
+    plr_copy.lines_tile = list(player_state.lines_tile)
+    plr_copy.floor = list(player_state.floor)
+    plr_copy.floor_tiles = list(player_state.floor_tiles)
+    trace = player_state.player_trace
+    plr_copy.player_trace = copy.copy(trace)
+    if scoring:
+        plr_copy.grid_state = player_state.grid_state.copy()
+        plr_copy.number_of = dict(player_state.number_of)
+        plr_copy.player_trace.round_scores = list(trace.round_scores)
+    else:
+        plr_copy.player_trace.moves = trace.moves[:-1] + [list(trace.moves[-1])]
+    return plr_copy
+
+
+def CopyGameState(game_state):
+    """Copy of a GameState for ExecuteMove, see CopyPlayerState"""
+    gs_copy = copy.copy(game_state)
+    gs_copy.factories = [_CopyDisplay(factory) for factory in game_state.factories]
+    gs_copy.centre_pool = _CopyDisplay(game_state.centre_pool)
+    gs_copy.bag_used = list(game_state.bag_used)
+    gs_copy.players = [CopyPlayerState(plr) for plr in game_state.players]
+    return gs_copy
+
+
+def MoveSignature(move):
+    """What a move does, whatever position it is played in: (tile, source, destination line)
+
+    The source is the kind of move (from a factory or from the centre), not the factory itself.
+    """
+    mid, _, tgrab = move
+    return tgrab.tile_type, mid, tgrab.pattern_line_dest
+
+
+def MovePrior(move, player_state):
+    """Cheap prior of a move, used to order the children of a lazily expanded node
+
+    Tiles placed on the pattern lines are good, tiles on the floor line are
+    penalties, and completing a pattern line scores at the end of the round.
+
+    Args:
+        move: the move
+        player_state: the state of the player making the move
+
+    Returns:
+        The prior, higher is better
+    """
+    tgrab = move[2]
+    prior = tgrab.num_to_pattern_line - 2 * tgrab.num_to_floor_line
+    line = tgrab.pattern_line_dest
+    if tgrab.num_to_pattern_line > 0 and player_state.lines_number[line] + tgrab.num_to_pattern_line == line + 1:
+        prior += 1
+    return prior
+
+
 def CalculateFutureReward(game_state, player_id):
     """Use to calculate the reward of the future round
 
@@ -87,14 +220,93 @@ def CalculateFutureReward(game_state, player_id):
         The estimation value
     """
     player_state = game_state.players[player_id]
-    return _CalculateFutureBonus(game_state, player_id) - _CalculateFuturePenalty(player_state)
+    return _CalculateFutureBonus(game_state, player_id) - _CalculateFuturePenalty(player_state.lines_number)
+
+
+def EstimateRoundScore(game_state, player_id, evaluator=None):
+    """Static estimate of the reward of a rollout stopped before the end of the round
+
+    Estimates what ScoreRound + CalculateFutureReward would give at the end of
+    the round: the full pattern lines and the floor line are scored as they are,
+    and every unfinished pattern line is worth the points of its tile on the
+    wall, adjacency included, times the part of the line already filled.
+
+    Args:
+        game_state: a game state inside the round
+        player_id: The id of the player
+        evaluator: LinearEvaluator replacing CalculateFutureReward, None for the hand-tuned estimate
+
+    Returns:
+        The estimation value
+    """
+    player_state = game_state.players[player_id]
+    size = player_state.GRID_SIZE
+    # Same scoring as ScoreRound, on lists: much faster to index than the numpy wall
+    grid = player_state.grid_state.tolist()
+    lines_number = list(player_state.lines_number)
+    number_of = dict(player_state.number_of)
+    score_change = 0
+    unfinished = []
+    for line in range(size):
+        if lines_number[line] == 0:
+            continue
+        tile = player_state.lines_tile[line]
+        col = int(player_state.grid_scheme[line][tile])
+        if lines_number[line] == line + 1:
+            grid[line][col] = 1
+            score_change += _WallTileScore(grid, line, col)
+            number_of[tile] += 1
+            lines_number[line] = 0
+        else:
+            unfinished.append((line, col, lines_number[line] / (line + 1)))
+    for number, floor_score in zip(player_state.floor, player_state.FLOOR_SCORES):
+        score_change += number * floor_score
+    score = player_state.score + max(score_change, -player_state.score)
+    for line, col, filled in unfinished:
+        score += filled * _WallTileScore(grid, line, col)
+    if evaluator is not None:
+        # The opponent's full pattern lines go to its wall too
+        opponent = game_state.players[1 - player_id]
+        opponent_longest_row = max(int(opponent.grid_state[line].sum()) + (opponent.lines_number[line] == line + 1)
+                                   for line in range(size))
+        return score + evaluator.BoardReward(grid, lines_number, number_of, game_state.next_first_player == player_id,
+                                             opponent_longest_row)
+    cols = sum(1 for col in range(size) if all(grid[row][col] for row in range(size)))
+    sets = sum(1 for tile in number_of if number_of[tile] == size)
+    return score + _CalculateFutureBonus(game_state, player_id, cols, sets) - _CalculateFuturePenalty(lines_number)
+
+
+def _WallTileScore(grid_state, row, col):
+    """Points of a tile placed at (row, col) of the wall, as counted by ScoreRound"""
+    size = len(grid_state)
+    horizontal = 1
+    for j in range(col - 1, -1, -1):
+        if grid_state[row][j] == 0:
+            break
+        horizontal += 1
+    for j in range(col + 1, size):
+        if grid_state[row][j] == 0:
+            break
+        horizontal += 1
+    vertical = 1
+    for i in range(row - 1, -1, -1):
+        if grid_state[i][col] == 0:
+            break
+        vertical += 1
+    for i in range(row + 1, size):
+        if grid_state[i][col] == 0:
+            break
+        vertical += 1
+    if horizontal == 1 and vertical == 1:
+        return 1
+    return (horizontal if horizontal > 1 else 0) + (vertical if vertical > 1 else 0)
 
 
-def _CalculateFuturePenalty(player_state):
+def _CalculateFuturePenalty(lines_number):
     """Estimate the penalty in the future
 
     Args:
-        player_state: Player state
+        lines_number: number of tiles on every pattern line of the player
 
     Returns:
         The estimation value
@@ -102,29 +314,31 @@ def _CalculateFuturePenalty(player_state):
     future_penalty = 0
     # Punish unfinished pattern line
     for i in range(1, 5):
-        if player_state.lines_number[i] > 0:
+        if lines_number[i] > 0:
             future_penalty += 1
     # Extra Punishment for fourth pattern line
-    if player_state.lines_number[3] == 1:
+    if lines_number[3] == 1:
         future_penalty += 1.5
-    if player_state.lines_number[3] == 2:
+    if lines_number[3] == 2:
         future_penalty += 0.5
     # Extra Punishment for fifth pattern line
-    if player_state.lines_number[4] == 1:
+    if lines_number[4] == 1:
         future_penalty += 2
-    elif player_state.lines_number[4] == 2:
+    elif lines_number[4] == 2:
         future_penalty += 1
     return future_penalty
 
 
-def _CalculateFutureBonus(game_state, player_id):
-    """Estimate Future Bonus"""
+def _CalculateFutureBonus(game_state, player_id, cols=None, sets=None):
+    """Estimate Future Bonus, cols and sets completed are counted on the player's wall if None"""
     # TODO: provide a more accurate estimation
     future_bonus = 0
     player_state = game_state.players[player_id]
     # Only consider cols and sets
-    cols = player_state.GetCompletedColumns()
-    sets = player_state.GetCompletedSets()
+    if cols is None:
+        cols = player_state.GetCompletedColumns()
+    if sets is None:
+        sets = player_state.GetCompletedSets()
     bonus = (cols * player_state.COL_BONUS) + (sets * player_state.SET_BONUS)
     # Discount factor
     # bonus *= 0.5
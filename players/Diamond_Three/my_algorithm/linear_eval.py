@@ -0,0 +1,223 @@
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+from model import GameState
+from utils import Tile
+from .game_tree import CalculateFutureReward
+from .rollout_policy import GreedyRolloutMove, WallFree
+
+# Weights used by the linearPlayer when they exist
+DEFAULT_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linear_eval.json")
+
+# One weight per feature, in this order
+FEATURES = ["bias",
+            "line 1 filled", "line 2 filled", "line 3 filled", "line 4 filled", "line 5 filled",
+            "line 2 started", "line 3 started", "line 4 started", "line 5 started",
+            "wall tiles", "completed rows", "completed columns", "completed sets",
+            "rows with 4", "columns with 4", "colours with 4",
+            "longest row", "opponent longest row", "next first player"]
+
+_LOADED_WEIGHTS = {}
+
+
+def BoardFeatures(grid, lines_number, number_of, next_first, opponent_longest_row):
+    """Features of a player's board after the scoring of a round
+
+    Args:
+        grid: the wall, list of rows of 0/1
+        lines_number: number of tiles on every pattern line
+        number_of: tile -> number of tiles of this colour on the wall
+        next_first: whether the player has the first player token
+        opponent_longest_row: number of tiles of the opponent's fullest wall row
+
+    Returns:
+        list of floats, in the order of FEATURES
+    """
+    size = len(grid)
+    row_counts = [sum(row) for row in grid]
+    col_counts = [sum(grid[row][col] for row in range(size)) for col in range(size)]
+    features = [1.0]
+    features.extend(lines_number[line] / (line + 1) for line in range(size))
+    features.extend(1.0 if lines_number[line] > 0 else 0.0 for line in range(1, size))
+    features.append(sum(row_counts))
+    features.append(row_counts.count(size))
+    features.append(col_counts.count(size))
+    features.append(sum(1 for tile in Tile if number_of[tile] == size))
+    features.append(row_counts.count(size - 1))
+    features.append(col_counts.count(size - 1))
+    features.append(sum(1 for tile in Tile if number_of[tile] == size - 1))
+    features.append(max(row_counts))
+    features.append(opponent_longest_row)
+    features.append(1.0 if next_first else 0.0)
+    return features
+
+
+def PositionFeatures(game_state, player_id):
+    """BoardFeatures of a player in a game state at the end of a round, after the scoring"""
+    player_state = game_state.players[player_id]
+    opponent_grid = game_state.players[1 - player_id].grid_state
+    return BoardFeatures(player_state.grid_state.tolist(), player_state.lines_number, player_state.number_of,
+                         game_state.next_first_player == player_id,
+                         max(int(row.sum()) for row in opponent_grid))
+
+
+class LinearEvaluator:
+    """Linear estimate of the points a player still scores after the current round
+
+    A learned replacement of CalculateFutureReward: the dot product of fixed
+    board features (BoardFeatures) with weights fitted offline on self-play
+    games, by FitWeights.
+
+    Attributes:
+        weights: numpy array, one weight per entry of FEATURES
+    """
+
+    def __init__(self, weights):
+        assert len(weights) == len(FEATURES), "Expected {} weights".format(len(FEATURES))
+        self.weights = np.asarray(weights, dtype=float)
+
+    @staticmethod
+    def Load(file_name=DEFAULT_WEIGHTS):
+        """Load the weights (loaded once per process and file), None if the file does not exist"""
+        if file_name not in _LOADED_WEIGHTS:
+            evaluator = None
+            if os.path.exists(file_name):
+                with open(file_name) as f:
+                    evaluator = LinearEvaluator(json.load(f)["weights"])
+            _LOADED_WEIGHTS[file_name] = evaluator
+        return _LOADED_WEIGHTS[file_name]
+
+    def Save(self, file_name, **info):
+        with open(file_name, 'w') as f:
+            json.dump(dict(info, version=1, features=FEATURES, weights=self.weights.tolist()), f, indent=1,
+                      sort_keys=True)
+
+    def BoardReward(self, grid, lines_number, number_of, next_first, opponent_longest_row):
+        """Future points of a board, see BoardFeatures for the arguments"""
+        return float(np.dot(self.weights, BoardFeatures(grid, lines_number, number_of, next_first,
+                                                        opponent_longest_row)))
+
+    def FutureReward(self, game_state, player_id):
+        """Same use as CalculateFutureReward: the game state is at the end of a round, after the scoring"""
+        return float(np.dot(self.weights, PositionFeatures(game_state, player_id)))
+
+
+def SelfPlayData(num_games, seed):
+    """Round ends of self-play games with the rollout policy, and the points scored after each one
+
+    Returns:
+        (features, targets, hand_tuned, games): a feature matrix with one row per player and round end,
+        the points the player scored from there to the end of the game (end of game bonuses included),
+        CalculateFutureReward of the same positions, and the index of the game of every position
+    """
+    rng = random.Random(seed)
+    features = []
+    targets = []
+    hand_tuned = []
+    games = []
+    for game in range(num_games):
+        random.seed(rng.randint(0, 1e10))
+        game_state = GameState(2)
+        for plr in game_state.players:
+            plr.player_trace.StartRound()
+        samples = []
+        while True:
+            player_id = game_state.first_player
+            wall_free = [WallFree(plr) for plr in game_state.players]
+            while game_state.TilesRemaining():
+                game_state.ExecuteMove(player_id, GreedyRolloutMove(game_state, player_id, wall_free[player_id]))
+                player_id = 1 - player_id
+            game_state.ExecuteEndOfRound()
+            for player_id, plr in enumerate(game_state.players):
+                features.append(PositionFeatures(game_state, player_id))
+                hand_tuned.append(CalculateFutureReward(game_state, player_id))
+                samples.append((player_id, plr.score))
+            if any(plr.GetCompletedRows() > 0 for plr in game_state.players):
+                break
+            game_state.SetupNewRound()
+        for plr in game_state.players:
+            plr.EndOfGameScore()
+        targets.extend(game_state.players[player_id].score - score for player_id, score in samples)
+        games.extend(game for _ in samples)
+    return np.array(features, dtype=float), np.array(targets, dtype=float), np.array(hand_tuned, dtype=float), \
+        np.array(games)
+
+
+def FitRidge(features, targets, l2):
+    """Ridge regression weights, the bias (first feature) is not penalized"""
+    penalty = l2 * np.eye(features.shape[1])
+    penalty[0, 0] = 0
+    return np.linalg.solve(features.T @ features + penalty, features.T @ targets)
+
+
+def _Errors(predictions, targets):
+    """(root mean squared error, R^2)"""
+    residuals = targets - predictions
+    return np.sqrt(np.mean(residuals ** 2)), 1 - np.sum(residuals ** 2) / np.sum((targets - targets.mean()) ** 2)
+
+
+def FitWeights(weights_file, num_games, l2=1.0, test_share=0.2, seed=2021, data_file=None, verbose=True):
+    """Generate the self-play data, fit the weights and save them
+
+    The positions of the last test_share of the games are held out to compare
+    the fit with CalculateFutureReward, as it is and rescaled by a least
+    squares fit. The split is by game: the round ends of one game are too alike
+    to be on both sides.
+    """
+    start = time.time()
+    features, targets, hand_tuned, games = SelfPlayData(num_games, seed)
+    if data_file is not None:
+        np.savez(data_file, features=features, targets=targets, hand_tuned=hand_tuned, games=games)
+    train = games < int(num_games * (1 - test_share))
+    test = ~train
+    weights = FitRidge(features[train], targets[train], l2)
+    evaluator = LinearEvaluator(weights)
+    # The hand-tuned estimate is on another scale, give it its best affine rescaling
+    scale, offset = np.polyfit(hand_tuned[train], targets[train], 1)
+    results = {"linear": _Errors(features[test] @ weights, targets[test]),
+               "hand-tuned": _Errors(hand_tuned[test], targets[test]),
+               "hand-tuned rescaled": _Errors(scale * hand_tuned[test] + offset, targets[test])}
+    evaluator.Save(weights_file, games=num_games, positions=len(targets), l2=l2, seed=seed,
+                   test_rmse=float(results["linear"][0]))
+    if verbose:
+        print("{} games, {} positions ({} held out, from {} games), {:.1f}s".format(
+            num_games, len(targets), int(test.sum()), num_games - int(num_games * (1 - test_share)),
+            time.time() - start))
+        print("estimate                 rmse      R^2")
+        for name, (rmse, r2) in results.items():
+            print("{:<20} {:>8.2f} {:>8.3f}".format(name, rmse, r2))
+        for name, weight in zip(FEATURES, weights):
+            print("{:<22} {:>8.3f}".format(name, weight))
+        print("weights saved to {}".format(weights_file))
+    return evaluator
+
+
+def loadParameter():
+    """
+    Processes the command used to fit the linear evaluator from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python -m players.Diamond_Three.my_algorithm.linear_eval <options>
+    EXAMPLES:   (1) python -m players.Diamond_Three.my_algorithm.linear_eval -n 5000
+                    - fits the weights on the round ends of 5000 self-play games
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('--weights', help='weights file (default: {})'.format(DEFAULT_WEIGHTS), default=DEFAULT_WEIGHTS)
+    parser.add_option('-n', '--games', type='int', help='number of self-play games (default: 5000)', default=5000)
+    parser.add_option('--l2', type='float', help='ridge penalty (default: 1.0)', default=1.0)
+    parser.add_option('--testShare', type='float', help='share of the games held out (default: 0.2)',
+                      default=0.2)
+    parser.add_option('--data', help='also save the generated data to this .npz file', default=None)
+    parser.add_option('--seed', type='int', help='seed of the games (default: 2021)', default=2021)
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+    return options
+
+
+if __name__ == '__main__':
+    options = loadParameter()
+    FitWeights(options.weights, options.games, options.l2, options.testShare, options.seed, options.data)
@@ -0,0 +1,149 @@
+import copy
+import gc
+import time
+from advance_model import AdvancePlayer
+from . import MCTS
+from . import Qfunctions
+from . import search_stats
+from .opening_book import OpeningBook
+from .ponder import CreatePonderer
+from .round_solver import RoundSolver, RemainingMoves
+from .time_manager import TimeManager, CollectorPaused
+
+
+class MCTSPlayer(AdvancePlayer):
+    """Base class of the players searching with MonteCarloTreeSearch
+
+    Attributes:
+        mab: the Multi-armed bandits algorithm used in the Selection process
+        discount_factor: Use for discount the value in the future
+        time_manager: allocates the search time of every move, its hard limit follows the runner's time_limit
+        stats: SearchStats collecting a record of every search, None to disable the instrumentation
+        ponderer: searches during the opponent's turn, None when pondering is off
+        round_search_time: seconds of search in StartRound, which has its own time limit in the runner
+        round_tree: (root, player to move) searched by StartRound for the first moves of the round
+        book: OpeningBook consulted before searching
+        solver: RoundSolver playing the end of the round exactly
+        solve_threshold: the solver is tried once at most this many moves are left in the round
+        progressive_widening: whether the searches unlock the children gradually instead of simplifying the moves
+        rave: whether the searches blend AMAF statistics into the Q value of the Selection
+        rollout_depth: most moves of a simulation before it is scored by EstimateRoundScore, None for no limit
+        evaluator: LinearEvaluator estimating the future rewards in the simulations, None for the hand-tuned one
+    """
+
+    def __init__(self, _id, mab, discount_factor=1, time_manager=None, ponder=False, round_search_time=0.8,
+                 book=None, solve_threshold=5, progressive_widening=False,
+                 rave=False, rollout_depth=None, evaluator=None):
+        super().__init__(_id)
+        self.mab = mab
+        self.discount_factor = discount_factor
+        self.time_manager = time_manager if time_manager is not None else TimeManager()
+        # Search statistics, only recorded when $AZUL_SEARCH_STATS names a file
+        self.stats = search_stats.FromEnvironment()
+        # Pondering is opt-in, and off when there is no spare core
+        self.ponderer = CreatePonderer(_id, mab, discount_factor) if ponder else None
+        self.round_search_time = round_search_time
+        self.round_tree = None
+        self.book = book if book is not None else OpeningBook.Load()
+        self.solver = RoundSolver(self.stats)
+        self.solve_threshold = solve_threshold
+        self.progressive_widening = progressive_widening
+        self.rave = rave
+        self.rollout_depth = rollout_depth
+        self.evaluator = evaluator
+
+    def _FollowTimeLimit(self):
+        """Use the runner's time limit of a move as the hard limit of the time manager"""
+        if self.time_limit is not None:
+            self.time_manager.hard_limit = self.time_limit
+
+    def StartRound(self, game_state):
+        begin = time.perf_counter()
+        self._FollowTimeLimit()
+        self.round_tree = None
+        # Collect now, with the time of StartRound: the collector is off during the moves
+        gc.collect()
+        # The new round's tiles were unknown while pondering
+        if self.ponderer is not None:
+            self.ponderer.Stop()
+        # Search the first move of the round now, whoever plays it: the runner calls
+        # StartRound with its own time limit, so this time is not taken from any move.
+        to_move = game_state.first_player
+        moves = game_state.players[to_move].GetAvailableMoves(game_state)
+        round_limit = self.startRound_time_limit if self.startRound_time_limit is not None \
+            else self.time_manager.hard_limit
+        search_time = min(self.round_search_time, round_limit - self.time_manager.margin)
+        mcts = MCTS.MonteCarloTreeSearch(to_move, game_state, moves, 0, self.mab, self.discount_factor,
+                                         progressive_widening=self.progressive_widening, rave=self.rave,
+                                         rollout_depth=self.rollout_depth, evaluator=self.evaluator)
+        mcts.time_limit = max(0.0, search_time - (time.perf_counter() - begin))
+        mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+        self.round_tree = (mcts.root, to_move)
+        return None
+
+    def _TakeRoundTree(self, game_state):
+        """Return the subtree of the StartRound search matching game_state, or None"""
+        if self.round_tree is None:
+            return None
+        root, to_move = self.round_tree
+        self.round_tree = None
+        played = len(game_state.players[to_move].player_trace.moves[-1])
+        if to_move == self.id:
+            # We open the round: the root itself, if we did not move yet
+            return root if played == 0 else None
+        # The opponent opened the round: the child of its first move
+        if played != 1 or len(game_state.players[self.id].player_trace.moves[-1]) != 0:
+            return None
+        subtree = root.FindChild(game_state.players[to_move].player_trace.moves[-1][0])
+        if subtree is not None:
+            subtree.parent = None
+        return subtree
+
+    def SelectMove(self, moves, game_state):
+        # The search trees have no reference cycles, their memory is freed without the collector
+        with CollectorPaused():
+            return self._SelectMove(moves, game_state)
+
+    def _SelectMove(self, moves, game_state):
+        begin = time.perf_counter()
+        self._FollowTimeLimit()
+        root = self.ponderer.Take(game_state) if self.ponderer is not None else None
+        if root is None:
+            root = self._TakeRoundTree(game_state)
+        self.round_tree = None
+        allocation = self.time_manager.Allocate(len(moves), game_state)
+        book_move = self.book.Lookup(game_state, self.id, moves) if allocation > 0 else None
+        solution = None
+        if allocation > 0 and book_move is None and RemainingMoves(game_state) <= self.solve_threshold:
+            # Exact, and most of the time much faster than the search. If the round is
+            # not solved within half the allocation, the search gets the rest.
+            solution = self.solver.Solve(game_state, self.id, allocation / 2)
+        iteration_cost = 0.0
+        if book_move is not None:
+            # Searched offline much longer than we could now, the time goes to the bank
+            move = book_move
+            allocation = 0.0
+        # No need to think if only one move is provided, its time goes to the bank
+        elif allocation <= 0:
+            move = moves[0]
+        elif solution is not None:
+            move = solution[0]
+        else:
+            mcts = MCTS.MonteCarloTreeSearch(self.id, game_state, moves, 0, self.mab, self.discount_factor,
+                                             stats=self.stats, early_stop=True, root=root,
+                                             progressive_widening=self.progressive_widening, rave=self.rave,
+                                             rollout_depth=self.rollout_depth, evaluator=self.evaluator)
+            # Building the root already took part of the allocation. The search may stop
+            # early, the time it leaves is then banked for the next moves.
+            mcts.time_limit = max(0.0, allocation - (time.perf_counter() - begin))
+            move = mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+            iteration_cost = mcts.max_iteration_time
+            # Free the tree before the end of the move is timed: its teardown is part of the move
+            mcts = None
+        root = None
+        if self.ponderer is not None:
+            next_gs = copy.deepcopy(game_state)
+            next_gs.ExecuteMove(self.id, move)
+            self.ponderer.Start(next_gs, 1 - self.id)
+        self.time_manager.Update(allocation, time.perf_counter() - begin, iteration_cost)
+        return move
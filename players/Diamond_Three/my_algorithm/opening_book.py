@@ -0,0 +1,161 @@
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from model import GameState
+from utils import Move
+from . import MCTS
+from . import Qfunctions
+from .MAB.UCB import UCB
+from .state_hash import CanonicalMove, StateHash
+
+# Book used by the MCTS players when it exists
+DEFAULT_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.json")
+
+_LOADED_BOOKS = {}
+
+
+class OpeningBook:
+    """Best moves of round-start positions, found offline by long searches
+
+    Entries are keyed by the StateHash of the position (player to move
+    included). The move is stored in canonical coordinates (the factory index
+    after sorting the factories), so the book does not depend on the order of
+    the factories on the table. The key is still the exact position, random
+    factory draw included, which almost never comes back in another game.
+
+    Attributes:
+        entries: dict state hash -> {"move": [move id, canonical factory, tile, pattern line],
+            "visits": visits of the move, "value": its Q value, "search_time": seconds searched}
+    """
+
+    def __init__(self, entries=None):
+        self.entries = entries if entries is not None else {}
+
+    @staticmethod
+    def Load(file_name=DEFAULT_BOOK):
+        """Load a book (loaded once per process and file), an empty book if the file does not exist"""
+        if file_name not in _LOADED_BOOKS:
+            entries = {}
+            if os.path.exists(file_name):
+                with open(file_name) as f:
+                    entries = json.load(f)["entries"]
+            _LOADED_BOOKS[file_name] = OpeningBook(entries)
+        return _LOADED_BOOKS[file_name]
+
+    def Save(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump({"version": 1, "entries": self.entries}, f, sort_keys=True)
+
+    def Lookup(self, game_state, player_id, moves):
+        """Return the book move of the position, None if it is not in the book
+
+        Args:
+            game_state: the position
+            player_id: the player to move
+            moves: the available moves, the book move is one of them
+        """
+        if not self.entries:
+            return None
+        state_hash, factory_order = StateHash(game_state, player_id)
+        entry = self.entries.get(state_hash)
+        if entry is None:
+            return None
+        mid, factory, tile, pattern_line = entry["move"]
+        fid = factory_order[factory] if mid == Move.TAKE_FROM_FACTORY else -1
+        for move in moves:
+            tgrab = move[2]
+            if move[0] == mid and move[1] == fid and tgrab.tile_type == tile \
+                    and tgrab.pattern_line_dest == pattern_line:
+                return move
+        return None
+
+    def Add(self, game_state, player_id, move, visits, value, search_time):
+        """Store `move` for the position, unless the book has a better searched one"""
+        state_hash, factory_order = StateHash(game_state, player_id)
+        previous = self.entries.get(state_hash)
+        if previous is not None and previous["visits"] >= visits:
+            return
+        self.entries[state_hash] = {"move": list(CanonicalMove(move, factory_order)),
+                                    "visits": visits, "value": value, "search_time": search_time}
+
+
+def RoundStartPosition(seed, num_rounds=0):
+    """A round-start position: a new game with `seed`, after `num_rounds` rounds of naive self-play"""
+    random.seed(seed)
+    game_state = GameState(2)
+    for plr in game_state.players:
+        plr.player_trace.StartRound()
+    for _ in range(num_rounds):
+        player_id = game_state.first_player
+        while game_state.TilesRemaining():
+            moves = game_state.players[player_id].GetAvailableMoves(game_state)
+            game_state.ExecuteMove(player_id, MCTS.MonteCarloTreeSearch._NaiveMoveSelected(moves))
+            player_id = 1 - player_id
+        game_state.ExecuteEndOfRound()
+        if any(plr.GetCompletedRows() > 0 for plr in game_state.players):
+            break
+        game_state.SetupNewRound()
+    return game_state, game_state.first_player
+
+
+def SearchPosition(task):
+    """Worker entry point: deep search of one position, returns (seed, rounds, move, visits, value)"""
+    seed, num_rounds, search_time, exploration = task
+    game_state, player_id = RoundStartPosition(seed, num_rounds)
+    moves = game_state.players[player_id].GetAvailableMoves(game_state)
+    mcts = MCTS.MonteCarloTreeSearch(player_id, game_state, moves, search_time, UCB(exploration), 1)
+    move = mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+    child = mcts.root.FindChild(move)
+    return seed, num_rounds, move, child.state.visited_count, float(Qfunctions.AverageQfunc(child))
+
+
+def BuildBook(book_file, num_positions, max_rounds, search_time, workers=None, base_seed=90054,
+              exploration=0.5, verbose=True):
+    """Search `num_positions` round-start positions in parallel and merge the results into book_file"""
+    book = OpeningBook.Load(book_file)
+    rng = random.Random(base_seed)
+    tasks = [(rng.randint(0, 1e10), rng.randint(0, max_rounds), search_time, exploration)
+             for _ in range(num_positions)]
+    start = time.time()
+    with multiprocessing.Pool(workers) as pool:
+        for count, (seed, num_rounds, move, visits, value) in enumerate(
+                pool.imap_unordered(SearchPosition, tasks), 1):
+            game_state, player_id = RoundStartPosition(seed, num_rounds)
+            book.Add(game_state, player_id, move, visits, value, search_time)
+            if verbose:
+                print("({}/{}) seed {} round {}: {} visits, value {:.2f}".format(
+                    count, num_positions, seed, num_rounds + 1, visits, value))
+    book.Save(book_file)
+    if verbose:
+        print("{} entries in {} ({:.1f}s)".format(len(book.entries), book_file, time.time() - start))
+    return book
+
+
+def loadParameter():
+    """
+    Processes the command used to build the opening book from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python -m players.Diamond_Three.my_algorithm.opening_book <options>
+    EXAMPLES:   (1) python -m players.Diamond_Three.my_algorithm.opening_book -n 200 -t 20 -j 8
+                    - searches 200 round-start positions for 20s each on 8 processes
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('--book', help='book file (default: {})'.format(DEFAULT_BOOK), default=DEFAULT_BOOK)
+    parser.add_option('-n', '--positions', type='int', help='number of positions to search (default: 100)', default=100)
+    parser.add_option('-r', '--rounds', type='int', help='positions start from round 1 to this round + 1 (default: 0)', default=0)
+    parser.add_option('-t', '--searchTime', type='float', help='search time of every position in seconds (default: 10)', default=10.0)
+    parser.add_option('-j', '--workers', type='int', help='number of worker processes (default: number of cores)', default=None)
+    parser.add_option('--seed', type='int', help='seed of the positions (default: 90054)', default=90054)
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+    return options
+
+
+if __name__ == '__main__':
+    options = loadParameter()
+    BuildBook(options.book, options.positions, options.rounds, options.searchTime, options.workers, options.seed)
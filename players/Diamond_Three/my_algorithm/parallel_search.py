@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import random
+import time
+import weakref
+from .transposition import TranspositionTable
+
+# Set in every worker process by _InitWorker
+_WORKER = {}
+
+
+def AvailableCores():
+    """Number of cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _InitWorker(bound, tt_size):
+    _WORKER["bound"] = bound
+    # Kept from task to task, the workers search the same round again and again
+    _WORKER["tt"] = TranspositionTable(tt_size) if tt_size > 0 else None
+
+
+def _SearchChild(task):
+    """Worker entry point: alpha-beta search of one root child
+
+    Returns:
+        (index, evaluation, rewards, count, cut_by_depth), evaluation and rewards are None if the
+        deadline passed
+    """
+    # Imported here: Minimax imports this module
+    from .Minimax import Minimax, _SearchTimeout
+    index, game_state, player_id, depth, deadline, seed = task
+    # A task of a search that already timed out: building the searcher alone (every child
+    # deepcopied) would hold the worker up when the next move's tasks arrive
+    if time.time() > deadline:
+        return index, None, None, 0, False
+    random.seed(seed)
+    moves = game_state.players[player_id].GetAvailableMoves(game_state)
+    tt = _WORKER["tt"]
+    searcher = Minimax(player_id, game_state, moves, tt=tt, tt_size=0)
+    searcher.deadline = deadline
+    searcher.shared_bound = _WORKER["bound"]
+    alpha, beta = searcher.SharedWindow(float('-inf'), float('inf'), player_id)
+    try:
+        evaluation, rewards = searcher.minimax(searcher.root, depth, alpha, beta, player_id)
+    except _SearchTimeout:
+        return index, None, None, searcher.count, False
+    return index, evaluation, rewards, searcher.count, searcher.cut_by_depth
+
+
+class SearchPool:
+    """Worker processes searching the root children of Minimax in parallel
+
+    The best value found at the root so far is shared with the workers as a
+    bound: a worker reads it when it starts a child and again after every
+    grandchild, so that children searched later are cut by the results of the
+    earlier ones. Every worker keeps its own transposition table.
+
+    Attributes:
+        workers: number of worker processes
+        bound: shared best value of the root, in the frame of the whole search (see Minimax); it is the
+            alpha of the children of a max root and the beta of the children of a min root
+    """
+
+    def __init__(self, workers, tt_size=100000):
+        self.workers = workers
+        self.bound = multiprocessing.Value('d', 0.0)
+        self.pool = multiprocessing.Pool(workers, initializer=_InitWorker, initargs=(self.bound, tt_size))
+        weakref.finalize(self, self.pool.terminate)
+
+    def SetBound(self, value):
+        self.bound.value = value
+
+    def SearchChildren(self, children, depth, deadline):
+        """Search `children` in the workers, yield (child, evaluation, rewards, count, cut_by_depth) as they finish
+
+        The caller updates the bound with SetBound as results come in. The
+        evaluation and rewards are None for a child whose search passed the
+        deadline. cut_by_depth tells whether the depth, not the end of the
+        round, stopped some line of the child's search.
+        """
+        tasks = [(index, child.state.game_state, child.state.player_id, depth, deadline, random.randint(0, 1e10))
+                 for index, child in enumerate(children)]
+        for index, evaluation, rewards, count, cut_by_depth in self.pool.imap_unordered(_SearchChild, tasks):
+            yield children[index], evaluation, rewards, count, cut_by_depth
+
+    def Close(self):
+        self.pool.terminate()
+
+
+def CreateSearchPool(workers=None, tt_size=100000):
+    """A SearchPool with `workers` processes (default: one per core), None when it would not help here"""
+    if workers is None:
+        workers = AvailableCores()
+    if workers < 2:
+        return None
+    try:
+        return SearchPool(workers, tt_size)
+    except (AssertionError, OSError):
+        # e.g. the player lives in a daemon worker process, which can't have children
+        return None
@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import random
+import time
+import weakref
+from . import MCTS
+from . import Qfunctions
+from .parallel_search import AvailableCores
+
+
+def PonderingAvailable():
+    """Pondering needs a spare core, otherwise it steals the opponent's time"""
+    return AvailableCores() > 1
+
+
+def _PonderWorker(conn, mab, discount_factor, chunk_time, max_ponder_time):
+    """Search the position after our move until the player asks for the result
+
+    Messages from the player:
+        ("ponder", seq, game_state, player_id, seed): start a new search, player_id to move
+        ("take", seq, move): stop, reply (seq, subtree after `move` or None)
+        ("stop", seq): stop and drop the tree
+        None: exit
+    """
+    try:
+        # Leave the cores to the two players first
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+    mcts = None
+    begin = 0
+    while True:
+        searching = mcts is not None and time.time() - begin < max_ponder_time
+        if searching and not conn.poll():
+            # The search runs in short chunks, so that the player never waits long for the result
+            mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AggressiveQfunc)
+            continue
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        if message[0] == "ponder":
+            _, seq, game_state, player_id, seed = message
+            # Our own random sequence, the game's one lives in the player process
+            random.seed(seed)
+            moves = game_state.players[player_id].GetAvailableMoves(game_state)
+            mcts = MCTS.MonteCarloTreeSearch(player_id, game_state, moves, chunk_time, mab, discount_factor)
+            begin = time.time()
+        elif message[0] == "take":
+            _, seq, move = message
+            subtree = None
+            if mcts is not None:
+                subtree = mcts.root.FindChild(move)
+                if subtree is not None:
+                    subtree.parent = None
+            conn.send((seq, subtree))
+            mcts = None
+        else:
+            mcts = None
+    conn.close()
+
+
+def _Shutdown(conn, process):
+    try:
+        conn.send(None)
+        conn.close()
+    except (OSError, ValueError):
+        pass
+    process.join(timeout=1)
+    if process.is_alive():
+        process.terminate()
+
+
+class Ponderer:
+    """Keep searching in a worker process while the opponent thinks
+
+    After the player's move, the worker searches the position the opponent has
+    to play from. On the player's next turn the subtree under the opponent's
+    actual move becomes the root of the new search. The worker has its own
+    random generator and never touches the game's one, and it only runs
+    between the player's turns: it is stopped as soon as SelectMove or
+    StartRound is called.
+
+    Attributes:
+        reply_timeout: longest wait for the worker's tree, in seconds
+        reused: number of searches that started from a pondered subtree
+        missed: number of pondered positions that could not be reused
+    """
+
+    def __init__(self, player_id, mab, discount_factor, chunk_time=0.02, max_ponder_time=3.0, reply_timeout=0.1):
+        self.player_id = player_id
+        self.reply_timeout = reply_timeout
+        self.rng = random.Random(player_id)
+        self.seq = 0
+        self.pondering = None
+        self.reused = 0
+        self.missed = 0
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_PonderWorker,
+                                               args=(child_conn, mab, discount_factor, chunk_time, max_ponder_time))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        weakref.finalize(self, _Shutdown, self.conn, self.process)
+
+    def Start(self, game_state, player_id):
+        """Ponder `game_state`, where `player_id` (the opponent) is to move"""
+        if not game_state.TilesRemaining():
+            # The next move belongs to a round whose tiles are not drawn yet
+            return
+        self.seq += 1
+        trace = game_state.players[player_id].player_trace
+        self.pondering = (len(trace.moves), len(trace.moves[-1]))
+        self.conn.send(("ponder", self.seq, game_state, player_id, self.rng.randint(0, 1e10)))
+
+    def Stop(self):
+        if self.pondering is not None:
+            self.pondering = None
+            self.missed += 1
+            self.conn.send(("stop", self.seq))
+
+    def Take(self, game_state):
+        """Stop pondering and return the pondered subtree of game_state, or None"""
+        if self.pondering is None:
+            return None
+        trace = game_state.players[1 - self.player_id].player_trace
+        rounds, moves = self.pondering
+        # The opponent must have played exactly one move in the same round
+        if len(trace.moves) != rounds or len(trace.moves[-1]) != moves + 1:
+            self.Stop()
+            return None
+        self.pondering = None
+        self.conn.send(("take", self.seq, trace.moves[-1][-1]))
+        deadline = time.time() + self.reply_timeout
+        while self.conn.poll(max(0.0, deadline - time.time())):
+            seq, subtree = self.conn.recv()
+            # Replies to older requests arrive late when the wait timed out
+            if seq == self.seq:
+                if subtree is None:
+                    self.missed += 1
+                else:
+                    self.reused += 1
+                return subtree
+        self.missed += 1
+        return None
+
+
+def CreatePonderer(player_id, mab, discount_factor):
+    """A Ponderer, or None when pondering is not possible here"""
+    if not PonderingAvailable():
+        return None
+    try:
+        return Ponderer(player_id, mab, discount_factor)
+    except (AssertionError, OSError):
+        # e.g. the player lives in a daemon worker process, which can't have children
+        return None
@@ -0,0 +1,79 @@
+import random
+from utils import Move, Tile, TileGrab
+
+_TILES = list(Tile)
+
+
+def WallFree(player_state):
+    """free[line][tile]: whether `tile` may still go in pattern line `line`, i.e. its wall cell is empty
+
+    The wall only changes at the end of a round, so this holds for a whole rollout.
+    """
+    grid_scheme = player_state.grid_scheme
+    grid_state = player_state.grid_state
+    return [[grid_state[line][int(grid_scheme[line][tile])] != 1 for tile in _TILES]
+            for line in range(player_state.GRID_SIZE)]
+
+
+def GreedyRolloutMove(game_state, player_id, wall_free, rng=random):
+    """Rollout policy: the naive move, without building the full move list
+
+    Works on the tile counts of the factories and of the centre, and on the
+    pattern lines, to find the moves that put the most tiles on a pattern line,
+    and among them the fewest on the floor line. Only the chosen move gets a
+    TileGrab. The candidates are enumerated in the order of GetAvailableMoves,
+    duplicates included, so the move drawn is the one
+    MonteCarloTreeSearch._NaiveMoveSelected would draw with the same random
+    state.
+
+    Args:
+        game_state: the position, tiles remaining
+        player_id: the player to move
+        wall_free: WallFree of the player
+        rng: random generator used to break the ties
+
+    Returns:
+        The move
+    """
+    player_state = game_state.players[player_id]
+    lines_tile = player_state.lines_tile
+    lines_number = player_state.lines_number
+    grid_size = player_state.GRID_SIZE
+    most_to_line = -1
+    fewest_to_floor = 0
+    candidates = []
+    sources = [(Move.TAKE_FROM_FACTORY, fid, factory) for fid, factory in enumerate(game_state.factories)]
+    sources.append((Move.TAKE_FROM_CENTRE, -1, game_state.centre_pool))
+    for mid, fid, display in sources:
+        if display.total == 0:
+            continue
+        tiles = display.tiles
+        for tile in _TILES:
+            number = tiles[tile]
+            if number == 0:
+                continue
+            for line in range(grid_size + 1):
+                if line == grid_size:
+                    # Every tile to the floor line
+                    to_line = 0
+                    line = -1
+                else:
+                    if (lines_tile[line] != -1 and lines_tile[line] != tile) or not wall_free[line][tile]:
+                        continue
+                    to_line = min(number, line + 1 - lines_number[line])
+                to_floor = number - to_line
+                if to_line > most_to_line or (to_line == most_to_line and to_floor < fewest_to_floor):
+                    candidates.clear()
+                    most_to_line = to_line
+                    fewest_to_floor = to_floor
+                elif to_line < most_to_line or to_floor > fewest_to_floor:
+                    continue
+                candidates.append((mid, fid, tile, number, line))
+    mid, fid, tile, number, line = rng.choice(candidates)
+    tgrab = TileGrab()
+    tgrab.tile_type = tile
+    tgrab.number = number
+    tgrab.pattern_line_dest = line
+    tgrab.num_to_pattern_line = most_to_line
+    tgrab.num_to_floor_line = fewest_to_floor
+    return mid, fid, tgrab
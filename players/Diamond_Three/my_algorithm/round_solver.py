@@ -0,0 +1,152 @@
+import copy
+import time
+from utils import Tile
+from .game_tree import CalculateFutureReward, CopyGameState, CopyPlayerState
+from .state_hash import CanonicalMove, CanonicalState
+from .transposition import EXACT, LOWER, UPPER
+
+
+class _SolverTimeout(Exception):
+    """Raised inside the solver once the deadline has passed"""
+
+
+def RemainingMoves(game_state):
+    """Upper bound of the number of moves left in the round
+
+    Every non-empty factory is taken once, and then every colour once more
+    from the centre at most.
+    """
+    factories = sum(1 for factory in game_state.factories if factory.total > 0)
+    colours = sum(1 for tile in Tile
+                  if game_state.centre_pool.tiles[tile] > 0
+                  or any(factory.tiles[tile] > 0 for factory in game_state.factories))
+    return factories + colours
+
+
+def _MoveOrder(move):
+    """Naive moves first: most tiles to the pattern line, then fewest to the floor"""
+    tgrab = move[2]
+    return -tgrab.num_to_pattern_line, tgrab.num_to_floor_line
+
+
+class RoundSolver:
+    """Exact solver of the rest of the current round
+
+    Negamax with alpha-beta over every available move (no simplification),
+    maximising the difference of the values of the end of the round: the scores
+    after the round scoring, plus the end of game bonuses if the round ends the
+    game, otherwise the CalculateFutureReward the MCTS rollouts end with.
+    Positions are memoized on their canonical state, the player to move seeing
+    its own board first, so that transpositions and both seats share entries.
+    The table is kept from solve to solve: the later moves of a round are
+    subtrees of the first solve.
+
+    Attributes:
+        stats: SearchStats collecting a record of every solve, None to disable the instrumentation
+        max_entries: the table is cleared when it grows beyond this size
+        table: canonical state -> (bound type, value, best move in canonical coordinates)
+        nodes: number of positions visited by the last solve
+        solve_times: (remaining moves, seconds, solved) of every solve
+    """
+
+    def __init__(self, stats=None, max_entries=500000):
+        self.stats = stats
+        self.max_entries = max_entries
+        self.table = {}
+        self.nodes = 0
+        self.deadline = None
+        self.solve_times = []
+
+    def Solve(self, game_state, player_id, time_limit):
+        """Return (best move, difference of the end of round values for player_id), or None if the deadline passed first
+
+        Args:
+            game_state: the position, player_id to move
+            player_id: the player to move
+            time_limit: seconds the solver may use
+        """
+        begin = time.time()
+        self.deadline = begin + time_limit
+        self.nodes = 0
+        record = None
+        if self.stats is not None:
+            record = self.stats.NewRecord("RoundSolver", player_id,
+                                          len(game_state.players[player_id].GetAvailableMoves(game_state)))
+        if len(self.table) > self.max_entries:
+            self.table.clear()
+        remaining_moves = RemainingMoves(game_state)
+        try:
+            value = self._Negamax(game_state, player_id, float('-inf'), float('inf'))
+            # Searched with a full window: the root entry is exact
+            key, factory_order = CanonicalState(game_state, player_id)
+            result = self._FromCanonical(self.table[key][2], game_state, player_id, factory_order), value
+        except _SolverTimeout:
+            result = None
+        self.solve_times.append((remaining_moves, time.time() - begin, result is not None))
+        if record is not None:
+            record.iterations = self.nodes
+            record.extra["remaining_moves"] = remaining_moves
+            record.extra["solved"] = result is not None
+            record.Lap("search")
+            record.Finish()
+            self.stats.Add(record)
+        return result
+
+    @staticmethod
+    def _FinalDifference(game_state, player_id):
+        """Value of the end of the round for player_id, see the class documentation"""
+        gs_scored = copy.copy(game_state)
+        gs_scored.players = [CopyPlayerState(plr, scoring=True) for plr in game_state.players]
+        scores = [plr.ScoreRound()[0] for plr in gs_scored.players]
+        if any(plr.GetCompletedRows() > 0 for plr in gs_scored.players):
+            # The last round of the game
+            values = [score + plr.EndOfGameScore() for score, plr in zip(scores, gs_scored.players)]
+        else:
+            values = [score + CalculateFutureReward(gs_scored, i) for i, score in enumerate(scores)]
+        return values[player_id] - values[1 - player_id]
+
+    def _Negamax(self, game_state, player_id, alpha, beta):
+        self.nodes += 1
+        if time.time() > self.deadline:
+            raise _SolverTimeout()
+        if not game_state.TilesRemaining():
+            return self._FinalDifference(game_state, player_id)
+        key, factory_order = CanonicalState(game_state, player_id)
+        table_move = None
+        entry = self.table.get(key)
+        if entry is not None:
+            flag, value, table_move = entry
+            if flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha):
+                return value
+        moves = sorted(game_state.players[player_id].GetAvailableMoves(game_state), key=_MoveOrder)
+        if table_move is not None:
+            moves.sort(key=lambda move: CanonicalMove(move, factory_order) != table_move)
+        alpha_orig = alpha
+        best_value = float('-inf')
+        best_move = None
+        for move in moves:
+            next_gs = CopyGameState(game_state)
+            next_gs.ExecuteMove(player_id, move)
+            value = -self._Negamax(next_gs, 1 - player_id, -beta, -alpha)
+            if value > best_value:
+                best_value = value
+                best_move = move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        if best_value <= alpha_orig:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (flag, best_value, CanonicalMove(best_move, factory_order))
+        return best_value
+
+    @staticmethod
+    def _FromCanonical(canonical_move, game_state, player_id, factory_order):
+        """The available move matching a move in canonical coordinates"""
+        for move in game_state.players[player_id].GetAvailableMoves(game_state):
+            if CanonicalMove(move, factory_order) == canonical_move:
+                return move
+        return None
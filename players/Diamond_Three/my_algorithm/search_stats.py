@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import time
+
+# Set this environment variable to a file name to record every search into it (json lines)
+STATS_ENV_VAR = "AZUL_SEARCH_STATS"
+
+
+class SearchRecord:
+    """Statistics of one search (one SelectMove call)
+
+    Attributes:
+        algorithm: name of the search algorithm
+        player_id: the ID of the player searching
+        root_moves: number of children of the root
+        iterations: number of iterations (nodes visited for Minimax)
+        phase_times: seconds spent in each phase, e.g. selection/expansion/simulation/backup
+        rollouts: number of rollouts (simulations)
+        rollout_moves: total number of moves played in the rollouts
+        tree_size: number of nodes in the tree at the end of the search
+        max_depth: depth of the deepest node of the tree
+        total_time: wall time of the whole search
+        extra: algorithm specific values
+    """
+
+    def __init__(self, algorithm, player_id, root_moves):
+        self.algorithm = algorithm
+        self.player_id = player_id
+        self.root_moves = root_moves
+        self.iterations = 0
+        self.phase_times = {}
+        self.rollouts = 0
+        self.rollout_moves = 0
+        self.tree_size = 0
+        self.max_depth = 0
+        self.total_time = 0.0
+        self.extra = {}
+        self._begin = time.perf_counter()
+        self._last = self._begin
+
+    def Lap(self, phase=None):
+        """Charge the time since the previous lap to `phase` (None only restarts the clock)"""
+        now = time.perf_counter()
+        if phase is not None:
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def AddRollout(self, move_count):
+        self.rollouts += 1
+        self.rollout_moves += move_count
+
+    def Finish(self, root=None):
+        """Stop the clock and measure the tree under root"""
+        self.total_time = time.perf_counter() - self._begin
+        if root is not None:
+            self.tree_size, self.max_depth = TreeSize(root)
+
+    def ToDict(self):
+        record = {"algorithm": self.algorithm,
+                  "player_id": self.player_id,
+                  "root_moves": self.root_moves,
+                  "iterations": self.iterations,
+                  "total_time": self.total_time,
+                  "rollouts": self.rollouts,
+                  "avg_rollout_length": self.rollout_moves / self.rollouts if self.rollouts else 0.0,
+                  "tree_size": self.tree_size,
+                  "max_depth": self.max_depth}
+        for phase, seconds in self.phase_times.items():
+            record[phase + "_time"] = seconds
+        record.update(self.extra)
+        return record
+
+
+class SearchStats:
+    """Collect the SearchRecord of every search, optionally streaming them into a json-lines file"""
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name
+        self.records = []
+
+    def NewRecord(self, algorithm, player_id, root_moves):
+        return SearchRecord(algorithm, player_id, root_moves)
+
+    def Add(self, record):
+        record = record.ToDict()
+        self.records.append(record)
+        if self.file_name is not None:
+            with open(self.file_name, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+
+    def Export(self, file_name):
+        """Write every record collected so far into file_name (json lines)"""
+        with open(file_name, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+
+def FromEnvironment():
+    """SearchStats writing into $AZUL_SEARCH_STATS, or None (instrumentation disabled)"""
+    file_name = os.environ.get(STATS_ENV_VAR)
+    if not file_name:
+        return None
+    return SearchStats(file_name)
+
+
+def TreeSize(root):
+    """Return the number of nodes and the max depth of the tree under root"""
+    size = 0
+    max_depth = 0
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        size += 1
+        if depth > max_depth:
+            max_depth = depth
+        for child in node.children:
+            stack.append((child, depth + 1))
+    return size, max_depth
+
+
+def Summarize(records):
+    """Average every numeric field of the records, per algorithm, and total their time_saved"""
+    summary = {}
+    for record in records:
+        algorithm = summary.setdefault(record["algorithm"], {"searches": 0, "total_time_saved": 0.0})
+        algorithm["searches"] += 1
+        algorithm["total_time_saved"] += record.get("time_saved", 0.0)
+        for key, value in record.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and key != "player_id":
+                algorithm[key] = algorithm.get(key, 0) + value
+    for algorithm in summary.values():
+        for key in algorithm:
+            if key not in ("searches", "total_time_saved"):
+                algorithm[key] /= algorithm["searches"]
+    return summary
+
+
+if __name__ == '__main__':
+    # python -m players.Diamond_Three.my_algorithm.search_stats <stats file>
+    with open(sys.argv[1]) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for name, averages in Summarize(records).items():
+        print("{}: {} searches, {:.2f}s saved by early stops".format(
+            name, averages.pop("searches"), averages.pop("total_time_saved")))
+        for key, value in sorted(averages.items()):
+            print("    avg {:<22} {:.4f}".format(key, value))
@@ -0,0 +1,63 @@
+import hashlib
+from utils import Move, Tile
+
+
+def _TileCounts(display):
+    return tuple(display.tiles[tile] for tile in Tile)
+
+
+def _Board(player_state):
+    return (player_state.score,
+            tuple(player_state.lines_number),
+            tuple(int(tile) for tile in player_state.lines_tile),
+            tuple(int(cell) for cell in player_state.grid_state.flatten()),
+            sum(player_state.floor))
+
+
+def CanonicalState(game_state, player_id):
+    """Canonical form of a position, `player_id` to move
+
+    Factories are interchangeable, so they are sorted by content, and the two
+    boards are given as (player to move, opponent) so that the position is the
+    same whichever seat the player sits in. The bag is left out: its order is
+    hidden and only matters for the next rounds.
+
+    Args:
+        game_state: the position
+        player_id: the player to move
+
+    Returns:
+        (key, factory_order): a hashable key, and the factory id of every
+        canonical factory index
+    """
+    factories = sorted((_TileCounts(factory), fid) for fid, factory in enumerate(game_state.factories))
+    if game_state.next_first_player == -1:
+        first_player_token = 0
+    elif game_state.next_first_player == player_id:
+        first_player_token = 1
+    else:
+        first_player_token = 2
+    key = (tuple(counts for counts, _ in factories),
+           _TileCounts(game_state.centre_pool),
+           first_player_token,
+           _Board(game_state.players[player_id]),
+           _Board(game_state.players[1 - player_id]))
+    return key, [fid for _, fid in factories]
+
+
+def StateHash(game_state, player_id):
+    """Stable hash (same in every process and run) of the canonical position, and its factory order"""
+    key, factory_order = CanonicalState(game_state, player_id)
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:16], factory_order
+
+
+def CanonicalMove(move, factory_order):
+    """A move in canonical coordinates: (move id, canonical factory index or -1, tile, pattern line)
+
+    Args:
+        move: the move, as given by GetAvailableMoves
+        factory_order: the factory order returned by CanonicalState for the position of the move
+    """
+    mid, fid, tgrab = move
+    factory = factory_order.index(fid) if mid == Move.TAKE_FROM_FACTORY else -1
+    return int(mid), factory, int(tgrab.tile_type), tgrab.pattern_line_dest
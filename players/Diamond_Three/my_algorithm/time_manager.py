@@ -0,0 +1,116 @@
+import contextlib
+import gc
+import math
+
+# Time limit of one move until the runner gives its own (runner.py -w), in seconds
+DEFAULT_HARD_LIMIT = 1.0
+
+
+class TimeManager:
+    """Allocate the search time of every move over the whole game
+
+    Every move is credited `nominal_time` seconds. A move gets a share of it
+    that depends on its branching factor and on how much of the round is left,
+    and what it does not use goes into a bank that later, harder moves draw
+    from. The runner's limit applies to every move on its own, so a move never
+    gets more than the hard limit minus a safety margin. The margin follows the
+    measured cost of one search iteration, since the search only checks the
+    clock between two iterations, and the overruns seen so far.
+
+    Attributes:
+        nominal_time: seconds credited to the bank for every move
+        hard_limit: time limit of one move in the runner
+        reference_moves: branching factor that gets exactly the nominal time
+        bank: seconds saved (positive) or borrowed (negative) so far
+        margin: current safety margin below the hard limit
+        iteration_cost: slowest recent search iteration, in seconds
+        overrun: worst recent time spent beyond the allocation, in seconds
+        used_time: total seconds used by the moves of the game
+        moves_played: number of moves of the game
+    """
+
+    def __init__(self, nominal_time=0.8, hard_limit=DEFAULT_HARD_LIMIT, reference_moves=20, min_margin=0.1,
+                 max_margin=0.4, min_time=0.05, max_bank=5.0, bank_share=0.25, decay=0.9):
+        """Init the time manager
+
+        Args:
+            nominal_time: seconds credited to the bank for every move
+            hard_limit: time limit of one move in the runner
+            reference_moves: branching factor that gets exactly the nominal time
+            min_margin: smallest safety margin, covers the runner's own overhead and the pauses of the
+                garbage collector, which no measure of the previous moves predicts
+            max_margin: largest safety margin
+            min_time: smallest allocation of a move that is searched
+            max_bank: the bank is kept within [-max_bank, max_bank] seconds
+            bank_share: part of the bank a move may draw at once
+            decay: how fast the measured iteration cost and overrun are forgotten
+        """
+        self.nominal_time = nominal_time
+        self.hard_limit = hard_limit
+        self.reference_moves = reference_moves
+        self.min_margin = min_margin
+        self.max_margin = max_margin
+        self.min_time = min_time
+        self.max_bank = max_bank
+        self.bank_share = bank_share
+        self.decay = decay
+        self.bank = 0.0
+        self.margin = min_margin
+        self.iteration_cost = 0.0
+        self.overrun = 0.0
+        self.used_time = 0.0
+        self.moves_played = 0
+
+    def Allocate(self, num_moves, game_state):
+        """Return the seconds the next move may use, 0 if it needs no search
+
+        Args:
+            num_moves: number of available moves
+            game_state: the current game state
+        """
+        if num_moves <= 1:
+            return 0.0
+        # More moves need more time to tell them apart, with diminishing returns
+        weight = math.sqrt(num_moves / self.reference_moves)
+        # Near the end of the round the rollouts are short and the tree shallow
+        weight *= 0.5 + 0.5 * _RoundLeft(game_state)
+        allocation = self.nominal_time * weight + self.bank_share * self.bank
+        return max(self.min_time, min(allocation, self.hard_limit - self.margin))
+
+    def Update(self, allocation, used, iteration_cost=0.0):
+        """Record a finished move
+
+        Args:
+            allocation: seconds allocated to the move
+            used: seconds the move really took
+            iteration_cost: slowest search iteration of the move
+        """
+        self.moves_played += 1
+        self.used_time += used
+        self.bank = max(-self.max_bank, min(self.max_bank, self.bank + self.nominal_time - used))
+        if allocation <= 0:
+            return
+        # Keep the worst recent values, so that one slow move keeps the margin up for a while
+        self.iteration_cost = max(iteration_cost, self.iteration_cost * self.decay)
+        self.overrun = max(used - allocation, self.overrun * self.decay)
+        self.margin = min(self.max_margin,
+                          self.min_margin + 1.5 * self.iteration_cost + max(0.0, self.overrun))
+
+
+@contextlib.contextmanager
+def CollectorPaused():
+    """Turn the automatic garbage collection off, its pauses on big trees are not predictable"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _RoundLeft(game_state):
+    """Fraction of the round's tiles still in the factories and the centre"""
+    total = len(game_state.factories) * game_state.NUM_ON_FACTORY
+    left = game_state.centre_pool.total + sum(factory.total for factory in game_state.factories)
+    return min(1.0, left / total) if total > 0 else 0.0
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from .state_hash import CanonicalState
+
+# Bound types of a stored value
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class Entry:
+    """A searched position
+
+    Attributes:
+        depth: depth of the search below the position
+        flag: EXACT, LOWER or UPPER, how the value relates to the true value of the position
+        value: value of the position, as compared with alpha and beta in the search
+        rewards: rewards of both players at the end of the best line
+        move: best move in canonical coordinates (see CanonicalMove), None for a leaf
+        complete: whether every line of the search reached the end of the round, the value
+            then holds for any depth
+    """
+
+    __slots__ = ("depth", "flag", "value", "rewards", "move", "complete")
+
+    def __init__(self, depth, flag, value, rewards, move, complete):
+        self.depth = depth
+        self.flag = flag
+        self.value = value
+        self.rewards = rewards
+        self.move = move
+        self.complete = complete
+
+
+class TranspositionTable:
+    """Bounded table of the positions searched by Minimax
+
+    Positions are keyed by the hash of their canonical form (see
+    CanonicalState) and of the player to move, so that a position reached
+    through different move orders, or with its factories in another order, is
+    searched once. When the table is full the least recently used entry is
+    dropped. A shallower search never replaces a deeper one.
+
+    Attributes:
+        capacity: largest number of entries
+        entries: key -> Entry, least recently used first
+        probes: number of lookups
+        hits: number of lookups that found the position
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.probes = 0
+        self.hits = 0
+
+    @staticmethod
+    def Key(game_state, player_id):
+        """Return (key, factory_order) of the position, `player_id` to move"""
+        key, factory_order = CanonicalState(game_state, player_id)
+        return hash((player_id, key)), factory_order
+
+    def Probe(self, key):
+        """Return the Entry of the position, None if it is not in the table"""
+        self.probes += 1
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def Store(self, key, entry):
+        previous = self.entries.get(key)
+        if previous is not None and (previous.complete or previous.depth > entry.depth) and not entry.complete:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def Clear(self):
+        self.entries.clear()
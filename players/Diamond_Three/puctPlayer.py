@@ -0,0 +1,8 @@
+from .my_algorithm.mcts_player import MCTSPlayer
+from .my_algorithm.MAB.PUCT import *
+
+
+class myPlayer(MCTSPlayer):
+    def __init__(self, _id):
+        # Initialize the Multi-armed bandit algorithm, with priors from the naive move ordering
+        super().__init__(_id, PUCT(2.0))
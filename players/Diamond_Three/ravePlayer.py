@@ -0,0 +1,8 @@
+from .my_algorithm.mcts_player import MCTSPlayer
+from .my_algorithm.MAB.UCB import *
+
+
+class myPlayer(MCTSPlayer):
+    def __init__(self, _id):
+        # Same as myPlayer, with the AMAF values of the moves blended into the Selection (RAVE)
+        super().__init__(_id, UCB(0.5), rave=True)
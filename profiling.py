@@ -0,0 +1,135 @@
+#- Per-agent profiling of the player calls made by AdvanceGameRunner.
+#- The player's SelectMove and StartRound are wrapped so that the profilers
+#- only run inside the agent (in the func_timeout thread), never in the
+#- framework. Two outputs per player and per game:
+#-   - a pstats file of the deterministic profiler (cProfile)
+#-   - a collapsed-stack file ("frame;frame;frame count" per line) built by a
+#-     sampling thread, readable by flamegraph.pl, speedscope or inferno
+#- With a latency threshold, cProfile is turned off (its overhead alone makes
+#- agents time out) and only the stacks of the calls slower than the
+#- threshold are kept, which is cheap enough for large runs.
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+class _StackSampler:
+    """Sample the stack of one thread every `interval` seconds until stopped."""
+    def __init__(self, thread_id, stop_code, interval):
+        self.thread_id = thread_id
+        self.stop_code = stop_code
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._Run, daemon=True)
+
+    def Start(self):
+        self._thread.start()
+
+    def Stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _Run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # Walk up to the profiling wrapper, the frames above it belong to the framework
+            while frame is not None and frame.f_code is not self.stop_code:
+                code = frame.f_code
+                stack.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+
+class AgentProfiler:
+    """Profile the SelectMove/StartRound calls of one player.
+
+    Attributes:
+        threshold: only keep the calls that took at least this many seconds (0 keeps every call,
+            a positive threshold also disables cProfile)
+        interval: stack sampling interval in seconds
+        calls: number of calls profiled since the last Dump
+        kept: (method, seconds) of the calls kept since the last Dump
+    """
+    def __init__(self, threshold=0.0, interval=0.002):
+        self.threshold = threshold
+        self.interval = interval
+        self.deterministic = threshold <= 0
+        self._Reset()
+
+    def _Reset(self):
+        self.calls = 0
+        self.kept = []
+        self.stats = None
+        self.samples = {}
+
+    def Wrap(self, player):
+        """Replace the player's SelectMove and StartRound by profiled versions."""
+        player.SelectMove = self._Profiled("SelectMove", player.SelectMove)
+        if getattr(player, "StartRound", None) is not None:
+            player.StartRound = self._Profiled("StartRound", player.StartRound)
+        return player
+
+    def _Profiled(self, method_name, method):
+        profiler = self
+
+        def ProfiledCall(*args, **kwargs):
+            profile = cProfile.Profile() if profiler.deterministic else None
+            sampler = _StackSampler(threading.get_ident(), ProfiledCall.__code__, profiler.interval)
+            sampler.Start()
+            start = time.perf_counter()
+            if profile is not None:
+                profile.enable()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                # Also reached when func_timeout stops the call, so time outs are always kept
+                if profile is not None:
+                    profile.disable()
+                profiler._Record(method_name, time.perf_counter() - start, profile, sampler.Stop())
+
+        return ProfiledCall
+
+    def _Record(self, method_name, elapsed, profile, samples):
+        self.calls += 1
+        if elapsed < self.threshold:
+            return
+        self.kept.append((method_name, elapsed))
+        for stack, count in samples.items():
+            # Prefix the stacks with the method so the flamegraph separates the two
+            stack = method_name + ";" + stack
+            self.samples[stack] = self.samples.get(stack, 0) + count
+        if profile is not None:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def Dump(self, prefix):
+        """Write <prefix>.pstats and <prefix>.collapsed, then start afresh. Returns the files written."""
+        files = []
+        prefix_dir = os.path.dirname(prefix)
+        if prefix_dir and not os.path.exists(prefix_dir):
+            os.makedirs(prefix_dir)
+        if self.stats is not None:
+            self.stats.dump_stats(prefix + ".pstats")
+            files.append(prefix + ".pstats")
+        if self.samples:
+            with open(prefix + ".collapsed", 'w') as f:
+                for stack, count in sorted(self.samples.items()):
+                    f.write("{} {}\n".format(stack, count))
+            files.append(prefix + ".collapsed")
+        self._Reset()
+        return files
+
+    def Summary(self):
+        slowest = max((elapsed for _, elapsed in self.kept), default=0.0)
+        return "{} calls profiled, {} kept, slowest {:.3f}s".format(self.calls, len(self.kept), slowest)
@@ -0,0 +1,305 @@
+#- Headless batch validation and analytics over a directory of replays.
+#- Every replay is re-run through ReplayRunner (which checks ValidMove for
+#- each recorded move) in a pool of worker processes. Results are streamed
+#- into CSV files as soon as each game is analysed, and the aggregate
+#- statistics only keep bounded histograms, so memory stays flat no matter
+#- how many replays are in the archive.
+#-
+#- Output files (written into the chosen output directory):
+#-   replay_games.csv   one row per replay
+#-   replay_rounds.csv  one row per (replay, round, player) score delta
+#-   replay_summary.csv aggregate statistics over all valid replays
+
+from advance_model import ReplayRunner
+from displayer import GameDisplayer
+from utils import *
+import csv
+import math
+import multiprocessing
+import os
+import pickle
+import sys
+import traceback
+
+REPLAY_EXTENSIONS = (".replay", ".reply")
+
+GAME_COLUMNS = ["file", "valid", "error", "seed", "red_name", "blue_name",
+                "red_score", "blue_score", "recorded_red_score", "recorded_blue_score",
+                "winner", "forfeit", "rounds", "moves", "red_moves", "blue_moves",
+                "red_warnings", "blue_warnings", "timeout_positions"]
+ROUND_COLUMNS = ["file", "round", "player", "score_delta", "moves"]
+SUMMARY_COLUMNS = ["metric", "count", "mean", "std", "min", "p50", "p95", "max"]
+
+
+class StatsGameDisplayer(GameDisplayer):
+    """Displayer that collects per-round and per-game statistics instead of drawing."""
+    def __init__(self):
+        self.round_start_scores = []
+        self.round_deltas = []
+        self.round_moves = []
+        self.moves = []
+        self.final_scores = None
+
+    def InitDisplayer(self, runner):
+        self.moves = [0] * runner.player_num
+
+    def StartRound(self, game_state):
+        self.round_start_scores = [plr.score for plr in game_state.players]
+        self.round_moves.append([0] * len(game_state.players))
+
+    def ExcuteMove(self, i, move, game_state):
+        self.moves[i] += 1
+        self.round_moves[-1][i] += 1
+
+    def EndRound(self, game_state):
+        self.round_deltas.append([plr.score - self.round_start_scores[i]
+                                  for i, plr in enumerate(game_state.players)])
+
+    def EndGame(self, game_state):
+        self.final_scores = [plr.score for plr in game_state.players]
+
+
+def AnalyseReplay(file_name):
+    """Re-run a single replay file and return a flat dict of its statistics."""
+    result = {"file": os.path.basename(file_name), "valid": False, "error": ""}
+    try:
+        with open(file_name, 'rb') as f:
+            replay = pickle.load(f, encoding="bytes")
+    except Exception as e:
+        result["error"] = "unreadable: {}".format(type(e).__name__)
+        return result
+
+    result["seed"] = replay.get("seed")
+    names = replay.get("players_namelist", ["", ""])
+    result["red_name"], result["blue_name"] = names[0], names[1]
+    warning_positions = replay.get("warning_positions", [])
+    result["red_warnings"] = sum(1 for pos in warning_positions if pos[0] == 0)
+    result["blue_warnings"] = sum(1 for pos in warning_positions if pos[0] == 1)
+    result["timeout_positions"] = ";".join("{}:{}:{}".format(*pos) for pos in warning_positions)
+    result["recorded_red_score"] = float(replay[0][0])
+    result["recorded_blue_score"] = float(replay[1][0])
+
+    stats = StatsGameDisplayer()
+    try:
+        ReplayRunner(replay, stats).Run()
+    except AssertionError:
+        result["error"] = "invalid move"
+    except (IndexError, KeyError):
+        result["error"] = "truncated replay"
+    except Exception as e:
+        result["error"] = "replay failed: {}".format(type(e).__name__)
+
+    result["rounds"] = len(stats.round_deltas)
+    result["red_moves"], result["blue_moves"] = stats.moves
+    result["moves"] = sum(stats.moves)
+    result["round_deltas"] = stats.round_deltas
+    result["round_moves"] = stats.round_moves
+    if result["error"]:
+        return result
+
+    red_score, blue_score = [float(score) for score in stats.final_scores]
+    # A forfeited game records -1 for the team that timed out and 0 for the other
+    result["forfeit"] = -1 in (red_score, blue_score)
+    if result["forfeit"]:
+        red_score, blue_score = [-1.0 if score == -1 else 0.0 for score in (red_score, blue_score)]
+    result["red_score"], result["blue_score"] = red_score, blue_score
+    if red_score != result["recorded_red_score"] or blue_score != result["recorded_blue_score"]:
+        result["error"] = "score mismatch"
+        return result
+
+    if red_score > blue_score:
+        result["winner"] = "red"
+    elif red_score < blue_score:
+        result["winner"] = "blue"
+    else:
+        result["winner"] = "tie"
+    result["valid"] = True
+    return result
+
+
+def _SafeAnalyseReplay(file_name):
+    # Never let one broken replay take down a worker of the pool
+    try:
+        return AnalyseReplay(file_name)
+    except Exception:
+        return {"file": os.path.basename(file_name), "valid": False,
+                "error": traceback.format_exc().strip().splitlines()[-1]}
+
+
+def IterReplayFiles(replay_dir):
+    """Lazily yield every replay file under replay_dir."""
+    for dir_path, _, file_names in os.walk(replay_dir):
+        for file_name in sorted(file_names):
+            if file_name.endswith(REPLAY_EXTENSIONS):
+                yield os.path.join(dir_path, file_name)
+
+
+class StreamingMetric:
+    """Running count/mean/std/min/max plus an integer histogram for percentiles.
+
+    Azul scores, move counts and round deltas are small integers, so the
+    histogram stays bounded regardless of how many samples are added.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = {}
+
+    def Add(self, value):
+        # Welford's online algorithm
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        bucket = int(round(value))
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def Percentile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen > rank:
+                return bucket
+        return self.max
+
+    def Row(self):
+        std = math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return [self.name, self.count, "{:.3f}".format(self.mean), "{:.3f}".format(std),
+                "{:g}".format(self.min), self.Percentile(0.5), self.Percentile(0.95), "{:g}".format(self.max)]
+
+
+class ReplayAggregator:
+    """Aggregate statistics over all analysed replays."""
+    def __init__(self):
+        self.games = 0
+        self.invalid = 0
+        self.errors = {}
+        self.red_wins = 0
+        self.blue_wins = 0
+        self.ties = 0
+        self.forfeits = 0
+        self.metrics = {}
+
+    def _Metric(self, name):
+        if name not in self.metrics:
+            self.metrics[name] = StreamingMetric(name)
+        return self.metrics[name]
+
+    def Add(self, result):
+        self.games += 1
+        if not result["valid"]:
+            self.invalid += 1
+            self.errors[result["error"]] = self.errors.get(result["error"], 0) + 1
+            return
+        if result["winner"] == "red":
+            self.red_wins += 1
+        elif result["winner"] == "blue":
+            self.blue_wins += 1
+        else:
+            self.ties += 1
+        if result["forfeit"]:
+            # Forfeited games have no meaningful scores
+            self.forfeits += 1
+            return
+        self._Metric("red_score").Add(result["red_score"])
+        self._Metric("blue_score").Add(result["blue_score"])
+        self._Metric("score_margin").Add(result["red_score"] - result["blue_score"])
+        self._Metric("game_moves").Add(result["moves"])
+        self._Metric("game_rounds").Add(result["rounds"])
+        self._Metric("warnings").Add(result["red_warnings"] + result["blue_warnings"])
+        for round_id, deltas in enumerate(result["round_deltas"]):
+            for player_id, delta in enumerate(deltas):
+                self._Metric("round_{}_delta".format(round_id + 1)).Add(delta)
+                self._Metric("round_delta").Add(delta)
+
+    def Rows(self):
+        rows = [["games", self.games, "", "", "", "", "", ""],
+                ["invalid", self.invalid, "", "", "", "", "", ""],
+                ["red_wins", self.red_wins, "", "", "", "", "", ""],
+                ["blue_wins", self.blue_wins, "", "", "", "", "", ""],
+                ["ties", self.ties, "", "", "", "", "", ""],
+                ["forfeits", self.forfeits, "", "", "", "", "", ""]]
+        for error, count in sorted(self.errors.items()):
+            rows.append(["error: " + error, count, "", "", "", "", "", ""])
+        for name in sorted(self.metrics):
+            rows.append(self.metrics[name].Row())
+        return rows
+
+
+def AnalyseReplays(replay_dir, output_dir, workers=None, quiet=False):
+    """Validate every replay under replay_dir and write the CSV reports into output_dir.
+
+    Returns the ReplayAggregator with the aggregate statistics.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    workers = workers or multiprocessing.cpu_count()
+    aggregator = ReplayAggregator()
+
+    with open(os.path.join(output_dir, "replay_games.csv"), 'w', newline='') as games_file, \
+            open(os.path.join(output_dir, "replay_rounds.csv"), 'w', newline='') as rounds_file:
+        games_writer = csv.DictWriter(games_file, GAME_COLUMNS, extrasaction='ignore')
+        games_writer.writeheader()
+        rounds_writer = csv.writer(rounds_file)
+        rounds_writer.writerow(ROUND_COLUMNS)
+
+        with multiprocessing.Pool(workers) as pool:
+            for result in pool.imap_unordered(_SafeAnalyseReplay, IterReplayFiles(replay_dir), chunksize=8):
+                games_writer.writerow(result)
+                round_moves = result.get("round_moves", [])
+                for round_id, deltas in enumerate(result.get("round_deltas", [])):
+                    for player_id, delta in enumerate(deltas):
+                        moves = round_moves[round_id][player_id] if round_id < len(round_moves) else ""
+                        rounds_writer.writerow([result["file"], round_id + 1, player_id, "{:g}".format(delta), moves])
+                aggregator.Add(result)
+                if not quiet and not result["valid"]:
+                    print("Invalid replay {}: {}".format(result["file"], result["error"]), file=sys.stderr)
+
+    with open(os.path.join(output_dir, "replay_summary.csv"), 'w', newline='') as summary_file:
+        summary_writer = csv.writer(summary_file)
+        summary_writer.writerow(SUMMARY_COLUMNS)
+        summary_writer.writerows(aggregator.Rows())
+    return aggregator
+
+
+def loadParameter():
+
+    """
+    Processes the command used to run the replay analyser from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python replay_analyser.py <options>
+    EXAMPLES:   (1) python replay_analyser.py
+                    - validates every replay in ./output and writes the reports into ./output/analysis
+                (2) python replay_analyser.py -d tournament -j 8
+                    - validates the replays in ./tournament with 8 worker processes
+    """
+    parser = OptionParser(usageStr)
+
+    parser.add_option('-d', '--replayDir', help='directory containing the replay files (default: output)', default='output')
+    parser.add_option('-o', '--output', help='output directory for the csv reports (default: <replayDir>/analysis)', default=None)
+    parser.add_option('-j', '--workers', type='int', help='number of worker processes (default: number of cores)', default=None)
+    parser.add_option('-Q', '--superQuiet', action='store_true', help='No output at all', default=False)
+
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+    return options
+
+
+if __name__ == '__main__':
+    options = loadParameter()
+    output_dir = options.output or os.path.join(options.replayDir, "analysis")
+    aggregator = AnalyseReplays(options.replayDir, output_dir, options.workers, options.superQuiet)
+    if not options.superQuiet:
+        print("Analysed {} replays ({} invalid), reports written to {}".format(
+            aggregator.games, aggregator.invalid, output_dir))
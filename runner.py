@@ -1,4 +1,4 @@
-from advance_model import AdvanceGameRunner, ReplayRunner
+from advance_model import AdvanceGameRunner, ReplayRunner, ThinkTimeSummary
 from displayer import TextGameDisplayer,GUIGameDisplayer
 from utils import *
 import sys
@@ -46,6 +46,37 @@ def loadAgent(file_list,name_list):
             print ('\n[Error] Player {} team {} agent {} loaded\n'.format(i,name_list[i],file_list[i]))
 
 
+def addGameResult(r_score,b_score):
+    # games_results keeps the running totals after every game
+    _,_,r_total,b_total,r_win,b_win,tie = games_results[len(games_results)-1]
+    r_total = r_total+r_score
+    b_total = b_total+b_score
+    if r_score==b_score:
+        tie =  tie + 1
+    elif r_score<b_score:
+        b_win = b_win + 1
+    else:
+        r_win = r_win + 1
+    games_results.append((r_score,b_score,r_total,b_total,r_win,b_win,tie))
+
+
+def thinkTimeToString(pct,time_limit=None):
+    if pct is None:
+        return "no move"
+    line = "p50 {:.3f}s p95 {:.3f}s p99 {:.3f}s max {:.3f}s".format(pct["p50"],pct["p95"],pct["p99"],pct["max"])
+    if time_limit is not None:
+        line += " (margin {:+.3f}s)".format(time_limit-pct["max"])
+    return line
+
+
+def printThinkTimes(summary,name_list,time_limit,per_round=False):
+    for i,name in enumerate(name_list):
+        print("Think time of {}: wall {}; cpu {}".format(name,thinkTimeToString(summary[i]["all"]["wall"],time_limit),thinkTimeToString(summary[i]["all"]["cpu"])))
+        if per_round:
+            for round_count,pcts in summary[i]["rounds"].items():
+                print("    round {}: wall {}; cpu {}".format(round_count+1,thinkTimeToString(pcts["wall"],time_limit),thinkTimeToString(pcts["cpu"])))
+
+
 class HidePrint:
     # setting output steam
     def __init__(self,flag,file_path,f_name):
@@ -106,15 +137,67 @@ def run(options):
             replay_dir +=".replay"
         replay = pickle.load(open(replay_dir,'rb'),encoding="bytes")
         ReplayRunner(replay,displayer).Run()
+    elif options.sprt:
+        import sprt
+        sprt.RunMatch(options.red, options.blue, players_names,
+                      seed=None if options.setRandomSeed == 90054 else options.setRandomSeed,
+                      max_games=options.sprtMaxGames,
+                      elo0=options.elo0, elo1=options.elo1,
+                      alpha=options.alpha, beta=options.beta,
+                      time_limit=warnning_time,
+                      warning_limit=num_of_warning,
+                      verbose=not options.superQuiet)
+    elif options.league:
+        import league
+        agents = options.leagueAgents.split(',') if options.leagueAgents else None
+        league.RunLeague(agents,
+                         seed=options.setRandomSeed,
+                         pairs_per_match=options.leaguePairs,
+                         workers=options.workers,
+                         cache_file=options.leagueCache or os.path.join(file_path, "league_cache.jsonl"),
+                         time_limit=warnning_time,
+                         warning_limit=num_of_warning,
+                         recycle_games=options.recycleGames,
+                         max_worker_mb=options.maxWorkerMemory,
+                         verbose=not options.superQuiet)
     else: 
-        for i in range(options.multipleGames):
+        journal = None
+        first_game = 0
+        if options.journal is not None:
+            # Resume from the games already in the journal, if any
+            from tournament import GameJournal
+            journal = GameJournal(options.journal)
+            journal.Open({"red":options.red,
+                          "blue":options.blue,
+                          "names":players_names,
+                          "seed":None if options.setRandomSeed == 90054 else options.setRandomSeed})
+            for game in journal.games[:options.multipleGames]:
+                addGameResult(game["red_score"],game["blue_score"])
+            first_game = min(len(journal.games),options.multipleGames)
+            if first_game > 0 and not options.superQuiet:
+                print("Resuming from journal {}: {} of {} games already played".format(options.journal,first_game,options.multipleGames))
+
+        profilers = None
+        if options.profile:
+            from profiling import AgentProfiler
+            profilers = [AgentProfiler(options.profileThreshold) for _ in players_names]
+
+        # think times of every game, to report the latency percentiles of the whole run
+        think_times = {0:[],1:[]}
+
+        for i in range(first_game,options.multipleGames):
             # loading players
             loadAgent([options.red,options.blue],players_names)
+            if profilers is not None:
+                for profiler,plr in zip(profilers,players):
+                    profiler.Wrap(plr)
 
             import datetime
             f_name = players_names[0]+'-vs-'+players_names[1]+datetime.datetime.now().strftime("%d-%b-%Y-%H-%M-%S-%f")
             
-            if options.setRandomSeed == 90054:
+            if journal is not None:
+                random_seed = journal.GameSeed(i)
+            elif options.setRandomSeed == 90054:
                 import time
                 random_seed = int(str(time.time()).replace('.', ''))
 
@@ -128,20 +211,23 @@ def run(options):
             with HidePrint(options.saveLog,file_path,f_name):                
                 replay = gr.Run()
 
-            _,_,r_total,b_total,r_win,b_win,tie = games_results[len(games_results)-1]
+            if profilers is not None:
+                for profiler,name in zip(profilers,players_names):
+                    summary = profiler.Summary()
+                    files = profiler.Dump(os.path.join(file_path,"profile-"+f_name+"-"+name))
+                    if not options.superQuiet:
+                        print("Profile of {}: {} {}".format(name,summary," ".join(files)))
+
             r_score = replay[0][0]
             b_score = replay[1][0]
-            r_total = r_total+r_score
-            b_total = b_total+b_score
-            if r_score==b_score:
-                tie =  tie + 1
-            elif r_score<b_score:
-                b_win = b_win + 1
-            else:
-                r_win = r_win + 1
+            addGameResult(r_score,b_score)
+            if journal is not None:
+                journal.AddGame(i,random_seed,r_score,b_score)
+            for p in think_times:
+                think_times[p].extend(replay["think_times"][p])
             if not options.superQuiet:
+                printThinkTimes(replay["think_time_summary"],players_names,warnning_time)
                 print("Result of game ({}/{}): Player {} earned {} points; Player {} earned {} points\n".format(i+1,options.multipleGames,players_names[0],r_score,players_names[1],b_score))
-            games_results.append((r_score,b_score,r_total,b_total,r_win,b_win,tie))
 
             if options.saveGameRecord:
                 # f_name = file_path+"/replay-"+players_names[0]+'-vs-'+players_names[1]+datetime.datetime.now().strftime("%d-%b-%Y-%H-%M-%S-%f")+'.replay'
@@ -161,6 +247,8 @@ def run(options):
             print(
                 "Over {} games: \nPlayer {} earned {:+.2f} points in average and won {} games, winning rate {:.2f}%; \nPlayer {} earned {:+.2f} points in average and won {} games, winning rate {:.2f}%; \nAnd {} games tied.".format(options.multipleGames,
                 players_names[0],r_avg,r_win,r_win_rate,players_names[1],b_avg,b_win,b_win_rate,tie))
+            if any(think_times.values()):
+                printThinkTimes(ThinkTimeSummary(think_times),players_names,warnning_time,per_round=True)
 
 
 def loadParameter():
@@ -175,6 +263,12 @@ def loadParameter():
                     - starts a game with two NaivePlayer
                 (2) python runner.py -r naive_player -b myPlayer
                     - starts a fully automated game where the red team is a NaivePlayer and blue team is myPlayer
+                (3) python runner.py -r Diamond_Three.ucb1 -b Diamond_Three.ucb01 --sprt --elo0 0 --elo1 20
+                    - plays game pairs until a SPRT decides whether ucb1 is at least 20 Elo stronger than ucb01
+                (4) python runner.py --league -j 4
+                    - plays a round robin between every agent under players/ on 4 worker processes
+                (5) python runner.py -r Diamond_Three.myPlayer -q -m 20 --profile --profileThreshold 0.95
+                    - keeps the stacks of every move of myPlayer that took more than 0.95s
     """
     parser = OptionParser(usageStr)
 
@@ -192,8 +286,24 @@ def loadParameter():
     parser.add_option('-s','--saveGameRecord', action='store_true', help='Writes game histories to a file (named by teams\' names and the time they were played) (default: False)', default=False)
     parser.add_option('-o','--output', help='output directory for replay and log (default: output)',default='output')
     parser.add_option('-l','--saveLog', action='store_true',help='Writes player printed information into a log file(named by the time they were played)', default=False)
+    parser.add_option('--journal', default=None, help='Append every finished game to this journal file and resume from it when the run is restarted')
+    parser.add_option('--profile', action='store_true', help='Profile the SelectMove/StartRound calls of each player, writes pstats and collapsed stacks per game into the output directory', default=False)
+    parser.add_option('--profileThreshold', type='float', help='With --profile, only keep the calls slower than this many seconds, sampled stacks only (default: 0, every call)', default=0.0)
     parser.add_option('--replay', default=None, help='Replays a recorded game file by a relative path')
     parser.add_option('--delay', type='float', help='Delay action in a play or replay by input (float) seconds (default 0.1)', default=0.1)
+    parser.add_option('--sprt', action='store_true', help='Play colour-swapped game pairs until a SPRT decides whether red is stronger than blue', default=False)
+    parser.add_option('--sprtMaxGames', type='int', help='Maximum number of games in --sprt mode (default: 1000)', default=1000)
+    parser.add_option('--elo0', type='float', help='Elo difference of the SPRT null hypothesis (default: 0)', default=0.0)
+    parser.add_option('--elo1', type='float', help='Elo difference of the SPRT alternative hypothesis (default: 10)', default=10.0)
+    parser.add_option('--alpha', type='float', help='SPRT false positive rate (default: 0.05)', default=0.05)
+    parser.add_option('--beta', type='float', help='SPRT false negative rate (default: 0.05)', default=0.05)
+    parser.add_option('--league', action='store_true', help='Play a round robin between every agent under players/ and rank them by Elo', default=False)
+    parser.add_option('--leagueAgents', help='Comma separated agent files for --league (default: every agent under players/)', default=None)
+    parser.add_option('--leaguePairs', type='int', help='Colour-swapped game pairs per pairing in --league mode (default: 2)', default=2)
+    parser.add_option('--leagueCache', help='Result cache of --league mode (default: <output>/league_cache.jsonl)', default=None)
+    parser.add_option('-j', '--workers', type='int', help='Number of worker processes in --league mode (default: number of cores)', default=None)
+    parser.add_option('--recycleGames', type='int', help='Replace a --league worker process after this many games (default: 0, never)', default=0)
+    parser.add_option('--maxWorkerMemory', type='float', help='Replace a --league worker process once its resident memory exceeds this many MB (default: 0, no limit)', default=0)
 
     options, otherjunk = parser.parse_args(sys.argv[1:] )
     assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
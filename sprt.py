@@ -0,0 +1,133 @@
+#- Sequential probability ratio test (SPRT) match mode for A/B testing agents.
+#- Games are played in pairs that share a seed, with the colours swapped in
+#- the second game, and the test stops as soon as the log-likelihood ratio
+#- crosses one of the bounds given by alpha and beta.
+#-
+#- The win/draw/loss model is the BayesElo one used by cutechess-cli:
+#- elo0/elo1 are the null and alternative hypotheses for the Elo difference
+#- of agent A (red option) over agent B (blue option).
+
+from tournament import PlayGame, GameScores, SeedSequence, RandomBaseSeed
+import math
+
+
+def BayesEloToProba(elo, draw_elo):
+    """Return the (win, draw, loss) probabilities for a BayesElo difference."""
+    p_win = 1.0 / (1.0 + 10.0 ** ((-elo + draw_elo) / 400.0))
+    p_loss = 1.0 / (1.0 + 10.0 ** ((elo + draw_elo) / 400.0))
+    return p_win, 1.0 - p_win - p_loss, p_loss
+
+
+def ScoreToElo(score):
+    """Logistic Elo difference for an expected score in (0, 1)."""
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+class SPRT:
+    """Keep track of the W/D/L counts of agent A and decide the test.
+
+    Attributes:
+        elo0, elo1: Elo bounds of the null and alternative hypotheses
+        lower_bound, upper_bound: LLR bounds, H0 is accepted below and H1 above
+    """
+    def __init__(self, elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower_bound = math.log(beta / (1.0 - alpha))
+        self.upper_bound = math.log((1.0 - beta) / alpha)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def AddResult(self, score_a, score_b):
+        if score_a > score_b:
+            self.wins += 1
+        elif score_a < score_b:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def LLR(self):
+        """Log-likelihood ratio of H1 against H0 for the current results."""
+        if self.games == 0:
+            return 0.0
+        # Draw elo is estimated from the observed results (as cutechess does),
+        # half a pseudo game per outcome keeps it finite before every outcome was seen
+        w = (self.wins + 0.5) / (self.games + 1.5)
+        l = (self.losses + 0.5) / (self.games + 1.5)
+        draw_elo = 200.0 * math.log10((1.0 - l) / l * (1.0 - w) / w)
+        p0 = BayesEloToProba(self.elo0, draw_elo)
+        p1 = BayesEloToProba(self.elo1, draw_elo)
+        llr = self.wins * math.log(p1[0] / p0[0]) + self.losses * math.log(p1[2] / p0[2])
+        if self.draws > 0:
+            llr += self.draws * math.log(p1[1] / p0[1])
+        return llr
+
+    def Status(self):
+        """Return 'H0', 'H1' or None while the test is still running."""
+        llr = self.LLR()
+        if llr >= self.upper_bound:
+            return 'H1'
+        if llr <= self.lower_bound:
+            return 'H0'
+        return None
+
+    def EloInterval(self, z=1.96):
+        """Logistic Elo estimate of A over B with a (default 95%) confidence interval."""
+        n = self.games
+        if n == 0:
+            return 0.0, float('-inf'), float('inf')
+        score = (self.wins + 0.5 * self.draws) / n
+        variance = (self.wins * (1.0 - score) ** 2 + self.draws * (0.5 - score) ** 2 +
+                    self.losses * score ** 2) / n
+        margin = z * math.sqrt(variance / n)
+        # Clamp so that a clean sweep still produces a finite interval
+        eps = 1.0 / (2 * n)
+        bounded = lambda s: ScoreToElo(min(max(s, eps), 1.0 - eps))
+        return bounded(score), bounded(score - margin), bounded(score + margin)
+
+    def Summary(self):
+        elo, low, high = self.EloInterval()
+        return "Games {}: W {} D {} L {}  Elo {:+.1f} [{:+.1f}, {:+.1f}]  LLR {:+.3f} [{:+.3f}, {:+.3f}]".format(
+            self.games, self.wins, self.draws, self.losses, elo, low, high,
+            self.LLR(), self.lower_bound, self.upper_bound)
+
+
+def RunMatch(agent_a, agent_b, names, seed=None, max_games=1000, elo0=0.0, elo1=10.0,
+             alpha=0.05, beta=0.05, time_limit=1.0, warning_limit=3, verbose=True):
+    """Play colour-swapped game pairs between agent_a and agent_b until the SPRT decides.
+
+    Returns the SPRT object, its Status() is None if max_games was reached first.
+    """
+    if seed is None:
+        seed = RandomBaseSeed()
+    test = SPRT(elo0, elo1, alpha, beta)
+    num_pairs = (max_games + 1) // 2
+    for pair_id, pair_seed in enumerate(SeedSequence(seed, num_pairs)):
+        # Same seed, colours swapped: the tiles drawn are the same for both games
+        replay = PlayGame([agent_a, agent_b], names, pair_seed, time_limit, warning_limit)
+        red_score, blue_score = GameScores(replay)
+        test.AddResult(red_score, blue_score)
+        replay = PlayGame([agent_b, agent_a], [names[1], names[0]], pair_seed, time_limit, warning_limit)
+        red_score, blue_score = GameScores(replay)
+        test.AddResult(blue_score, red_score)
+
+        if verbose:
+            print("Pair {}/{} (seed {}): {}".format(pair_id + 1, num_pairs, pair_seed, test.Summary()))
+        if test.Status() is not None:
+            break
+
+    if verbose:
+        status = test.Status()
+        if status == 'H1':
+            print("SPRT accepted H1: {} - {} >= {} Elo".format(names[0], names[1], elo1))
+        elif status == 'H0':
+            print("SPRT accepted H0: {} - {} <= {} Elo".format(names[0], names[1], elo0))
+        else:
+            print("SPRT undecided after {} games".format(test.games))
+        print(test.Summary())
+    return test
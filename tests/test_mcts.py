@@ -0,0 +1,93 @@
+import random
+import unittest
+from unittest import mock
+from model import GameState
+from players.Diamond_Three.my_algorithm import MCTS, Qfunctions
+from players.Diamond_Three.my_algorithm.MAB.UCB import UCB
+
+
+class FakeClock:
+    """time module whose time() stands still for the first `frozen_calls` calls, then jumps by `step`"""
+
+    def __init__(self, frozen_calls, step):
+        self.calls = 0
+        self.frozen_calls = frozen_calls
+        self.step = step
+
+    def time(self):
+        self.calls += 1
+        return 0.0 if self.calls <= self.frozen_calls else self.step
+
+
+def NewSearch(time_limit=0, num_moves=None, **options):
+    random.seed(2021)
+    game_state = GameState(2)
+    for plr in game_state.players:
+        plr.player_trace.StartRound()
+    moves = game_state.players[0].GetAvailableMoves(game_state)
+    if num_moves is not None:
+        moves = moves[:num_moves]
+    return MCTS.MonteCarloTreeSearch(0, game_state, moves, time_limit, UCB(0.5), 1, **options)
+
+
+def SetChild(child, visits, father_mean):
+    """Give a root child `visits` visits with an average reward of father_mean for the root player"""
+    child.state.visited_count = visits
+    child.state.win_scores_sum = [father_mean * visits, 0]
+
+
+class BestMoveDecidedTest(unittest.TestCase):
+    def setUp(self):
+        self.mcts = NewSearch(reward_range=10.0)
+        self.children = self.mcts.root.children[:3]
+        del self.mcts.root.children[3:]
+
+    def SetChildren(self, stats):
+        for child, (visits, father_mean) in zip(self.children, stats):
+            SetChild(child, visits, father_mean)
+        self.mcts.root.state.visited_count = sum(visits for visits, _ in stats)
+
+    def testBestNotMostVisited(self):
+        self.SetChildren([(50, 10.0), (100, 1.0), (10, 0.0)])
+        self.assertFalse(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 0))
+
+    def testVisitGap(self):
+        # The bounds overlap, the decision only comes from the visits the others can't catch up
+        self.SetChildren([(100, 2.0), (60, 1.5), (10, 1.0)])
+        self.assertTrue(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 39))
+        self.assertFalse(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 40))
+
+    def testConfidenceBounds(self):
+        self.SetChildren([(100, 2.0), (90, 1.5), (80, 1.0)])
+        self.assertFalse(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 1000))
+        self.mcts.reward_range = 0.1
+        self.assertTrue(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 1000))
+
+    def testUnvisitedChild(self):
+        self.SetChildren([(100, 2.0), (90, 1.5), (0, 0.0)])
+        self.mcts.reward_range = 0.1
+        self.assertFalse(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 1000))
+
+    def testSingleMove(self):
+        del self.mcts.root.children[1:]
+        self.assertTrue(self.mcts._BestMoveDecided(Qfunctions.AverageQfunc, 1000))
+
+
+class EarlyStopTest(unittest.TestCase):
+    def testTimeSaved(self):
+        mcts = NewSearch(time_limit=5.0, num_moves=1, early_stop=True)
+        move = mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AverageQfunc)
+        self.assertEqual(move, mcts.root.children[0].state.pre_move)
+        self.assertEqual(mcts.root.state.visited_count, MCTS.MonteCarloTreeSearch.STOP_CHECK_INTERVAL)
+        self.assertGreater(mcts.time_saved, 4.0)
+
+    def testClockNotMoved(self):
+        # Time stands still over the first early stop check
+        mcts = NewSearch(time_limit=1.0, early_stop=True)
+        with mock.patch.object(MCTS, "time", FakeClock(MCTS.MonteCarloTreeSearch.STOP_CHECK_INTERVAL + 1, 2.0)):
+            mcts.FindNextMove(Qfunctions.AverageQfunc, Qfunctions.AverageQfunc)
+        self.assertEqual(mcts.time_saved, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
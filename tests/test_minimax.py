@@ -0,0 +1,80 @@
+import copy
+import random
+import unittest
+from model import GameState
+from players.Diamond_Three.my_algorithm.MCTS import MonteCarloTreeSearch
+from players.Diamond_Three.my_algorithm.Minimax import Minimax
+from players.Diamond_Three.my_algorithm.game_tree import Node, State, MoveSignature
+from players.Diamond_Three.my_algorithm.parallel_search import SearchPool
+from players.Diamond_Three.my_algorithm.rollout_policy import GreedyRolloutMove, WallFree
+
+# Seeds of the first round positions searched
+SEEDS = [0, 2, 3, 6]
+# Moves left in the round: the searches reach the end of the round, so no random rollout is involved
+PLIES_LEFT = 4
+
+
+def EndOfRoundPosition(seed, plies_left):
+    """(game state, player to move) of a first round played by the rollout policy, plies_left moves from its end"""
+    random.seed(seed)
+    game_state = GameState(2)
+    for plr in game_state.players:
+        plr.player_trace.StartRound()
+    rollout = copy.deepcopy(game_state)
+    rng = random.Random(seed)
+    wall_free = [WallFree(plr) for plr in rollout.players]
+    player_id = rollout.first_player
+    moves = []
+    while rollout.TilesRemaining():
+        move = GreedyRolloutMove(rollout, player_id, wall_free[player_id], rng)
+        moves.append((player_id, move))
+        rollout.ExecuteMove(player_id, move)
+        player_id = 1 - player_id
+    for player_id, move in moves[:-plies_left]:
+        game_state.ExecuteMove(player_id, move)
+    return game_state, moves[-plies_left][0]
+
+
+def BruteForceValue(node):
+    """Minimax value of the score difference, without any pruning"""
+    if not node.state.game_state.TilesRemaining():
+        rewards, _ = MonteCarloTreeSearch.Simulation(node)
+        return rewards[0] - rewards[1]
+    node.ExpandChildren()
+    values = [BruteForceValue(child) for child in node.children]
+    return max(values) if node.state.player_id == 0 else min(values)
+
+
+def Search(game_state, player_id, pool=None):
+    random.seed(1)
+    searcher = Minimax(player_id, game_state, game_state.players[player_id].GetAvailableMoves(game_state),
+                       time_limit=60, pool=pool)
+    move = searcher.FindNextMove()
+    return searcher, move
+
+
+class RootSplitTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SearchPool(2, tt_size=10000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.Close()
+
+    def testSameMoveAndValue(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                game_state, player_id = EndOfRoundPosition(seed, PLIES_LEFT)
+                serial, serial_move = Search(game_state, player_id)
+                split, split_move = Search(game_state, player_id, self.pool)
+                self.assertFalse(serial.timed_out or split.timed_out)
+                self.assertEqual(split.depth, serial.depth)
+                self.assertEqual(MoveSignature(split_move), MoveSignature(serial_move))
+                self.assertEqual(split.root_bound, serial.root_bound)
+                root = Node(State(player_id, copy.deepcopy(game_state), None), None)
+                self.assertEqual(serial.root_bound, BruteForceValue(root))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import random
+import unittest
+from model import GameState
+from players.Diamond_Three.my_algorithm.MCTS import MonteCarloTreeSearch
+from players.Diamond_Three.my_algorithm.rollout_policy import GreedyRolloutMove, WallFree
+
+# Games played move by move with both policies
+NUM_GAMES = 200
+
+
+def MoveFields(move):
+    mid, fid, tgrab = move
+    return (mid, fid, tgrab.tile_type, tgrab.number, tgrab.pattern_line_dest, tgrab.num_to_pattern_line,
+            tgrab.num_to_floor_line)
+
+
+class GreedyRolloutMoveTest(unittest.TestCase):
+    def testSameMoveAsNaivePolicy(self):
+        """With the same random state, the same move as _NaiveMoveSelected on the full move list"""
+        moves_checked = 0
+        for seed in range(NUM_GAMES):
+            random.seed(seed)
+            game_state = GameState(2)
+            for plr in game_state.players:
+                plr.player_trace.StartRound()
+            while True:
+                player_id = game_state.first_player
+                wall_free = [WallFree(plr) for plr in game_state.players]
+                while game_state.TilesRemaining():
+                    random_state = random.getstate()
+                    expected = MonteCarloTreeSearch._NaiveMoveSelected(
+                        game_state.players[player_id].GetAvailableMoves(game_state))
+                    random.setstate(random_state)
+                    move = GreedyRolloutMove(game_state, player_id, wall_free[player_id])
+                    self.assertEqual(MoveFields(move), MoveFields(expected),
+                                     "game {} move {}".format(seed, moves_checked))
+                    moves_checked += 1
+                    game_state.ExecuteMove(player_id, move)
+                    player_id = 1 - player_id
+                game_state.ExecuteEndOfRound()
+                if any(plr.GetCompletedRows() > 0 for plr in game_state.players):
+                    break
+                game_state.SetupNewRound()
+        self.assertGreater(moves_checked, NUM_GAMES * 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
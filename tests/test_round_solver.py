@@ -0,0 +1,87 @@
+import copy
+import random
+import unittest
+from model import GameState
+from players.Diamond_Three.my_algorithm.game_tree import CopyGameState
+from players.Diamond_Three.my_algorithm.round_solver import RoundSolver, RemainingMoves
+from players.Diamond_Three.my_algorithm.rollout_policy import GreedyRolloutMove, WallFree
+
+# Moves left in the positions solved, small enough for the brute force
+PLIES_LEFT = 4
+
+
+def EndOfRoundPositions(seed, plies_left):
+    """(game state, player to move, last round) plies_left moves before the end of every round of a game
+    played by the rollout policy"""
+    random.seed(seed)
+    rng = random.Random(seed)
+    game_state = GameState(2)
+    for plr in game_state.players:
+        plr.player_trace.StartRound()
+    positions = []
+    while True:
+        round_start = copy.deepcopy(game_state)
+        player_id = game_state.first_player
+        wall_free = [WallFree(plr) for plr in game_state.players]
+        moves = []
+        while game_state.TilesRemaining():
+            move = GreedyRolloutMove(game_state, player_id, wall_free[player_id], rng)
+            moves.append((player_id, move))
+            game_state.ExecuteMove(player_id, move)
+            player_id = 1 - player_id
+        game_state.ExecuteEndOfRound()
+        last_round = any(plr.GetCompletedRows() > 0 for plr in game_state.players)
+        if len(moves) > plies_left:
+            for player_id, move in moves[:-plies_left]:
+                round_start.ExecuteMove(player_id, move)
+            positions.append((round_start, moves[-plies_left][0], last_round))
+        if last_round:
+            return positions
+        game_state.SetupNewRound()
+
+
+def BruteForce(game_state, player_id):
+    """Negamax value of the rest of the round for player_id, every move searched, nothing memoized"""
+    if not game_state.TilesRemaining():
+        return RoundSolver._FinalDifference(game_state, player_id)
+    best = float('-inf')
+    for move in game_state.players[player_id].GetAvailableMoves(game_state):
+        next_gs = CopyGameState(game_state)
+        next_gs.ExecuteMove(player_id, move)
+        best = max(best, -BruteForce(next_gs, 1 - player_id))
+    return best
+
+
+class RoundSolverTest(unittest.TestCase):
+    def testAgainstBruteForce(self):
+        solver = RoundSolver()
+        positions = EndOfRoundPositions(2021, PLIES_LEFT)
+        self.assertTrue(positions[-1][2], "the game must end with a solved round")
+        for round_id, (game_state, player_id, last_round) in enumerate(positions):
+            with self.subTest(round=round_id + 1, last_round=last_round):
+                self.assertLessEqual(PLIES_LEFT, RemainingMoves(game_state))
+                move, value = solver.Solve(game_state, player_id, 60)
+                self.assertAlmostEqual(value, BruteForce(game_state, player_id))
+                # The move reaches the value
+                next_gs = CopyGameState(game_state)
+                next_gs.ExecuteMove(player_id, move)
+                self.assertAlmostEqual(-BruteForce(next_gs, 1 - player_id), value)
+
+    def testLastRoundBonus(self):
+        # In the last round the end of game bonuses count, not the estimate of the future rounds
+        game_state, player_id, last_round = EndOfRoundPositions(2021, PLIES_LEFT)[-1]
+        self.assertTrue(last_round)
+        finished = CopyGameState(game_state)
+        while finished.TilesRemaining():
+            finished.ExecuteMove(player_id, finished.players[player_id].GetAvailableMoves(finished)[0])
+            player_id = 1 - player_id
+        expected = copy.deepcopy(finished)
+        expected.ExecuteEndOfRound()
+        for plr in expected.players:
+            plr.EndOfGameScore()
+        self.assertAlmostEqual(RoundSolver._FinalDifference(finished, 0),
+                               expected.players[0].score - expected.players[1].score)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import math
+import unittest
+from sprt import SPRT, BayesEloToProba, ScoreToElo
+
+
+def Results(test, wins, draws, losses):
+    test.wins, test.draws, test.losses = wins, draws, losses
+    return test
+
+
+class BayesEloTest(unittest.TestCase):
+    def testProbabilities(self):
+        for elo, draw_elo in [(0, 0), (0, 100), (35, 200), (-80, 50)]:
+            p_win, p_draw, p_loss = BayesEloToProba(elo, draw_elo)
+            self.assertAlmostEqual(p_win + p_draw + p_loss, 1.0)
+            self.assertGreaterEqual(p_draw, 0.0)
+            # The model is symmetric: -elo swaps the win and loss probabilities
+            for mirrored, expected in zip(BayesEloToProba(-elo, draw_elo), (p_loss, p_draw, p_win)):
+                self.assertAlmostEqual(mirrored, expected)
+
+    def testEvenGame(self):
+        p_win, p_draw, p_loss = BayesEloToProba(0, 0)
+        self.assertAlmostEqual(p_win, 0.5)
+        self.assertAlmostEqual(p_draw, 0.0)
+        self.assertAlmostEqual(ScoreToElo(0.5), 0.0)
+        self.assertAlmostEqual(ScoreToElo(10 / 11), 400.0)
+
+
+class SPRTTest(unittest.TestCase):
+    def testBounds(self):
+        test = SPRT(alpha=0.05, beta=0.05)
+        self.assertAlmostEqual(test.upper_bound, math.log(19))
+        self.assertAlmostEqual(test.lower_bound, -math.log(19))
+        test = SPRT(alpha=0.01, beta=0.1)
+        self.assertAlmostEqual(test.upper_bound, math.log(0.9 / 0.01))
+        self.assertAlmostEqual(test.lower_bound, math.log(0.1 / 0.99))
+
+    def testLLR(self):
+        self.assertEqual(SPRT().LLR(), 0.0)
+        # Value of the formulas (observed draw elo with half a pseudo game per outcome), kept against regressions
+        self.assertAlmostEqual(Results(SPRT(0, 10), 30, 20, 10).LLR(), 0.765537078, places=6)
+        # Hypotheses symmetric around 0: swapping the wins and the losses negates the LLR
+        llr = Results(SPRT(-10, 10), 30, 20, 10).LLR()
+        self.assertGreater(llr, 0)
+        self.assertAlmostEqual(Results(SPRT(-10, 10), 10, 20, 30).LLR(), -llr)
+        # Even results are closer to H0 (0 Elo) than to H1
+        self.assertLess(Results(SPRT(0, 10), 10, 20, 10).LLR(), 0)
+
+    def testStatus(self):
+        test = SPRT(0, 10)
+        self.assertIsNone(test.Status())
+        self.assertIsNone(Results(test, 12, 6, 10).Status())
+        self.assertEqual(Results(test, 600, 100, 400).Status(), 'H1')
+        self.assertEqual(Results(test, 400, 100, 600).Status(), 'H0')
+
+    def testStatusAtTheBounds(self):
+        test = Results(SPRT(0, 10), 300, 50, 200)
+        test.upper_bound = test.LLR()
+        self.assertEqual(test.Status(), 'H1')
+        test.upper_bound, test.lower_bound = float('inf'), test.LLR()
+        self.assertEqual(test.Status(), 'H0')
+
+    def testAddResult(self):
+        test = SPRT()
+        for score_a, score_b in [(40, 30), (30, 30), (10, 30), (55, 54)]:
+            test.AddResult(score_a, score_b)
+        self.assertEqual((test.wins, test.draws, test.losses, test.games), (2, 1, 1, 4))
+
+    def testEloInterval(self):
+        elo, low, high = Results(SPRT(), 20, 10, 20).EloInterval()
+        self.assertAlmostEqual(elo, 0.0)
+        self.assertAlmostEqual(low, -high)
+        # A clean sweep still gives a finite estimate
+        elo, low, high = Results(SPRT(), 10, 0, 0).EloInterval()
+        self.assertTrue(math.isfinite(elo) and math.isfinite(low) and math.isfinite(high))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from tournament import GameJournal, RecyclingPool
+
+
+def _CrashingTask(task):
+    """Double the value, the first `crashes` attempts kill the worker (counted with files in `attempts_dir`)."""
+    value, crashes, delay, attempts_dir = task
+    time.sleep(delay)
+    attempt = len([f for f in os.listdir(attempts_dir) if f.startswith("{}.".format(value))])
+    open(os.path.join(attempts_dir, "{}.{}".format(value, attempt)), 'w').close()
+    if attempt < crashes:
+        os._exit(1)
+    return value * 2
+
+
+class RecyclingPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.attempts_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.attempts_dir)
+
+    def Run(self, pool, tasks):
+        return list(pool.imap_unordered(_CrashingTask, [task + (self.attempts_dir,) for task in tasks]))
+
+    def testRecycling(self):
+        pool = RecyclingPool(processes=2, max_tasks=2)
+        results = self.Run(pool, [(value, 0, 0) for value in range(6)])
+        self.assertEqual(sorted(results), [0, 2, 4, 6, 8, 10])
+        self.assertEqual(pool.crashes, 0)
+        self.assertGreater(pool.restarts, 0)
+
+    def testRetryOnceAfterCrash(self):
+        # The last busy worker crashes while the others are already idle
+        pool = RecyclingPool(processes=4)
+        results = self.Run(pool, [(0, 0, 0), (1, 0, 0), (2, 0, 0), (3, 1, 0.5)])
+        self.assertEqual(sorted(results), [0, 2, 4, 6])
+        self.assertEqual(pool.crashes, 1)
+
+    def testGiveUpAfterSecondCrash(self):
+        pool = RecyclingPool(processes=2)
+        results = self.Run(pool, [(0, 0, 0), (1, 2, 0.2), (2, 0, 0)])
+        self.assertEqual(sorted(results, key=lambda result: (result is not None, result)), [None, 0, 4])
+        self.assertEqual(pool.crashes, 2)
+        self.assertEqual(len(os.listdir(self.attempts_dir)), 4)
+
+
+class GameJournalTest(unittest.TestCase):
+    HEADER = {"red": "Diamond_Three.myPlayer", "blue": "naive_player", "names": ["Red", "Blue"], "seed": None}
+
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.journal_dir, "run.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.journal_dir)
+
+    def Play(self, journal, indexes):
+        for index in indexes:
+            journal.AddGame(index, journal.GameSeed(index), 10 + index, 20 - index)
+
+    def testResumeAfterTruncatedLine(self):
+        journal = GameJournal(self.file_name)
+        header = journal.Open(dict(self.HEADER))
+        self.Play(journal, range(3))
+        seeds = [journal.GameSeed(index) for index in range(5)]
+        # A crash in the middle of writing game 3
+        with open(self.file_name, 'a') as f:
+            f.write('{"type": "game", "index": 3, "se')
+
+        resumed = GameJournal(self.file_name)
+        self.assertEqual(resumed.Open(dict(self.HEADER)), header)
+        self.assertEqual([game["index"] for game in resumed.games], [0, 1, 2])
+        self.assertEqual([resumed.GameSeed(index) for index in range(5)], seeds)
+        self.Play(resumed, range(3, 5))
+
+        # The partial line is gone and the new games start on their own line
+        with open(self.file_name) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 6)
+        final = GameJournal(self.file_name)
+        self.assertEqual([game["index"] for game in final.games], list(range(5)))
+        self.assertEqual([game["seed"] for game in final.games], seeds)
+        self.assertEqual(final.games[4]["red_score"], 14.0)
+
+    def testGapIsPlayedAgain(self):
+        journal = GameJournal(self.file_name)
+        journal.Open(dict(self.HEADER))
+        self.Play(journal, [0, 1, 3])
+        self.assertEqual([game["index"] for game in GameJournal(self.file_name).games], [0, 1])
+
+    def testOtherRun(self):
+        journal = GameJournal(self.file_name)
+        journal.Open(dict(self.HEADER, seed=2021))
+        self.assertEqual(journal.GameSeed(7), 2021)
+        with self.assertRaises(ValueError):
+            GameJournal(self.file_name).Open(dict(self.HEADER, blue="Diamond_Three.ucb1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import random
+import time
+import unittest
+from model import GameState
+from players.Diamond_Three.my_algorithm.Minimax import Minimax
+from players.Diamond_Three.my_algorithm.transposition import TranspositionTable, Entry, EXACT, LOWER, UPPER
+
+# Rewards no search of the test position can reach, to tell a table cutoff apart
+SENTINEL_REWARDS = [100.0, 0.0]
+
+
+def NewGameState(seed=2021):
+    random.seed(seed)
+    game_state = GameState(2)
+    for plr in game_state.players:
+        plr.player_trace.StartRound()
+    return game_state
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def testStoreProbe(self):
+        table = TranspositionTable(10)
+        game_state = NewGameState()
+        key, factory_order = table.Key(game_state, 0)
+        self.assertIsNone(table.Probe(key))
+        entry = Entry(2, EXACT, 1.5, [3.0, 1.5], None, False)
+        table.Store(key, entry)
+        self.assertIs(table.Probe(key), entry)
+        self.assertEqual((table.probes, table.hits), (2, 1))
+        # The player to move is part of the key, the order of the factories is not
+        self.assertNotEqual(table.Key(game_state, 1)[0], key)
+        game_state.factories.reverse()
+        self.assertEqual(table.Key(game_state, 0)[0], key)
+
+    def testReplacement(self):
+        table = TranspositionTable(10)
+        deep = Entry(3, EXACT, 1.0, [1.0, 0.0], None, False)
+        table.Store("position", deep)
+        table.Store("position", Entry(1, LOWER, 2.0, [2.0, 0.0], None, False))
+        self.assertIs(table.Probe("position"), deep)
+        deeper = Entry(4, UPPER, 0.5, [0.5, 0.0], None, False)
+        table.Store("position", deeper)
+        self.assertIs(table.Probe("position"), deeper)
+        complete = Entry(0, EXACT, 0.0, [0.0, 0.0], None, True)
+        table.Store("position", complete)
+        table.Store("position", Entry(9, EXACT, 5.0, [5.0, 0.0], None, False))
+        self.assertIs(table.Probe("position"), complete)
+
+    def testLeastRecentlyUsedEviction(self):
+        table = TranspositionTable(3)
+        for key in "abc":
+            table.Store(key, Entry(1, EXACT, 0.0, [0.0, 0.0], None, False))
+        table.Probe("a")
+        table.Store("d", Entry(1, EXACT, 0.0, [0.0, 0.0], None, False))
+        self.assertEqual(list(table.entries), ["c", "a", "d"])
+        table.Store("c", Entry(2, EXACT, 0.0, [0.0, 0.0], None, False))
+        table.Store("e", Entry(1, EXACT, 0.0, [0.0, 0.0], None, False))
+        self.assertEqual(list(table.entries), ["d", "c", "e"])
+        table.Clear()
+        self.assertEqual(len(table.entries), 0)
+
+
+class TableCutoffTest(unittest.TestCase):
+    """How Minimax uses an entry of each bound type, depending on the window"""
+
+    def Search(self, flag, alpha, beta, depth=1, entry_depth=1, complete=False):
+        """(value, whether the entry ended the search) of a search of the root position with a stored entry"""
+        game_state = NewGameState()
+        table = TranspositionTable()
+        searcher = Minimax(0, game_state, game_state.players[0].GetAvailableMoves(game_state), tt=table)
+        searcher.deadline = time.time() + 60
+        key, _ = table.Key(game_state, 0)
+        table.Store(key, Entry(entry_depth, flag, 100.0, SENTINEL_REWARDS, None, complete))
+        value, rewards = searcher.minimax(searcher.root, depth, alpha, beta, 0)
+        return value, rewards is SENTINEL_REWARDS and searcher.count == 1
+
+    def testExact(self):
+        self.assertEqual(self.Search(EXACT, float('-inf'), float('inf')), (100.0, True))
+
+    def testLowerBound(self):
+        # At least 100: enough to fail high above a beta of 50, not to know the value below a beta of 200
+        self.assertTrue(self.Search(LOWER, float('-inf'), 50)[1])
+        self.assertFalse(self.Search(LOWER, float('-inf'), 200)[1])
+
+    def testUpperBound(self):
+        self.assertTrue(self.Search(UPPER, 200, float('inf'))[1])
+        self.assertFalse(self.Search(UPPER, 50, float('inf'))[1])
+
+    def testDepth(self):
+        # A shallower entry is not used, unless its search reached the end of the round
+        self.assertFalse(self.Search(EXACT, float('-inf'), float('inf'), depth=2, entry_depth=1)[1])
+        self.assertTrue(self.Search(EXACT, float('-inf'), float('inf'), depth=2, entry_depth=1, complete=True)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
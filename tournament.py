@@ -0,0 +1,288 @@
+#- Helpers shared by the headless multi-game modes of runner.py.
+#- A game is described by the two agent files (as given to runner.py -r/-b),
+#- the team names and the random seed, so it can be replayed or shipped to
+#- another process without holding on to any player object.
+
+from advance_model import AdvanceGameRunner
+import collections
+import importlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import sys
+import time
+
+
+def LoadPlayer(agent_file, player_id):
+    """Load the myPlayer class of players/<agent_file>.py with the given id."""
+    mymodule = importlib.import_module('players.' + agent_file)
+    return mymodule.myPlayer(player_id)
+
+
+class QuietOutput:
+    """Send everything the agents print to the void (or to a log file)."""
+    def __init__(self, log_file=None):
+        self.log_file = log_file
+
+    def __enter__(self):
+        self._original_stdout = sys.stdout
+        self._original_stderr = sys.stderr
+        if self.log_file is not None:
+            log_dir = os.path.dirname(self.log_file)
+            if log_dir and not os.path.exists(log_dir):
+                os.makedirs(log_dir)
+            self._stream = open(self.log_file, 'w')
+        else:
+            self._stream = open(os.devnull, 'w')
+        sys.stdout = self._stream
+        sys.stderr = self._stream
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sys.stdout = self._original_stdout
+        sys.stderr = self._original_stderr
+        self._stream.close()
+
+
+def PlayGame(agent_files, names, seed, time_limit=1.0, warning_limit=3, log_file=None):
+    """Play one headless game and return the replay produced by AdvanceGameRunner."""
+    players = [LoadPlayer(agent_file, i) for i, agent_file in enumerate(agent_files)]
+    gr = AdvanceGameRunner(players,
+                           seed=seed,
+                           time_limit=time_limit,
+                           warning_limit=warning_limit,
+                           displayer=None,
+                           players_namelist=list(names))
+    with QuietOutput(log_file):
+        return gr.Run()
+
+
+def GameScores(replay):
+    """Return the final (red, blue) scores stored in a replay."""
+    return replay[0][0], replay[1][0]
+
+
+def SeedSequence(seed, count):
+    """Derive `count` reproducible game seeds from one base seed."""
+    rng = random.Random(seed)
+    return [rng.randint(0, 1e10) for _ in range(count)]
+
+
+def RandomBaseSeed():
+    """Time based seed, used when runner.py is not given --setRandomSeed."""
+    return int(str(time.time()).replace('.', ''))
+
+
+class GameJournal:
+    """Durable json-lines journal of a multi-game run, used to resume it after a crash.
+
+    The first line is a header describing the run (agents, names and base seed),
+    every following line is one finished game with its index, seed and scores.
+    Each line is flushed and fsync'ed as soon as the game is over.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.header = None
+        self.games = []
+        if os.path.exists(file_name):
+            self._Load()
+
+    def _Load(self):
+        games = {}
+        with open(self.file_name, 'rb+') as f:
+            # Drop a partial last line left by a crash, so new entries start on a fresh line
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+        with open(self.file_name) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("type") == "header":
+                    self.header = entry
+                elif entry.get("type") == "game":
+                    games[entry["index"]] = entry
+        # Only a contiguous prefix of games counts, anything after a gap is played again
+        index = 0
+        while index in games:
+            self.games.append(games[index])
+            index += 1
+
+    def Open(self, header):
+        """Start a new journal with `header`, or check that the existing one is the same run.
+
+        A header seed of None asks for a different seed per game: a base seed is
+        drawn once and stored, and the game seeds are derived from it by index.
+
+        Returns the header in use.
+        """
+        if self.header is None:
+            self.header = dict(header, type="header")
+            if self.header.get("seed") is None:
+                self.header["seed"] = RandomBaseSeed()
+                self.header["seed_per_game"] = True
+            self._Append(self.header)
+            return self.header
+        for key in ("red", "blue", "names", "seed"):
+            if key in header and header[key] is not None and self.header.get(key) != header[key]:
+                raise ValueError("Journal {} belongs to another run ({}: {} != {})".format(
+                    self.file_name, key, self.header.get(key), header[key]))
+        return self.header
+
+    def GameSeed(self, index):
+        """Seed of game `index`, the same whether the run was interrupted or not."""
+        if self.header.get("seed_per_game"):
+            return SeedSequence(self.header["seed"], index + 1)[index]
+        return self.header["seed"]
+
+    def AddGame(self, index, seed, red_score, blue_score):
+        entry = {"type": "game", "index": index, "seed": seed,
+                 "red_score": float(red_score), "blue_score": float(blue_score)}
+        self.games.append(entry)
+        self._Append(entry)
+
+    def _Append(self, entry):
+        journal_dir = os.path.dirname(self.file_name)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+        with open(self.file_name, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def CurrentRSS():
+    """Resident memory of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak resident size
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _RecyclingWorker(conn, func, max_tasks, max_rss):
+    done = 0
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        result = func(task)
+        done += 1
+        rss = CurrentRSS()
+        retire = bool((max_tasks and done >= max_tasks) or (max_rss and rss > max_rss))
+        conn.send((result, rss, retire))
+        if retire:
+            break
+    conn.close()
+
+
+class RecyclingPool:
+    """Process pool whose workers are replaced after `max_tasks` tasks or above `max_rss` bytes.
+
+    Agents may keep trees and caches alive between games, so long tournaments
+    recycle their workers to keep the memory (and the throughput) steady.
+    Every worker gets its tasks one at a time through its own pipe, so a worker
+    that dies unexpectedly is replaced too and its task is retried once.
+
+    Attributes:
+        restarts: number of workers started to replace a retired or dead one
+        crashes: number of workers that died while playing
+        peak_rss: highest resident memory reported by a worker, in bytes
+    """
+    def __init__(self, processes=None, max_tasks=0, max_rss=0):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self.restarts = 0
+        self.crashes = 0
+        self.peak_rss = 0
+
+    def _Spawn(self, func):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=_RecyclingWorker,
+                                         args=(child_conn, func, self.max_tasks, self.max_rss))
+        worker.daemon = True
+        worker.start()
+        child_conn.close()
+        worker.conn = parent_conn
+        worker.task_index = None
+        return worker
+
+    def imap_unordered(self, func, tasks):
+        """Yield func(task) for every task as soon as it is finished (None for a lost task)."""
+        tasks = list(tasks)
+        pending = collections.deque(range(len(tasks)))
+        remaining = len(tasks)
+        retried = set()
+        workers = [self._Spawn(func) for _ in range(min(self.processes, remaining))]
+
+        def Dispatch(worker):
+            if pending:
+                worker.task_index = pending.popleft()
+                worker.conn.send(tasks[worker.task_index])
+
+        def Replace(worker):
+            workers.remove(worker)
+            worker.conn.close()
+            worker.join()
+            if len(workers) < min(self.processes, remaining):
+                workers.append(self._Spawn(func))
+                self.restarts += 1
+            # A task requeued after a crash goes to whichever worker is idle, not only to a new one
+            for idle_worker in workers:
+                if idle_worker.task_index is None:
+                    Dispatch(idle_worker)
+
+        for worker in workers:
+            Dispatch(worker)
+        try:
+            while remaining > 0:
+                for conn in multiprocessing.connection.wait([worker.conn for worker in workers]):
+                    worker = next(w for w in workers if w.conn is conn)
+                    try:
+                        result, rss, retire = conn.recv()
+                    except (EOFError, OSError):
+                        # The worker died while playing: retry its task once
+                        self.crashes += 1
+                        index = worker.task_index
+                        if index is not None:
+                            if index in retried:
+                                remaining -= 1
+                                yield None
+                            else:
+                                retried.add(index)
+                                pending.appendleft(index)
+                        Replace(worker)
+                        continue
+                    worker.task_index = None
+                    self.peak_rss = max(self.peak_rss, rss)
+                    remaining -= 1
+                    yield result
+                    if retire:
+                        Replace(worker)
+                    else:
+                        Dispatch(worker)
+        finally:
+            for worker in workers:
+                try:
+                    worker.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+
+    def Summary(self):
+        return "Worker restarts: {} ({} crashed), peak worker memory: {:.1f} MB".format(
+            self.restarts, self.crashes, self.peak_rss / 2 ** 20)